@@ -0,0 +1,57 @@
+"""Compare StrongJson.compile() against the generic encoder/decoder and plain json.
+
+Usage:
+    python benchmarks/bench_compile.py [n_records]
+"""
+import json
+import sys
+import timeit
+
+from strong_json import StrongJson, ClassMapBuilder
+
+
+class User:
+    def __init__(self, first_name: str, last_name: str, age: int, score: float, active: bool = True):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.age = age
+        self.score = score
+        self.active = active
+
+
+def make_users(n: int):
+    return [User(f'first{i}', f'last{i}', i % 90, i * 0.5, i % 2 == 0) for i in range(n)]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main(n: int) -> None:
+    class_map = ClassMapBuilder.build_class_map([User])
+    interpreted = StrongJson(class_map)
+    compiled = StrongJson(class_map).compile()
+
+    users = make_users(n)
+    plain = [dict(u.__dict__) for u in users]
+    tagged = interpreted.to_json_dict(users)
+    assert compiled.to_json_dict(users) == tagged
+
+    rows = [
+        ('encode json (plain dicts)', best_of(lambda: json.dumps(plain))),
+        ('encode interpreted', best_of(lambda: json.dumps(interpreted.to_json_dict(users)))),
+        ('encode compiled', best_of(lambda: json.dumps(compiled.to_json_dict(users)))),
+    ]
+    s = json.dumps(tagged)
+    rows += [
+        ('decode json (plain dicts)', best_of(lambda: json.loads(s))),
+        ('decode interpreted', best_of(lambda: interpreted.from_json_dict(json.loads(s)))),
+        ('decode compiled', best_of(lambda: compiled.from_json_dict(json.loads(s)))),
+    ]
+    print(f'{n} records')
+    for name, t in rows:
+        print(f'{name:<30}{t * 1000:10.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,274 @@
+"""Throughput and peak memory of StrongJson encoding and decoding.
+
+Every case builds a realistic payload hitting one encoder/decoder branch and times
+``to_json`` and ``from_json`` on it. Results can be saved as json and compared against
+a saved baseline; the compare mode exits with status 1 when a case got slower (or
+used more memory) by more than the threshold.
+
+Usage:
+    python benchmarks/run.py [--scale 1.0] [--repeat 5] [-k name] [--output results.json]
+    python benchmarks/run.py --compare baseline.json [--threshold 0.1]
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import timeit
+import tracemalloc
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import strong_json
+from strong_json import StrongJson, ClassMapBuilder
+
+
+class Status(Enum):
+    ACTIVE = 'active'
+    SUSPENDED = 'suspended'
+    CLOSED = 'closed'
+
+
+class Address:
+    def __init__(self, street: str, city: str, zip_code: str):
+        self.street = street
+        self.city = city
+        self.zip_code = zip_code
+
+
+class Customer:
+    def __init__(self, name: str, age: int, balance: float, status: Status, address: Address, tags: list):
+        self.name = name
+        self.age = age
+        self.balance = balance
+        self.status = status
+        self.address = address
+        self.tags = tags
+
+
+class TreeNode:
+    def __init__(self, label: str, children: list):
+        self.label = label
+        self.children = children
+
+
+CLASSES = [Status, Address, Customer, TreeNode]
+
+
+def wide_dict(n: int) -> dict:
+    return {f'key{i}': i if i % 3 else f'value{i}' for i in range(n)}
+
+
+def deep_dict(n: int, depth: int = 200) -> list:
+    """n levels in total, split into chains of a depth the json module can still nest."""
+    chains = []
+    for _ in range(max(1, n // depth)):
+        d = {'leaf': 0}
+        for i in range(depth):
+            d = {'level': i, 'child': d}
+        chains.append(d)
+    return chains
+
+
+def customers(n: int) -> list:
+    statuses = list(Status)
+    return [Customer(f'name{i}', i % 90, i * 1.25, statuses[i % 3],
+                     Address(f'{i} Main St', f'city{i % 50}', f'{i % 100000:05d}'), [f't{i % 7}', f't{i % 11}'])
+            for i in range(n)]
+
+
+def tree(n: int) -> TreeNode:
+    def build(depth: int) -> TreeNode:
+        return TreeNode(f'node{depth}', [build(depth - 1) for _ in range(3)] if depth else [])
+    return build(max(1, int(math.log(max(n, 3), 3))))
+
+
+def enums(n: int) -> list:
+    statuses = list(Status)
+    return [statuses[i % 3] for i in range(n)]
+
+
+def dates(n: int) -> list:
+    start = date(2000, 1, 1)
+    return [start + timedelta(days=i % 10000) for i in range(n)]
+
+
+def datetimes(n: int) -> list:
+    start = datetime(2000, 1, 1)
+    return [start + timedelta(seconds=37 * i) for i in range(n)]
+
+
+def sets(n: int) -> list:
+    return [{i, i + 1, i * 2, f's{i % 13}'} for i in range(n // 4)]
+
+
+def tuples(n: int) -> list:
+    return [(i, f'v{i}', i * 0.5) for i in range(n // 3)]
+
+
+def special_floats(n: int) -> list:
+    values = [math.nan, math.inf, -math.inf, 1.5]
+    return [values[i % 4] for i in range(n)]
+
+
+def ordered_dicts(n: int) -> list:
+    return [OrderedDict([('b', i), ('a', f'v{i}'), (i, None)]) for i in range(n // 3)]
+
+
+def ndarray(n: int) -> np.ndarray:
+    return np.arange(n * 10, dtype=np.float64).reshape(-1, 10)
+
+
+def dataframe(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'value': np.linspace(0, 1, n),
+        'name': [f'row{i}' for i in range(n)],
+    })
+
+
+# name -> (payload generator, base size, StrongJson keyword arguments)
+# 'dumps' holds keyword arguments for to_json, orjson only writes compact or 2 space indented json
+COMPACT = {'separators': (',', ':'), 'ensure_ascii': False}
+CASES: Dict[str, Tuple[Callable[[int], Any], int, Dict[str, Any]]] = OrderedDict([
+    ('wide_dict', (wide_dict, 50000, {'treat_dict_as_ordered_dict': False})),
+    ('wide_dict_ordered', (wide_dict, 50000, {})),
+    ('deep_dict', (deep_dict, 20000, {'treat_dict_as_ordered_dict': False})),
+    ('deep_dict_ordered', (deep_dict, 20000, {})),
+    ('ordered_dicts', (ordered_dicts, 30000, {})),
+    ('customers', (customers, 10000, {})),
+    ('customers_compiled', (customers, 10000, {'compile': True})),
+    ('customers_compact', (customers, 10000, {'wire_format': 2})),
+    ('customers_json', (customers, 10000, {'dumps': COMPACT})),
+    ('customers_orjson', (customers, 10000, {'backend': 'orjson', 'dumps': COMPACT})),
+    ('tree', (tree, 20000, {})),
+    ('enums', (enums, 50000, {})),
+    ('dates', (dates, 30000, {})),
+    ('datetimes', (datetimes, 30000, {})),
+    ('sets', (sets, 40000, {})),
+    ('tuples', (tuples, 60000, {})),
+    ('special_floats', (special_floats, 50000, {})),
+    ('ndarray', (ndarray, 20000, {})),
+    ('ndarray_binary', (ndarray, 20000, {'binary_ndarray': True})),
+    ('dataframe', (dataframe, 20000, {})),
+    ('dataframe_columnar', (dataframe, 20000, {'columnar_dataframe': True, 'binary_ndarray': True})),
+])
+
+
+def make_jsoner(kwd: Dict[str, Any]) -> StrongJson:
+    kwd = dict(kwd)
+    compile_ = kwd.pop('compile', False)
+    kwd.pop('dumps', None)
+    jsoner = StrongJson(ClassMapBuilder.build_class_map(CLASSES), **kwd)
+    return jsoner.compile() if compile_ else jsoner
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name: str, scale: float, repeat: int) -> Dict[str, Any]:
+    make, size, kwd = CASES[name]
+    jsoner = make_jsoner(kwd)
+    obj = make(max(1, int(size * scale)))
+    dumps = kwd.get('dumps', {})
+    s = jsoner.to_json(obj, **dumps)
+    encode = lambda: jsoner.to_json(obj, **dumps)  # noqa: E731
+    decode = lambda: jsoner.from_json(s)  # noqa: E731
+    encode_time = best_of(encode, repeat)
+    decode_time = best_of(decode, repeat)
+    mb = len(s.encode('utf-8')) / 1e6
+    return {
+        'bytes': len(s.encode('utf-8')),
+        'encode_seconds': encode_time,
+        'decode_seconds': decode_time,
+        'encode_mb_per_s': mb / encode_time,
+        'decode_mb_per_s': mb / decode_time,
+        'encode_peak_bytes': peak_memory(encode),
+        'decode_peak_bytes': peak_memory(decode),
+    }
+
+
+def run(names: List[str], scale: float, repeat: int) -> Dict[str, Any]:
+    results = OrderedDict()
+    for name in names:
+        results[name] = r = run_case(name, scale, repeat)
+        print(f"{name:<22}{r['bytes'] / 1e6:8.2f} MB"
+              f"  enc {r['encode_seconds'] * 1000:9.1f} ms {r['encode_peak_bytes'] / 1e6:8.1f} MB peak"
+              f"  dec {r['decode_seconds'] * 1000:9.1f} ms {r['decode_peak_bytes'] / 1e6:8.1f} MB peak")
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'strong_json': getattr(strong_json, '__version__', None),
+            'scale': scale,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+COMPARED = ['encode_seconds', 'decode_seconds', 'encode_peak_bytes', 'decode_peak_bytes']
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a line for every metric that is worse than the baseline by more than threshold."""
+    regressions = []
+    for name, r in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        for metric in COMPARED:
+            if not base.get(metric):
+                continue
+            change = r[metric] / base[metric] - 1
+            flag = 'REGRESSION' if change > threshold else ''
+            print(f'{name:<22}{metric:<20}{base[metric]:14.4g} -> {r[metric]:<14.4g}{change:+8.1%} {flag}')
+            if flag:
+                regressions.append(f'{name} {metric} {change:+.1%}')
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every payload size')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per case, best one is kept')
+    parser.add_argument('-k', dest='select', action='append', help='run only cases containing this string')
+    parser.add_argument('--output', help='save results to this json file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against a saved results file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as regression')
+    args = parser.parse_args(argv)
+
+    names = [n for n in CASES if not args.select or any(k in n for k in args.select)]
+    current = run(names, args.scale, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(current, fp, indent=2)
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) above {args.threshold:.0%}:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -150,8 +150,8 @@ setup(
     # Similar to `install_requires` above, these must be valid existing
     # projects.
     extras_require={  # Optional
-        'dev': ['pytest', 'numpy', 'pandas'],
-        'test': ['pytest', 'numpy', 'pandas', 'pytest-cov'],
+        'dev': ['pytest', 'numpy', 'pandas', 'dataclasses; python_version < "3.7"'],
+        'test': ['pytest', 'numpy', 'pandas', 'pytest-cov', 'dataclasses; python_version < "3.7"'],
     },
 
     # If there are data files included in your packages that need to be
@@ -1,17 +1,46 @@
 import warnings
 import json
+import asyncio
+import functools
+import copy
+from types import MethodType
+import codecs
+import os
+import re
+import base64
+import itertools
+import uuid
+import operator
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from collections import OrderedDict
 from enum import Enum
-from typing import List, Any, Type, Dict, Union
+from typing import List, Any, Type, Dict, Union, Callable, Optional, FrozenSet, Tuple, Iterator, Iterable, TextIO, IO, \
+    AsyncIterator, TypeVar, Set, get_type_hints
+import collections.abc
+from concurrent.futures import Executor
 import inspect
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
 import math
+import time
+from contextlib import contextmanager
 
 try:
     import pandas as pd
 except ImportError:  # pragma: no cover
     pd = None  # pragma: no cover
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # pragma: no cover
+
+try:
+    import dataclasses
+except ImportError:  # pragma: no cover
+    dataclasses = None  # pragma: no cover
+
 try:
     import numpy as np
 except ImportError:  # pragma: no cover
@@ -19,6 +48,46 @@ except ImportError:  # pragma: no cover
 
 ClassMap = Dict[str, Type[Any]]
 JSONPrimitive = Union[Dict[str, 'JSONPrimitive'], List['JSONPrimitive'], int, float, None, str, bool]
+# (encode, decode) pair built from a type annotation; see StrongJson._schema_codec
+_SchemaCodec = Tuple[Callable[[Any], JSONPrimitive], Callable[[JSONPrimitive], Any]]
+
+_DUMP_BUFFER_SIZE = 1 << 16
+_READ_CHUNK_SIZE = 1 << 16
+_SIDECAR_THRESHOLD = 1 << 20
+_INTERN_TABLE_SIZE = 1 << 16
+
+# wire format 2 (compact) document: {"@v": 2, "~": [class name, ...], "_": payload}
+# to_json writes the tag table first so that the payload can be decoded as it is parsed.
+# A streamed payload fills the table as it is written; the table comes last there.
+_COMPACT_VERSION_KEY = '@v'
+_COMPACT_PAYLOAD_KEY = '_'
+_COMPACT_TABLE_KEY = '~'
+_COMPACT_TYPE_KEY = '@'
+_COMPACT_DATA_KEY = '_'
+# builtin type tags in wire format 1 and 2
+_COMPACT_TAGS = {
+    'refs': 'r',
+    'ref': 'R',
+    'dict': 'd',
+    'tuple': 't',
+    'set': 's',
+    'date': 'D',
+    'datetime': 'T',
+    'float': 'f',
+    'numpy.ndarray': 'n',
+    'pandas.DataFrame': 'p',
+}
+_TAGS = {tag: tag for tag in _COMPACT_TAGS}
+_COMPACT_TAG_NAMES = {short: tag for tag, short in _COMPACT_TAGS.items()}
+# keys of shared objects (share_references) in wire format 1 and 2
+_REF_KEY = '__ref__'
+_ID_KEY = '__id__'
+_COMPACT_REF_KEY = '@r'
+_COMPACT_ID_KEY = '@i'
+# envelope of a compact document as written by to_json/iter_encode (see StrongJson._loads_compact)
+_COMPACT_ENVELOPE_RE = re.compile(r'\s*\{\s*"@v"\s*:\s*')
+_COMPACT_FIELD_RE = re.compile(r'\s*,\s*"([_~])"\s*:\s*')
+_COMPACT_END_RE = re.compile(r'\s*\}\s*\Z')
 
 
 class StrongJsonWarning(Warning):
@@ -45,13 +114,534 @@ class MissingOptionalDependencyError(StrongJsonError):
     pass
 
 
+class _SharedReferences(StrongJsonError):
+    """Document has shared references and can't be decoded in the parser."""
+
+
+class JsonBackend:
+    """json library used to turn the tagged tree into text and back. This one is the standard library.
+    Subclasses must produce the same tree on loads and the same document on dumps
+    (up to formatting they can't do, where they should fall back to this class).
+    """
+    name = 'json'
+
+    def dumps(self, obj: JSONPrimitive, **kwd) -> str:
+        """Same as json.dumps. Trees too deep for it are written without recursion (unless cls is given).
+
+        Args:
+            obj (JSONPrimitive): tagged tree
+            **kwd (): json.dumps keyword arguments
+
+        Returns:
+            str. Json string
+        """
+        try:
+            return json.dumps(obj, **kwd)
+        except RecursionError:
+            if 'cls' in kwd:
+                raise
+        # a cycle would never end without the check
+        return ''.join(_iter_json(obj, **dict(kwd, check_circular=True)))
+
+    def loads(self, s: Union[str, bytes], **kwd) -> JSONPrimitive:
+        """Same as json.loads. Documents too deep for it are read without recursion (unless cls is given).
+
+        Args:
+            s (Union[str, bytes]): json string
+            **kwd (): json.loads keyword arguments
+
+        Returns:
+            JSONPrimitive. tagged tree
+        """
+        try:
+            return json.loads(s, **kwd)
+        except RecursionError:
+            if 'cls' in kwd:
+                raise
+        return _loads_json(s, **kwd)
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+
+class OrjsonBackend(JsonBackend):
+    """orjson backend.
+
+    Keyword arguments mean the same as in json.dumps and so does the output. orjson only writes
+    compact or 2 space indented utf-8 json, so it is used when asked for one of those:
+    separators=(',', ':'), ensure_ascii=False, or indent=2, ensure_ascii=False (sort_keys may be given).
+    Anything else, and anything orjson can't serialize (ex: int over 64 bits), goes to the standard library.
+    So do trees holding floats orjson writes differently: nan and inf (null vs NaN, Infinity) and
+    floats json writes in exponent form (1e16 vs 1e+16, 0.00001 vs 1e-05).
+    Documents are read by orjson and read again by the standard library when they hold a float of 2 ** 63
+    or more in magnitude, which may be an integer over 64 bits orjson read as float.
+    """
+    name = 'orjson'
+
+    def dumps(self, obj: JSONPrimitive, **kwd) -> str:
+        option = self._option(kwd)
+        if option is None:
+            return super().dumps(obj, **kwd)
+        try:
+            s = orjson.dumps(obj, option=option)
+        except TypeError:
+            return super().dumps(obj, **kwd)
+        if _ORJSON_FLOAT_HINT.search(s) and _has_special_float(obj):
+            return super().dumps(obj, **kwd)
+        return s.decode('utf-8')
+
+    @staticmethod
+    def _option(kwd: Dict[str, Any]) -> Optional[int]:
+        """orjson option equivalent to json.dumps keyword arguments. None if there is none."""
+        kwd = dict(kwd)
+        indent = kwd.pop('indent', None)
+        if indent not in (None, 2):
+            return None
+        option = orjson.OPT_INDENT_2 if indent else 0
+        if kwd.pop('sort_keys', False):
+            option |= orjson.OPT_SORT_KEYS
+        separators = kwd.pop('separators', None)
+        if indent and separators not in (None, (',', ': ')) or not indent and separators != (',', ':'):
+            return None
+        if kwd.pop('ensure_ascii', True):
+            return None
+        return None if kwd else option
+
+    def loads(self, s: Union[str, bytes], **kwd) -> JSONPrimitive:
+        if kwd:
+            return super().loads(s, **kwd)
+        try:
+            d = orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return super().loads(s)  # NaN, Infinity etc. or a real error with the usual message
+        if _has_big_float(d):  # orjson reads integers over 64 bits as float
+            return super().loads(s)
+        return d
+
+    @classmethod
+    def available(cls) -> bool:
+        return orjson is not None
+
+
+# what orjson writes for nan, inf and floats json writes in exponent form; strings may match too
+_ORJSON_FLOAT_HINT = re.compile(rb'null|\de|0\.0000')
+
+
+def _has_special_float(obj: JSONPrimitive) -> bool:
+    """Whether the tree holds nan, inf or a float json writes in exponent form (under 1e-4 or from 1e16)."""
+    stack = [obj]
+    pop = stack.pop
+    while stack:
+        v = pop()
+        t = type(v)
+        if t is float:
+            if not v - v == 0.0 or v and not 1e-4 <= abs(v) < 1e16:
+                return True
+        elif t is list or t is tuple:
+            stack.extend(v)
+        elif t is dict:
+            stack.extend(v.values())
+    return False
+
+
+# orjson reads integers which do not fit in 64 bits as floats at or above this magnitude
+_INT64_LIMIT = float(2 ** 63)
+
+
+def _has_big_float(obj: JSONPrimitive) -> bool:
+    """Whether the tree holds a float of at least 2 ** 63 in magnitude, which may have been an integer."""
+    t = type(obj)
+    if t is not list and t is not dict:
+        return t is float and not -_INT64_LIMIT < obj < _INT64_LIMIT
+    stack = [obj]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        v = pop()
+        for x in v.values() if type(v) is dict else v:  # only containers are pushed, scalars are checked here
+            t = type(x)
+            if t is float:
+                if not -_INT64_LIMIT < x < _INT64_LIMIT:
+                    return True
+            elif t is list or t is dict:
+                push(x)
+    return False
+
+
+_BACKENDS = OrderedDict([
+    ('orjson', OrjsonBackend),
+    ('json', JsonBackend),
+])
+
+
+def get_backend(backend: Union[str, JsonBackend]) -> JsonBackend:
+    """Find json backend by name.
+
+    Args:
+        backend (Union[str, JsonBackend]): 'json', 'orjson', 'auto' (fastest installed) or JsonBackend instance.
+
+    Returns:
+        JsonBackend
+    """
+    if isinstance(backend, JsonBackend):
+        return backend
+    if backend == 'auto':
+        return next(cls() for cls in _BACKENDS.values() if cls.available())
+    if backend not in _BACKENDS:
+        raise StrongJsonError(f'Unknown json backend {backend!r}. Expect one of {list(_BACKENDS)} or auto')
+    cls = _BACKENDS[backend]
+    if not cls.available():
+        warnings.warn(f'{backend} is not installed. Fall back to json', StrongJsonWarning)
+        return JsonBackend()
+    return cls()
+
+
+def _iter_json(o: JSONPrimitive, skipkeys: bool = False, ensure_ascii: bool = True, check_circular: bool = True,
+               allow_nan: bool = True, sort_keys: bool = False, indent: Union[int, str, None] = None,
+               separators: Optional[Tuple[str, str]] = None, default: Optional[Callable[[Any], Any]] = None) \
+        -> Iterator[str]:
+    """Same as json.JSONEncoder(**kwd).iterencode(o) but containers are written with an explicit stack,
+    so any depth works.
+    """
+    if indent is not None and not isinstance(indent, str):
+        indent = ' ' * indent
+    if separators is not None:
+        item_separator, key_separator = separators
+    elif indent is not None:
+        item_separator, key_separator = ',', ': '
+    else:
+        item_separator, key_separator = ', ', ': '
+    encode_str = json.encoder.encode_basestring_ascii if ensure_ascii else json.encoder.encode_basestring
+    markers = {} if check_circular else None  # type: Optional[Dict[int, Any]]
+
+    def floatstr(v: float) -> str:
+        if v - v == 0.0:
+            return float.__repr__(v)
+        if not allow_nan:
+            raise ValueError('Out of range float values are not JSON compliant: ' + repr(v))
+        return 'NaN' if v != v else 'Infinity' if v > 0 else '-Infinity'
+
+    chunks = []  # type: List[str]
+    append = chunks.append
+    # [items, is dict, marker id, item separator, closing, first item]; default() results get
+    # a frame without items so that their marker is held until they are written
+    stack = []  # type: List[List[Any]]
+    level = 0
+    v = o
+    while True:
+        if isinstance(v, str):
+            append(encode_str(v))
+        elif v is None:
+            append('null')
+        elif v is True:
+            append('true')
+        elif v is False:
+            append('false')
+        elif isinstance(v, int):
+            append(int.__repr__(v))
+        elif isinstance(v, float):
+            append(floatstr(v))
+        else:
+            is_list = isinstance(v, (list, tuple))
+            if not is_list and not isinstance(v, dict):
+                marker = None
+                if markers is not None:
+                    marker = id(v)
+                    if marker in markers:
+                        raise ValueError('Circular reference detected')
+                    markers[marker] = v
+                if default is None:
+                    raise TypeError(f'Object of type {v.__class__.__name__} is not JSON serializable')
+                stack.append([iter(()), False, marker, '', '', True])
+                v = default(v)
+                continue
+            if not v:
+                append('[]' if is_list else '{}')
+            else:
+                marker = None
+                if markers is not None:
+                    marker = id(getattr(v, '_origin', v))  # what a streamed container is built from
+                    if marker in markers:
+                        raise ValueError('Circular reference detected')
+                    markers[marker] = v
+                opening, closing = ('[', ']') if is_list else ('{', '}')
+                if indent is None:
+                    append(opening)
+                    separator = item_separator
+                else:
+                    level += 1
+                    newline = '\n' + indent * level
+                    append(opening + newline)
+                    separator = item_separator + newline
+                    closing = '\n' + indent * (level - 1) + closing
+                items = v if is_list else sorted(v.items()) if sort_keys else v.items()
+                stack.append([iter(items), not is_list, marker, separator, closing, True])
+        yield ''.join(chunks)
+        chunks.clear()
+        # next value to write
+        while stack:
+            frame = stack[-1]
+            item = next(frame[0], _FINISH)
+            if item is _FINISH:
+                stack.pop()
+                if frame[4]:
+                    append(frame[4])
+                    if indent is not None:
+                        level -= 1
+                if frame[2] is not None:
+                    del markers[frame[2]]
+                continue
+            if frame[1]:
+                key, item = item
+                if isinstance(key, str):
+                    pass
+                elif isinstance(key, float):
+                    key = floatstr(key)
+                elif key is True:
+                    key = 'true'
+                elif key is False:
+                    key = 'false'
+                elif key is None:
+                    key = 'null'
+                elif isinstance(key, int):
+                    key = int.__repr__(key)
+                elif skipkeys:
+                    continue
+                else:
+                    raise TypeError(f'keys must be str, int, float, bool or None, not {key.__class__.__name__}')
+                if frame[5]:
+                    frame[5] = False
+                    append(encode_str(key) + key_separator)
+                else:
+                    append(frame[3] + encode_str(key) + key_separator)
+            elif frame[5]:
+                frame[5] = False
+            else:
+                append(frame[3])
+            v = item
+            break
+        else:
+            break
+    if chunks:
+        yield ''.join(chunks)
+
+
+def _loads_json(s: Union[str, bytes], object_hook: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                parse_float: Optional[Callable[[str], Any]] = None, parse_int: Optional[Callable[[str], Any]] = None,
+                parse_constant: Optional[Callable[[str], Any]] = None,
+                object_pairs_hook: Optional[Callable[[List[Tuple[str, Any]]], Any]] = None,
+                strict: bool = True) -> Any:
+    """Same as json.loads but containers are read with an explicit stack, so any depth works."""
+    if isinstance(s, (bytes, bytearray)):
+        s = s.decode(json.detect_encoding(s), 'surrogatepass')
+    elif s.startswith('\ufeff'):
+        raise json.JSONDecodeError('Unexpected UTF-8 BOM (decode using utf-8-sig)', s, 0)
+    parse_float = parse_float or float
+    parse_int = parse_int or int
+    parse_constant = parse_constant or _JSON_CONSTANTS.__getitem__
+    scanstring = json.decoder.scanstring
+    skip = json.decoder.WHITESPACE.match
+    number = json.scanner.NUMBER_RE.match
+
+    def make_object(pairs: List[Tuple[str, Any]]) -> Any:
+        if object_pairs_hook is not None:
+            return object_pairs_hook(pairs)
+        d = dict(pairs)
+        return d if object_hook is None else object_hook(d)
+
+    def read_key(pos: int) -> Tuple[str, int]:
+        if s[pos:pos + 1] != '"':
+            raise json.JSONDecodeError('Expecting property name enclosed in double quotes', s, pos)
+        key, pos = scanstring(s, pos + 1, strict)
+        pos = skip(s, pos).end()
+        if s[pos:pos + 1] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", s, pos)
+        return key, skip(s, pos + 1).end()
+
+    # containers being read: [list] or [pairs, key]
+    stack = []  # type: List[List[Any]]
+    pos = skip(s, 0).end()
+    while True:
+        c = s[pos:pos + 1]
+        if c == '"':
+            v, pos = scanstring(s, pos + 1, strict)
+        elif c == '{':
+            pos = skip(s, pos + 1).end()
+            if s[pos:pos + 1] == '}':
+                v = make_object([])
+                pos += 1
+            else:
+                key, pos = read_key(pos)
+                stack.append([[], key])
+                continue
+        elif c == '[':
+            pos = skip(s, pos + 1).end()
+            if s[pos:pos + 1] == ']':
+                v = []
+                pos += 1
+            else:
+                stack.append([[]])
+                continue
+        elif c == 'n' and s.startswith('null', pos):
+            v = None
+            pos += 4
+        elif c == 't' and s.startswith('true', pos):
+            v = True
+            pos += 4
+        elif c == 'f' and s.startswith('false', pos):
+            v = False
+            pos += 5
+        elif c == 'N' and s.startswith('NaN', pos):
+            v = parse_constant('NaN')
+            pos += 3
+        elif c == 'I' and s.startswith('Infinity', pos):
+            v = parse_constant('Infinity')
+            pos += 8
+        elif c == '-' and s.startswith('-Infinity', pos):
+            v = parse_constant('-Infinity')
+            pos += 9
+        else:
+            m = number(s, pos)
+            if m is None:
+                raise json.JSONDecodeError('Expecting value', s, pos)
+            integer, frac, exp = m.groups()
+            v = parse_float(integer + (frac or '') + (exp or '')) if frac or exp else parse_int(integer)
+            pos = m.end()
+        # put v in its container and find the next value
+        while stack:
+            frame = stack[-1]
+            pos = skip(s, pos).end()
+            c = s[pos:pos + 1]
+            if len(frame) == 1:
+                frame[0].append(v)
+                if c == ',':
+                    pos = skip(s, pos + 1).end()
+                    break
+                if c != ']':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", s, pos)
+                v = frame[0]
+            else:
+                frame[0].append((frame[1], v))
+                if c == ',':
+                    frame[1], pos = read_key(skip(s, pos + 1).end())
+                    break
+                if c != '}':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", s, pos)
+                v = make_object(frame[0])
+            stack.pop()
+            pos += 1
+        else:
+            break
+    pos = skip(s, pos).end()
+    if pos != len(s):
+        raise json.JSONDecodeError('Extra data', s, pos)
+    return v
+
+
+_JSON_CONSTANTS = {'NaN': math.nan, 'Infinity': math.inf, '-Infinity': -math.inf}
+
+
+def _json_size(v: JSONPrimitive) -> int:
+    """Length of json text of v, with raw buffers (bytes, memoryview) counted as their byte length."""
+    raw = [0, 0]  # buffer count, buffer bytes
+
+    def default(o: Any) -> str:
+        if not isinstance(o, (bytes, bytearray, memoryview)):
+            raise TypeError('Object of type %s is not JSON serializable' % type(o).__name__)
+        raw[0] += 1
+        raw[1] += memoryview(o).nbytes
+        return ''
+
+    return len(json.dumps(v, default=default)) - 2 * raw[0] + raw[1]  # '""' stands in for each buffer
+
+
+class StatsCollector:
+    """Call count, time and size of values encoded/decoded by a StrongJson, per type.
+
+    Values are keyed by the python type they are encoded from or decoded to: class name for
+    classes, 'list', 'dict', 'tuple', 'set', 'date', 'datetime', 'float' (nan and inf only),
+    'numpy.ndarray', 'pandas.DataFrame', ... json primitives are not recorded.
+    Time spent in nested values is counted in 'seconds' of every enclosing value and in
+    'self_seconds' of the innermost one only.
+
+    Not thread safe; use one collector per thread.
+    """
+
+    def __init__(self, sizes: bool = False):
+        """
+
+        Args:
+            sizes (bool): Optional. Default False.
+                also record the size of the json text of every value (nested values included).
+                Raw buffers of to_bytes/from_bytes count as their length in bytes.
+                This dumps every value again and is slow for deep documents.
+        """
+        self.sizes = sizes
+        self._entries = {}  # type: Dict[Tuple[str, str], List[Any]]
+        self._child_seconds = [0.0]
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        self._entries = {}
+        self._child_seconds = [0.0]
+
+    def _call(self, direction: str, key: str, fn: Callable[[Any], Any], arg: Any) -> Any:
+        child_seconds = self._child_seconds
+        child_seconds.append(0.0)
+        start = time.perf_counter()
+        try:
+            result = fn(arg)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = child_seconds.pop()
+            child_seconds[-1] += elapsed
+            try:
+                entry = self._entries[direction, key]
+            except KeyError:
+                entry = self._entries[direction, key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += elapsed - nested
+        if self.sizes:
+            entry[3] += _json_size(result if direction == 'encode' else arg)
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Union[int, float]]]]:
+        """Recorded stats as plain dict.
+
+        Returns:
+            Dict. {'encode': {key: stats}, 'decode': {key: stats}} where stats is
+            {'count': int, 'seconds': float, 'self_seconds': float} plus 'size' (characters)
+            if sizes is on. Keys are sorted by self_seconds, largest first.
+        """
+        ret = {'encode': {}, 'decode': {}}  # type: Dict[str, Dict[str, Dict[str, Union[int, float]]]]
+        for (direction, key), (count, seconds, self_seconds, size) in \
+                sorted(self._entries.items(), key=lambda item: -item[1][2]):
+            stats = ret[direction][key] = {'count': count, 'seconds': seconds, 'self_seconds': self_seconds}
+            if self.sizes:
+                stats['size'] = size
+        return ret
+
+
 class StrongJson:
     # TODO: Make this more modular
     def __init__(self,
                  class_map: ClassMap,
                  type_key: str = '__type__',
                  data_key: str = '__data__',
-                 treat_dict_as_ordered_dict: bool = True):
+                 treat_dict_as_ordered_dict: bool = True,
+                 single_pass_decode: bool = False,
+                 binary_ndarray: bool = False,
+                 columnar_dataframe: bool = False,
+                 backend: Union[str, 'JsonBackend'] = 'json',
+                 wire_format: int = 1,
+                 share_references: bool = False,
+                 intern_keys: bool = False,
+                 intern_values: int = 0,
+                 stats: Optional[StatsCollector] = None,
+                 encode_cache: int = 0,
+                 encode_cache_policy: str = 'lru'):
         """
 
         Args:
@@ -60,39 +650,1145 @@ class StrongJson:
             data_key (str): Optional Default '__data__'.
             treat_dict_as_ordered_dict (bool): Optional. Default True.
                 treat all dictionary as ordered dict(python 3.6)
+            single_pass_decode (bool): Optional. Default False.
+                from_json constructs objects from inside the json parser (object_hook)
+                instead of walking the parsed tree afterward. Ignored if from_json_dict is overridden,
+                or if class_map has FromJsonable classes or decoders are registered (they are given
+                the json dict, so the tree is decoded afterward).
+            binary_ndarray (bool): Optional. Default False.
+                dump numpy.ndarray as dtype, shape and base64 of the raw buffer instead of nested list.
+                Arrays of python objects are always dumped as list.
+            columnar_dataframe (bool): Optional. Default False.
+                dump pandas.DataFrame column by column with its dtypes instead of via to_dict.
+                Numeric columns go through the numpy.ndarray encoder (see binary_ndarray).
+            backend (Union[str, JsonBackend]): Optional. Default 'json'.
+                json library used by to_json/from_json: 'json' (standard library), 'orjson',
+                'auto' (fastest installed) or a JsonBackend instance.
+                Falls back to the standard library if the library is not installed.
+            wire_format (int): Optional. Default 1.
+                document format written by to_json, dump and dump_lines. 2 is the compact format:
+                short tags, dict as flat [key, value, ...] list, date/datetime as list of fields
+                and class names stored once per document in a tag table.
+                Both formats are read regardless of this setting.
+            share_references (bool): Optional. Default False.
+                write objects reachable more than once (and cycles) only once. Later occurrences
+                become {"__ref__": n} and the first one gets "__id__": n. Immutable values
+                (numbers, str, date, datetime, Enum) are always written in full.
+                Documents with references are read regardless of this setting.
+            intern_keys (bool): Optional. Default False.
+                decoded dict keys equal to each other are the same str object, also across documents.
+            intern_values (int): Optional. Default 0.
+                same for decoded str values of at most this length. 0 turns it off.
+                Interned strings are kept in a table shared by every call on this StrongJson;
+                once it holds 65536 strings, new ones are no longer added.
+                Interning turns single_pass_decode off.
+            stats (StatsCollector): Optional. Default None.
+                record count and time of every value encoded/decoded, per type. See collect_stats.
+                Recording turns single_pass_decode off. None records nothing and costs nothing.
+            encode_cache (int): Optional. Default 0.
+                keep the json of up to this many Enum, date, datetime and small tuple (up to 8 str,
+                int, bool or None) values and reuse it when they are encoded again. 0 turns it off.
+                Cached json is shared by every document encoded; don't modify to_json_dict output.
+                Not used with share_references. See encode_cache_info.
+            encode_cache_policy (str): Optional. Default 'lru'.
+                which value goes when the cache is full: 'lru' (least recently used)
+                or 'fifo' (oldest; a bit cheaper per hit).
         """
+        if wire_format not in (1, 2):
+            raise StrongJsonError(f'Unknown wire format {wire_format!r}')
+        if encode_cache_policy not in _CACHE_POLICIES:
+            raise StrongJsonError(
+                f'Unknown encode cache policy {encode_cache_policy!r}. Expect one of {_CACHE_POLICIES}')
         self.class_map = class_map
         self.type_key = type_key
         self.data_key = data_key
         self.treat_dict_as_ordered_dict = treat_dict_as_ordered_dict
+        self.single_pass_decode = single_pass_decode
+        self.binary_ndarray = binary_ndarray
+        self.columnar_dataframe = columnar_dataframe
+        self.backend = get_backend(backend)
+        self.wire_format = wire_format
+        self.share_references = share_references
+        self.intern_keys = intern_keys
+        self.intern_values = intern_values
+        self.stats = stats
+        self.encode_cache = encode_cache
+        self.encode_cache_policy = encode_cache_policy
+        self._intern_table = {}  # type: Dict[str, str]
+        self._encode_cache = _EncodeCache(encode_cache, encode_cache_policy) if encode_cache > 0 else None
+        # builtin type tags, and the class name table of a compact (wire format 2) session
+        self._tag_names = _TAGS
+        self._tag_table = None  # type: Optional[List[str]]
+        self._tag_index = None  # type: Optional[Dict[str, int]]
+        self._plain_type_key = type_key  # type_key of wire format 1, kept by compact sessions
+        self._ref_key = _REF_KEY
+        self._id_key = _ID_KEY
+        # id -> object table while decoding a document with shared references
+        self._refs = None  # type: Optional[Dict[int, Any]]
+        self._sidecar = None  # type: Optional[_Sidecar]
+        # ndarray buffers are written as raw bytes nodes (to_bytes)
+        self._binary = False
+        self._compiled = False
+        # generated by compile; called as fn(self, v) and fn(self, d)
+        self._compiled_encoders = {}  # type: Dict[Type[Any], Callable[[StrongJson, Any], JSONPrimitive]]
+        self._compiled_decoders = {}  # type: Dict[Type[Any], Callable[[StrongJson, Dict[str, JSONPrimitive]], Any]]
+        self._registered_encoders = {}  # type: Dict[Type[Any], Callable[[Any, StrongJson], JSONPrimitive]]
+        self._build_encoders()
+        self._registered_decoders = {}  # type: Dict[str, Callable[[Dict[str, JSONPrimitive], StrongJson], Any]]
+        self._build_decoders()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle the configuration only. Dispatch tables and generated code are rebuilt on unpickle."""
+        return {k: v for k, v in self.__dict__.items() if k not in _DERIVED_ATTRIBUTES}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._intern_table = {}
+        self._encode_cache = _EncodeCache(self.encode_cache, self.encode_cache_policy) \
+            if self.encode_cache > 0 else None
+        self._compiled_encoders = {}
+        self._compiled_decoders = {}
+        self._build_encoders()
+        self._build_decoders()
+        if self._compiled:
+            self.compile()
+
+    def __copy__(self) -> 'StrongJson':
+        other = type(self).__new__(type(self))
+        other.__dict__.update(self.__dict__)
+        return other
+
+    def _session(self, **state) -> 'StrongJson':
+        """Copy of this StrongJson holding per call state.
+        Dispatch tables are rebuilt so that recursion stays in the copy.
+        Per class field readers and decode plans depend only on the class; they are shared.
+        """
+        session = copy.copy(self)
+        session.__dict__.update(state)
+        session._build_encoders()
+        session._build_decoders()
+        session._field_readers = self._field_readers
+        session._class_plans = self._class_plans
+        return session
+
+    def _compact_session(self, tag_table: List[str]) -> 'StrongJson':
+        """Session reading/writing the payload of a compact (wire format 2) document."""
+        return self._session(type_key=_COMPACT_TYPE_KEY, data_key=_COMPACT_DATA_KEY,
+                             _tag_names=_COMPACT_TAGS, _ref_key=_COMPACT_REF_KEY, _id_key=_COMPACT_ID_KEY,
+                             _tag_table=tag_table,
+                             _tag_index={name: i for i, name in enumerate(tag_table)})
+
+    def _class_tag(self, name: str) -> Union[str, int]:
+        """Type tag for class name. Index into the tag table in a compact session."""
+        index = self._tag_index
+        if index is None:
+            return name
+        try:
+            return index[name]
+        except KeyError:
+            i = index[name] = len(self._tag_table)
+            self._tag_table.append(name)
+            return i
+
+    @contextmanager
+    def collect_stats(self, stats: Optional[StatsCollector] = None) -> Iterator[StatsCollector]:
+        """Record stats of every call on this StrongJson inside the with block.
+
+        with custom_json.collect_stats() as stats:
+            custom_json.to_json(obj)
+        stats.summary()
+
+        Args:
+            stats (StatsCollector): Optional. Collector to record into. Default a new one.
 
-    def to_json(self, obj: Any, **kwd) -> str:
+        Returns:
+            Iterator[StatsCollector]. Context manager yielding the collector.
+        """
+        previous = self.stats
+        self.stats = StatsCollector() if stats is None else stats
+        self._build_encoders()
+        self._build_decoders()
+        try:
+            yield self.stats
+        finally:
+            self.stats = previous
+            self._build_encoders()
+            self._build_decoders()
+
+    def _encode_with_stats(self, v: Any) -> JSONPrimitive:
+        """to_json_dict while stats is on."""
+        cls = type(v)
+        if cls in _JSON_SCALARS or cls is float and v - v == 0.0:
+            return self._inner_to_json_dict(v)
+        return self.stats._call('encode', _stats_key(cls), self._inner_to_json_dict, v)
+
+    def _decode_with_stats(self, d: JSONPrimitive) -> Any:
+        """from_json_dict while stats is on."""
+        if type(d) is list:
+            key = 'list'
+        elif type(d) is not dict:
+            return self._inner_from_json_dict(d)
+        elif self.type_key in d:
+            key = self._tag_name(d[self.type_key])
+        else:
+            key = 'dict'
+        return self.stats._call('decode', key, self._inner_from_json_dict, d)
+
+    def _tag_name(self, tag: Union[str, int]) -> str:
+        """Class or builtin type name of a type tag."""
+        if self._tag_table is None:
+            return str(tag)
+        if type(tag) is int and 0 <= tag < len(self._tag_table):
+            return self._tag_table[tag]
+        return _COMPACT_TAG_NAMES.get(tag, str(tag))
+
+    def to_json(self, obj: Any, workers: int = 1, schema: Any = None, **kwd) -> str:
         """ Convert object to json string
 
         Args:
             obj (Any): object
-            **kwd (): keyword arguments will be passed down to json.dumps
+            workers (int): Optional. Default 1.
+                with workers > 1, lists of at least 4096 elements (at any depth) are split into chunks
+                encoded in a process pool and the pieces are joined back in order. The output is
+                the same. Workers get a pickled copy of this StrongJson, so class_map (and registered
+                encoders) and the list elements must be picklable.
+                Encoding is serial anyway with indent, wire_format 2, share_references or if
+                to_json_dict/default_to_json_dict is overridden.
+            schema (Any): Optional. Default None.
+                type of obj (class or typing annotation like List[User]). Values whose type is known
+                from schema and the constructor annotations are written without type tag:
+                objects as plain dict, Enum as name, date/datetime in iso format, tuple/set as list.
+                Read it back with from_json(s, target=schema). See from_json.
+            **kwd (): keyword arguments will be passed down to json.dumps (see JsonBackend.dumps)
 
         Returns:
             str. Json String.
 
         """
-        d = self.to_json_dict(obj)
-        return json.dumps(d, **kwd)
+        if schema is not None:
+            return self.backend.dumps(self._schema_codec(schema)[0](obj), **kwd)
+        if workers > 1 and kwd.get('indent') is None and self.wire_format == 1 and not self.share_references \
+                and self._iterative_encode:
+            return self._to_json_parallel(obj, workers, **kwd)
+        return self.backend.dumps(self._encode_document(obj), **kwd)
+
+    def _to_json_parallel(self, obj: Any, workers: int, **kwd) -> str:
+        """to_json with big lists encoded in worker processes.
+        Big lists are replaced by placeholder strings, then the placeholders in the json text
+        are replaced by the lists encoded by the workers.
+        """
+        if list in self._registered_encoders:
+            return self.backend.dumps(self._encode_document(obj), **kwd)
+        big_lists = []  # type: List[list]
+        placeholder = f'@@strong_json-{uuid.uuid4().hex}-%d@@'
+
+        def split_list(v: list) -> JSONPrimitive:
+            if len(v) < _PARALLEL_THRESHOLD:
+                return session._encode_list(v)
+            big_lists.append(v)
+            return placeholder % (len(big_lists) - 1)
+
+        session = self._session()
+        session._encoders[list] = session._encoder_cache[list] = split_list
+        s = self.backend.dumps(session.to_json_dict(obj), **kwd)
+        if not big_lists:
+            return s
+        separator = self.backend.dumps([0, 0], **kwd)[2:-2]
+        chunk_size = max(_PARALLEL_THRESHOLD // 4, sum(map(len, big_lists)) // (workers * _CHUNKS_PER_WORKER))
+        tasks = [(i, v[start:start + chunk_size]) for i, v in enumerate(big_lists)
+                 for start in range(0, len(v), chunk_size)]
+        pieces = [[] for _ in big_lists]  # type: List[List[str]]
+        with _worker_pool(workers, self) as executor:
+            for (i, _), piece in zip(tasks, executor.map(_encode_items, [items for _, items in tasks],
+                                                         itertools.repeat(separator), itertools.repeat(kwd))):
+                pieces[i].append(piece)
+        prefix, suffix = self.backend.dumps(placeholder, **kwd).split('%d')
+        pattern = re.compile(re.escape(prefix) + r'(\d+)' + re.escape(suffix))
+        return pattern.sub(lambda m: '[' + separator.join(pieces[int(m.group(1))]) + ']', s)
+
+    def iter_encode(self, obj: Any, **kwd) -> Iterator[str]:
+        """Encode object to json string chunk by chunk.
+
+        The result is the same as to_json but the tagged dict tree is built as it is
+        written out instead of all at once. A compact (wire_format=2) document has its tag
+        table after the payload then (left out if it is empty, as to_json does); with sort_keys
+        it is built all at once like to_json.
+
+        Args:
+            obj (Any): object
+            **kwd (): keyword arguments will be passed down to json.JSONEncoder (or cls if given)
 
-    def from_json(self, s: str, **kwd) -> Any:
+        Returns:
+            Iterator[str]. Chunks of json string.
+        """
+        cls = kwd.pop('cls', None)
+        # we can't tell what an override does; build the whole tree.
+        # sorting the envelope would read the tag table before the payload fills it.
+        stream = self._iterative_encode and not (self.wire_format == 2 and kwd.get('sort_keys'))
+        d = self._encode_document(obj, stream=stream)
+        if cls is None:  # same as json.JSONEncoder without recursion; a cycle would never end without the check
+            return _iter_json(d, **dict(kwd, check_circular=True))
+        return cls(**kwd).iterencode(d, _one_shot=False)
+
+    def _encode_document(self, obj: Any, stream: bool = False) -> JSONPrimitive:
+        """Top level json friendly object written by to_json (or iter_encode if stream)
+        according to wire_format and share_references.
+        """
+        session = self if self.wire_format == 1 else self._compact_session([])
+        if self.share_references:
+            d = session._encode_shared_document(obj)  # needs the whole tree
+            stream = False
+        elif stream:
+            d = session._stream_node(obj)
+        else:
+            d = session.to_json_dict(obj)
+        if session is self:
+            return d
+        if stream:
+            return _CompactEnvelope(d, session._tag_table)
+        if session._tag_table:
+            return {_COMPACT_VERSION_KEY: 2, _COMPACT_TABLE_KEY: session._tag_table, _COMPACT_PAYLOAD_KEY: d}
+        return {_COMPACT_VERSION_KEY: 2, _COMPACT_PAYLOAD_KEY: d}
+
+    def _encode_shared_document(self, obj: Any) -> JSONPrimitive:
+        memo = {}  # type: Dict[int, List[Any]]
+        # cached json would be shared between documents; refs may add __id__ to it
+        session = self._session(_memo=memo, _n_refs=0, _encode_cache=None)
+        session._value_encoders = frozenset([
+            session._encode_float, session._encode_enum, session._encode_date, session._encode_datetime,
+            session._encode_compact_date, session._encode_compact_datetime])
+        session.default_to_json_dict = session._encode_shared
+        session._iterative_encode = False
+        d = session.to_json_dict(obj)
+        wrappers = {}
+        for _, n, node in memo.values():
+            if n is None:
+                continue
+            if type(node) is dict and self.type_key in node:
+                node[self._id_key] = n
+            else:  # list or str key dict: wrap it where it is
+                wrappers[id(node)] = {self.type_key: self._tag_names['ref'], self._id_key: n, self.data_key: node}
+        if session._n_refs == 0:
+            return d
+        return {self.type_key: self._tag_names['refs'], self.data_key: _replace_nodes(d, wrappers)}
+
+    def _encode_shared(self, v: Any) -> JSONPrimitive:
+        """default_to_json_dict of share_references session. memo is id -> [object, ref id, json node]."""
+        cls = type(v)
+        try:
+            encoder = self._encoder_cache[cls]
+        except KeyError:
+            encoder = self._encoder_cache[cls] = self._resolve_encoder(cls)
+        if encoder is None:
+            return v
+        if encoder in self._value_encoders:
+            return encoder(v)
+        memo = self._memo
+        entry = memo.get(id(v))
+        if entry is None:
+            # the object is kept in memo so that its id isn't reused by a temporary
+            entry = memo[id(v)] = [v, None, None]
+            node = entry[2] = encoder(v)
+            return node
+        node = entry[2]
+        if node is not None and type(node) is not dict and type(node) is not list:
+            return node  # encoded to a scalar; nothing to share
+        if entry[1] is None:
+            entry[1] = self._n_refs
+            self._n_refs += 1
+        return {self._ref_key: entry[1]}
+
+    def dump(self, obj: Any, fp: TextIO, **kwd) -> None:
+        """Write object as json to file like object fp. See iter_encode.
+
+        Args:
+            obj (Any): object
+            fp (TextIO): file like object with write method
+            **kwd (): keyword arguments will be passed down to json.JSONEncoder (or cls if given)
+
+        Returns:
+            None
+        """
+        write = fp.write
+        buf = []
+        size = 0
+        for chunk in self.iter_encode(obj, **kwd):
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= _DUMP_BUFFER_SIZE:
+                write(''.join(buf))
+                buf = []
+                size = 0
+        if buf:
+            write(''.join(buf))
+
+    def _stream_node(self, v: Any) -> JSONPrimitive:
+        """Same as to_json_dict except that containers are encoded lazily when json iterates them."""
+        cls = type(v)
+        try:
+            encoder = self._encoder_cache[cls]
+        except KeyError:
+            encoder = self._encoder_cache[cls] = self._resolve_encoder(cls)
+        if encoder is None:
+            return v
+        stream = _STREAM_ENCODERS.get(getattr(encoder, '__func__', None))
+        if stream is None:
+            if cls not in self._compiled_encoders:
+                return encoder(v)
+            stream = StrongJson._stream_object  # compiled encoders write the same thing as simple_object_dump
+        return stream(self, v)
+
+    def _stream_list(self, v: Iterable[Any]) -> JSONPrimitive:
+        return _LazyList(v, len(v), self._stream_node)
+
+    def _stream_compact_dict(self, v: Dict[Any, Any]) -> JSONPrimitive:
+        if len(v) == 0:
+            return {}
+        elif self._is_plain_dict(v):
+            return _LazyDict(v, self._stream_node)
+        return {
+            self.type_key: self._tag_names['dict'],
+            self.data_key: _LazyList(itertools.chain.from_iterable(v.items()), 2 * len(v), self._stream_node, v)
+        }
+
+    def _stream_dict(self, v: Dict[Any, Any]) -> JSONPrimitive:
+        if len(v) == 0:
+            return {}
+        elif self.treat_dict_as_ordered_dict or \
+                isinstance(v, OrderedDict) or \
+                not isinstance(next(iter(v.keys())), str) or \
+                self._has_reserved_keys(v):  # non str key normal dict
+            stream_node = self._stream_node
+            return {
+                self.type_key: 'dict',
+                self.data_key: _LazyList(v.items(), len(v),
+                                         lambda kv: {'key': stream_node(kv[0]), 'value': stream_node(kv[1])}, v)
+            }
+        else:  # assume str key
+            return _LazyDict(v, self._stream_node)
+
+    def _stream_tuple(self, v: tuple) -> JSONPrimitive:
+        return {
+            self.type_key: self._tag_names['tuple'],
+            self.data_key: _LazyList(v, len(v), self._stream_node)
+        }
+
+    def _stream_set(self, v: set) -> JSONPrimitive:
+        return {
+            self.type_key: self._tag_names['set'],
+            self.data_key: _LazyList(v, len(v), self._stream_node)
+        }
+
+    def _stream_object(self, v: Any) -> JSONPrimitive:
+        tmp = {self.type_key: self._object_tag(v)}
+        tmp.update(self._object_fields(v))
+        return _LazyDict(tmp, self._stream_node, v)
+
+    def _stream_to_jsonable(self, v: 'ToJsonable') -> JSONPrimitive:
+        if type(v).to_json_dict is ToJsonable.to_json_dict and \
+                type(self).simple_object_dump is StrongJson.simple_object_dump:
+            return self._stream_object(v)
+        return self._encode_to_jsonable(v)
+
+    def from_json(self, s: str, target: Any = None, select: Union[Iterable[str], 'Selector'] = None, **kwd) -> Any:
         """ Construct object from json string.
 
         Args:
             s (str): json string
-            **kwd (): The rest of keyword arguments will be passed down to json.loads
+            target (Any): Optional. Default None.
+                type of the document (class or typing annotation like List[User]) written by
+                to_json(obj, schema=target). Objects are constructed from the annotations of
+                their constructor instead of type tags. List, Tuple, Set, Dict (str, int, Enum
+                or date keys), Optional, Enum, date and datetime are understood; anything else
+                (Any, other Union, missing annotation, numpy, pandas) is read as a tagged value.
+            select (Union[Iterable[str], Selector]): Optional. Default None.
+                decode only the values at these paths (see Selector) and return {path: value}.
+                Nothing else in the document is constructed.
+            **kwd (): The rest of keyword arguments will be passed down to json.loads (see JsonBackend.loads)
 
         Returns:
             Any. Object constructed from json string.
         """
-        d = json.loads(s, **kwd)
+        if target is not None:
+            return self._schema_codec(target)[1](self.backend.loads(s, **kwd))
+        if select is not None:
+            if not isinstance(select, Selector):
+                select = Selector(select)
+            return self._select(self.backend.loads(s, **kwd), select)
+        if self.single_pass_decode and self._can_decode_in_parser() and \
+                'object_hook' not in kwd and 'object_pairs_hook' not in kwd:
+            if isinstance(s, (bytes, bytearray)):
+                s = s.decode(json.detect_encoding(s), 'surrogatepass')
+            if _COMPACT_ENVELOPE_RE.match(s):
+                return self._loads_compact(s, **kwd)
+            untagged = [None]
+            try:
+                d = json.loads(s, object_hook=self._object_hook(untagged), **kwd)
+            except _SharedReferences:
+                pass  # objects have to be registered before their children are decoded
+            except RecursionError:
+                pass  # too deep for the parser; read without recursion and decoded below
+            else:
+                # A dict decoded from a tagged one is data even if it looks like a document.
+                if d is not untagged[0] or not _is_compact_document(d):
+                    return d
+                # a compact document with its keys in an unusual order; the payload
+                # doesn't use type_key so parse it again without the hook.
+        return self._decode_document(self.backend.loads(s, **kwd))
+
+    def _loads_compact(self, s: str, **kwd) -> Any:
+        """from_json of a document starting with the compact envelope, with single_pass_decode.
+        The payload is decoded in the parser by the compact session when the tag table comes
+        before it (as to_json writes it). Otherwise the table may still follow the payload;
+        the document is parsed as it is and decoded afterward.
+        """
+        decode_plain = json.JSONDecoder(**kwd).raw_decode
+        version, pos = decode_plain(s, _COMPACT_ENVELOPE_RE.match(s).end())
+        field = _COMPACT_FIELD_RE.match(s, pos)
+        if version == 2 and field is not None and field.group(1) == _COMPACT_TABLE_KEY:
+            table, pos = decode_plain(s, field.end())
+            field = _COMPACT_FIELD_RE.match(s, pos)
+        else:
+            table = None
+        if type(table) is list and field is not None and field.group(1) == _COMPACT_PAYLOAD_KEY:
+            session = self._compact_session(table)
+            try:
+                d, pos = json.JSONDecoder(object_hook=session._object_hook(), **kwd).raw_decode(s, field.end())
+            except (_SharedReferences, RecursionError):
+                pass
+            else:
+                if _COMPACT_END_RE.match(s, pos):
+                    return d
+        return self._decode_document(self.backend.loads(s, **kwd))
+
+    def _decode_document(self, d: JSONPrimitive) -> Any:
+        """from_json_dict of a whole document, which may be a compact (wire format 2) one.
+        Only the top level can be a compact document; nested dicts are always data.
+        """
+        if _is_compact_document(d):
+            return self._decode_compact_document(d)
         return self.from_json_dict(d)
 
+    def _select(self, d: JSONPrimitive, selector: 'Selector') -> Dict[str, Any]:
+        if _is_compact_document(d):
+            if d[_COMPACT_VERSION_KEY] != 2:
+                self._decode_compact_document(d)  # raises
+            return self._compact_session(list(d.get(_COMPACT_TABLE_KEY, ())))._select(d[_COMPACT_PAYLOAD_KEY], selector)
+        raw = not (type(d) is dict and d.get(self.type_key) == self._tag_names['refs'])
+        if not raw:  # references can point anywhere; decode everything
+            d = self.from_json_dict(d)
+        return {path: self._select_path(d, steps, raw) for path, steps in zip(selector.paths, selector.steps)}
+
+    def _select_path(self, node: Any, steps: List[Union[str, int, object]], raw: bool) -> Any:
+        """Follow steps from node. raw nodes are json not decoded yet; only the one reached is decoded."""
+        for i, step in enumerate(steps):
+            if raw:
+                children = self._raw_children(node)
+                if children is None:  # can't look inside without decoding it
+                    node = self.from_json_dict(node)
+                    raw = False
+                else:
+                    node = children
+            if step is _SELECT_ALL:
+                if isinstance(node, collections.abc.Mapping):
+                    node = list(node.values())
+                elif not isinstance(node, collections.abc.Iterable) or isinstance(node, str):
+                    return None
+                return [self._select_path(x, steps[i + 1:], raw) for x in node]
+            node = _select_child(node, step, raw)
+            if node is None:
+                return None
+        return self.from_json_dict(node) if raw else node
+
+    def _raw_children(self, d: JSONPrimitive) -> Optional[Union[List[JSONPrimitive], Dict[Any, JSONPrimitive]]]:
+        """Children of json node d by field name/key/index as they would be decoded, still in json.
+        None if d has to be decoded to tell.
+        """
+        if type(d) is list:
+            return d
+        if type(d) is not dict:
+            return None
+        type_key = self.type_key
+        if type_key not in d:
+            return d
+        tag = d[type_key]
+        obj_class = self._tag_class(tag)
+        if obj_class is not None:
+            if issubclass(obj_class, (Enum, FromJsonable)) or \
+                    issubclass(obj_class, ToJsonable) and obj_class.to_json_dict is not ToJsonable.to_json_dict:
+                return None
+            return {k: v for k, v in d.items() if k != type_key}
+        names = self._tag_names
+        if tag == names['tuple'] or tag == names['set']:
+            return d[self.data_key]
+        if tag == names['dict']:
+            from_json_dict = self.from_json_dict
+            if self._tag_table is None:
+                return {from_json_dict(item['key']): item['value'] for item in d[self.data_key]}
+            it = iter(d[self.data_key])
+            return {from_json_dict(k): v for k, v in zip(it, it)}
+        return None
+
+    def from_json_lazy(self, s: Union[str, bytes], **kwd) -> Any:
+        """Same as from_json except that objects are constructed when they are first used.
+
+        Objects, numpy.ndarray, pandas.DataFrame and values of registered tags are returned as
+        proxies. The first attribute/item access, iteration, comparison etc. on a proxy decodes
+        the value with from_json_dict and the proxy forwards everything to it from then on.
+        isinstance works on proxies. Use materialize to get the object itself.
+        Lists, dicts and tuples are decoded right away with lazy elements; Enum, date, datetime,
+        float and set values are decoded right away. Documents with shared references are decoded eagerly.
+
+        Args:
+            s (Union[str, bytes]): json string
+            **kwd (): The rest of keyword arguments will be passed down to json.loads (see JsonBackend.loads)
+
+        Returns:
+            Any. Object constructed from json string, with proxies in place of tagged values.
+        """
+        d = self.backend.loads(s, **kwd)
+        if _is_compact_document(d):
+            if d[_COMPACT_VERSION_KEY] != 2:
+                return self._decode_compact_document(d)  # raises
+            session = self._compact_session(list(d.get(_COMPACT_TABLE_KEY, ())))
+            return session._decode_lazy(d[_COMPACT_PAYLOAD_KEY])
+        return self._decode_lazy(d)
+
+    def _decode_lazy(self, d: JSONPrimitive) -> Any:
+        if type(d) is list:
+            decode_lazy = self._decode_lazy
+            return [decode_lazy(x) for x in d]
+        if type(d) is not dict:
+            return self._decode_node(d)
+        if self.type_key not in d:
+            decode_lazy = self._decode_lazy
+            decode_key = self._intern if self.intern_keys else _identity
+            return {decode_key(k): decode_lazy(v) for k, v in d.items()}
+        tag = d[self.type_key]
+        names = self._tag_names
+        obj_class = self._tag_class(tag)
+        if obj_class is None and tag == names['dict']:
+            decode_lazy = self._decode_lazy
+            decode_key = self._decode_key if self.intern_keys else self.from_json_dict
+            if self._tag_table is None:
+                return {decode_key(item['key']): decode_lazy(item['value']) for item in d[self.data_key]}
+            it = iter(d[self.data_key])
+            return {decode_key(k): decode_lazy(v) for k, v in zip(it, it)}
+        if obj_class is None and tag == names['tuple']:
+            decode_lazy = self._decode_lazy
+            return tuple([decode_lazy(x) for x in d[self.data_key]])
+        if obj_class is None and tag in (names['refs'], names['float'], names['date'], names['datetime'],
+                                         names['set']) or obj_class is not None and issubclass(obj_class, Enum):
+            return self.from_json_dict(d)  # cheap, hashed, or needs the whole document
+        return _LazyProxy(d, self.from_json_dict)
+
+    def from_json_iter(self, fp: IO[Any], chunk_size: int = _READ_CHUNK_SIZE, **kwd) -> Iterator[Any]:
+        """Construct objects one by one from json document whose top level is an array.
+
+        fp is read chunk_size at a time and each array element is yielded as soon as it is
+        parsed, so memory use doesn't grow with the size of the document.
+
+        Args:
+            fp (IO[Any]): text or binary (utf-8) file like object with read method
+            chunk_size (int): Optional. number of characters (bytes) to read at a time
+            **kwd (): The rest of keyword arguments will be passed down to json.JSONDecoder
+
+        Returns:
+            Iterator[Any]. Objects constructed from each array element.
+        """
+        feed = self._array_feeder(**kwd)
+        while True:
+            chunk = fp.read(chunk_size)
+            yield from feed(chunk)
+            if not chunk:
+                return
+
+    def _array_feeder(self, **kwd) -> Callable[[Union[str, bytes]], List[Any]]:
+        """feed(chunk) for reading a top level array chunk by chunk (see from_json_iter).
+        It gives back the objects completed by chunk; an empty chunk means the end of the document.
+        """
+        if self.single_pass_decode and self._can_decode_in_parser() and \
+                'object_hook' not in kwd and 'object_pairs_hook' not in kwd:
+            decode_in_parser = json.JSONDecoder(object_hook=self._object_hook(), **kwd).raw_decode
+            decode_plain = json.JSONDecoder(**kwd).raw_decode
+
+            def raw_decode(s: str, pos: int) -> Tuple[Any, int]:
+                try:
+                    return decode_in_parser(s, pos)
+                except _SharedReferences:  # like from_json, decode this element afterward
+                    item, end = decode_plain(s, pos)
+                    return self.from_json_dict(item), end
+            parser = _ArrayStreamParser(raw_decode)
+            convert = None
+        else:
+            parser = _ArrayStreamParser(json.JSONDecoder(**kwd).raw_decode)
+            convert = self.from_json_dict
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+
+        def feed(chunk: Union[str, bytes]) -> List[Any]:
+            if isinstance(chunk, bytes):
+                chunk = text_decoder.decode(chunk, final=not chunk)
+            items = parser.feed(chunk, final=not chunk)
+            return items if convert is None else [convert(item) for item in items]
+        return feed
+
+    async def to_json_async(self, obj: Any, executor: Optional[Executor] = None, **kwd) -> str:
+        """to_json in executor so that the event loop isn't blocked by big objects.
+
+        Args:
+            obj (Any): object
+            executor (Executor): Optional. Default the event loop's default (thread pool) executor.
+                With a ProcessPoolExecutor, this StrongJson and obj must be picklable.
+            **kwd (): keyword arguments will be passed down to to_json
+
+        Returns:
+            str. Json String.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.to_json, obj, **kwd))
+
+    async def from_json_async(self, s: Union[str, bytes], executor: Optional[Executor] = None, **kwd) -> Any:
+        """from_json in executor. See to_json_async.
+
+        Args:
+            s (Union[str, bytes]): json string
+            executor (Executor): Optional. Default the event loop's default (thread pool) executor.
+            **kwd (): keyword arguments will be passed down to from_json
+
+        Returns:
+            Any. Object constructed from json string.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.from_json, s, **kwd))
+
+    async def dump_async(self, obj: Any, writer: 'asyncio.StreamWriter',
+                         executor: Optional[Executor] = None, **kwd) -> None:
+        """Write object as utf-8 json to writer (see iter_encode).
+
+        The json is encoded in executor a piece at a time and each piece is written
+        once writer has drained the previous one, so a slow reader doesn't make us buffer
+        the whole document.
+
+        Args:
+            obj (Any): object
+            writer (asyncio.StreamWriter): or anything with write(bytes) and coroutine drain()
+            executor (Executor): Optional. Default the event loop's default (thread pool) executor.
+                It has to run in the same process; don't use a ProcessPoolExecutor.
+            **kwd (): keyword arguments will be passed down to iter_encode
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_event_loop()
+        next_piece = functools.partial(_join_chunks, self.iter_encode(obj, **kwd), _DUMP_BUFFER_SIZE)
+        while True:
+            piece = await loop.run_in_executor(executor, next_piece)
+            if not piece:
+                return
+            writer.write(piece.encode('utf-8'))
+            await writer.drain()
+
+    async def load_async(self, reader: 'asyncio.StreamReader', executor: Optional[Executor] = None,
+                         **kwd) -> Any:
+        """Read reader to the end and construct object from it in executor.
+
+        Args:
+            reader (asyncio.StreamReader): or anything with coroutine read()
+            executor (Executor): Optional. Default the event loop's default (thread pool) executor.
+            **kwd (): keyword arguments will be passed down to from_json
+
+        Returns:
+            Any. Object constructed from the json read.
+        """
+        return await self.from_json_async(await reader.read(), executor, **kwd)
+
+    async def from_json_aiter(self, reader: 'asyncio.StreamReader', chunk_size: int = _READ_CHUNK_SIZE,
+                              executor: Optional[Executor] = None, **kwd) -> AsyncIterator[Any]:
+        """Async version of from_json_iter: objects one by one from a top level json array.
+
+        reader is read chunk_size bytes at a time and only after the objects of the previous
+        chunk have been consumed, so a slow consumer makes the sender wait instead of
+        filling up memory. Chunks are parsed in executor.
+
+        Args:
+            reader (asyncio.StreamReader): or anything with coroutine read(n)
+            chunk_size (int): Optional. number of bytes to read at a time
+            executor (Executor): Optional. Default the event loop's default (thread pool) executor.
+                It has to run in the same process; don't use a ProcessPoolExecutor.
+            **kwd (): The rest of keyword arguments will be passed down to json.JSONDecoder
+
+        Returns:
+            AsyncIterator[Any]. Objects constructed from each array element.
+        """
+        loop = asyncio.get_event_loop()
+        feed = self._array_feeder(**kwd)
+        while True:
+            chunk = await reader.read(chunk_size)
+            for item in await loop.run_in_executor(executor, feed, chunk):
+                yield item
+            if not chunk:
+                return
+
+    def dump_lines(self, objs: Iterable[Any], fp: TextIO, **kwd) -> None:
+        """Write objects as json lines (one json document per line).
+
+        Args:
+            objs (Iterable[Any]): objects
+            fp (TextIO): file like object with write method
+            **kwd (): keyword arguments will be passed down to json.dumps. Don't use indent.
+
+        Returns:
+            None
+        """
+        write = fp.write
+        for obj in objs:
+            write(self.to_json(obj, **kwd))
+            write('\n')
+
+    def load_lines(self, fp: IO[Any], workers: int = 1, iterator: bool = False) \
+            -> Union[List[Any], Iterator[Any]]:
+        """Construct objects from json lines starting at the current position of fp.
+
+        With workers > 1 the lines are decoded in a process pool. If fp is a file on disk,
+        it is split into byte ranges at line boundaries and each worker reads its own range.
+        Workers get a pickled copy of this StrongJson, so class_map (and registered
+        encoders/decoders) must be picklable.
+
+        Args:
+            fp (IO[Any]): text or binary file like object
+            workers (int): Optional. Default 1. number of worker processes
+            iterator (bool): Optional. Default False. return iterator instead of list
+
+        Returns:
+            Union[List[Any], Iterator[Any]]. Objects in the order of the lines.
+        """
+        if workers <= 1:
+            objs = (self.from_json(line) for line in fp if line.strip())
+        else:
+            objs = self._load_lines_parallel(fp, workers)
+        return objs if iterator else list(objs)
+
+    def _load_lines_parallel(self, fp: IO[Any], workers: int) -> Iterator[Any]:
+        path = getattr(fp, 'name', None)
+        position = None
+        if isinstance(path, str) and os.path.isfile(path):
+            try:
+                position = fp.tell()
+            except OSError:  # text file advanced with next(fp); read the rest of its lines
+                pass
+        if position is not None:
+            ranges = _split_lines(path, position, os.path.getsize(path), workers * _CHUNKS_PER_WORKER)
+            tasks = [(path, start, end) for start, end in zip(ranges, ranges[1:])]
+            task_fn = _decode_line_range
+            fp.seek(0, os.SEEK_END)  # consumed, like reading it line by line
+        else:
+            lines = [line for line in fp if line.strip()]
+            chunk_size = max(1, len(lines) // (workers * _CHUNKS_PER_WORKER))
+            tasks = [(lines[i:i + chunk_size],) for i in range(0, len(lines), chunk_size)]
+            task_fn = _decode_lines
+        if not tasks:
+            return
+        with _worker_pool(workers, self) as executor:
+            for objs in executor.map(task_fn, *zip(*tasks)):
+                yield from objs
+
+    def dump_snapshot(self, obj: Any, path: str, threshold: int = _SIDECAR_THRESHOLD, **kwd) -> None:
+        """Write object as json to path, with every numpy.ndarray of at least threshold bytes
+        saved in its own .npy file next to it (path.0.npy, path.1.npy, ...).
+        The json document only keeps the file name. Everything is written to temporary files first
+        and moved into place at the end, so arrays of an earlier snapshot at the same path which are
+        still memory mapped keep their data. .npy files of that snapshot which this one doesn't use are removed.
+
+        Args:
+            obj (Any): object
+            path (str): path of the json document
+            threshold (int): Optional. Default 1MB. minimum size in bytes of arrays saved separately
+            **kwd (): keyword arguments will be passed down to json.JSONEncoder
+
+        Returns:
+            None
+        """
+        sidecar = _Sidecar(path, threshold)
+        session = self._session(_sidecar=sidecar)
+        try:
+            with open(sidecar.temporary(path), 'w', encoding='utf-8') as fp:
+                session.dump(obj, fp, **kwd)
+        except BaseException:
+            sidecar.discard()
+            raise
+        sidecar.commit()
+        sidecar.remove_unused()
+
+    def load_snapshot(self, path: str, **kwd) -> Any:
+        """Construct object from json document written by dump_snapshot.
+        Arrays saved in .npy files are memory mapped read only (numpy.load with mmap_mode='r'),
+        so only the parts actually used are read from disk.
+
+        Args:
+            path (str): path of the json document
+            **kwd (): The rest of keyword arguments will be passed down to json.loads
+
+        Returns:
+            Any. Object constructed from json document.
+        """
+        session = self._session(_sidecar=_Sidecar(path))
+        with open(path, 'r', encoding='utf-8') as fp:
+            return session.from_json(fp.read(), **kwd)
+
+    def to_bytes(self, obj: Any) -> bytes:
+        """Convert object to compact binary document.
+
+        The document holds the same tagged tree as to_json (wire_format and share_references
+        apply) with varint integers, length prefixed utf-8 strings (repeated short ones written
+        as back references) and binary doubles. numpy.ndarray of non object dtype is written as
+        its raw buffer. Read it back with from_bytes.
+
+        Args:
+            obj (Any): object
+
+        Returns:
+            bytes. Binary document.
+        """
+        session = self._binary_session
+        if session is None:
+            session = self._binary_session = self._session(_binary=True)
+        return _binary_dumps(session._encode_document(obj))
+
+    def from_bytes(self, b: bytes) -> Any:
+        """Construct object from binary document written by to_bytes.
+
+        Args:
+            b (bytes): binary document (or any bytes like object)
+
+        Returns:
+            Any. Object constructed from the document.
+        """
+        return self._decode_document(_binary_loads(b))
+
+    def _can_decode_in_parser(self) -> bool:
+        # FromJsonable and registered decoders are promised the json dict, not decoded children
+        return not self.intern_keys and not self.intern_values and self.stats is None and \
+            type(self).from_json_dict is StrongJson.from_json_dict and \
+            type(self).default_from_json_dict is StrongJson.default_from_json_dict and \
+            not self._registered_decoders and not self._has_from_jsonable
+
+    def _object_hook(self, untagged: Optional[List[Any]] = None) -> Callable[[Dict[str, Any]], Any]:
+        """object_hook for json.loads which decodes tagged dict as soon as they are parsed.
+        untagged[0], if given, is set to the last dict left as it is.
+        """
+        shallow = self._shallow
+        if shallow is None:
+            # same decoder except that children are already decoded by the time we see their parent
+            shallow = copy.copy(self)
+            shallow.from_json_dict = _identity
+            shallow._build_decoders()
+            self._shallow = shallow
+        type_key = self.type_key
+        ref_key = self._ref_key
+        decode = shallow.default_from_json_dict
+
+        def object_hook(d: Dict[str, Any]) -> Any:
+            if type_key in d:
+                return decode(d)
+            if ref_key in d and len(d) == 1:
+                raise _SharedReferences(f'{d!r} found while decoding in parser')
+            if untagged is not None:
+                untagged[0] = d
+            return d
+        return object_hook
+
+    def compile(self) -> 'StrongJson':
+        """Generate specialized encoder and decoder for each class in class_map.
+
+        The generated functions read and write the constructor parameters directly instead of
+        going through simple_object_dump and the keyword argument decoder. The output is the same.
+        Classes that can't be compiled (Enum, FromJsonable, custom ToJsonable.to_json_dict,
+        constructor with *args or **kwargs) keep using the generic path, and so do all objects
+        if simple_object_dump is overridden.
+
+        Returns:
+            StrongJson. self
+        """
+        # passing json scalars through is only safe if nobody intercepts them
+        encode_scalars = type(self).to_json_dict is StrongJson.to_json_dict
+        decode_scalars = type(self).from_json_dict is StrongJson.from_json_dict
+        # generated encoders don't go through simple_object_dump
+        encode_objects = type(self).simple_object_dump is StrongJson.simple_object_dump
+        parsed_scalars = _PARSED_SCALARS - {str} if self.intern_values else _PARSED_SCALARS
+        encoders = dict(self._compiled_encoders)
+        decoders = dict(self._compiled_decoders)
+        for obj_class in set(self.class_map.values()):
+            if not isinstance(obj_class, type) or issubclass(obj_class, Enum):
+                continue
+            params = _compilable_params(obj_class, self.type_key)
+            if params is None:
+                continue
+            if not issubclass(obj_class, FromJsonable):
+                plan = DecodePlan.from_class(obj_class)
+                decoders[obj_class] = _compile_decoder(
+                    obj_class, params, plan,
+                    passthrough=parsed_scalars if decode_scalars else frozenset())
+            fields = _static_fields(obj_class)
+            if fields is not None and fields != tuple(param.name for param in params):
+                continue  # written field by field from the generic path
+            if not encode_objects:
+                continue
+            if not issubclass(obj_class, ToJsonable) or obj_class.to_json_dict is ToJsonable.to_json_dict:
+                encoders[obj_class] = _compile_encoder(
+                    obj_class, params,
+                    passthrough=_JSON_SCALARS if encode_scalars else frozenset())
+        self._compiled = True
+        self._compiled_encoders = encoders
+        self._compiled_decoders = decoders
+        self._build_encoders()
+        self._build_decoders()
+        return self
+
+    def _schema_codec(self, tp: Any) -> _SchemaCodec:
+        """(encode, decode) for values of type tp without type tags. Built once per type.
+        Values that don't match tp fall back to the tagged format and are recognized as such.
+        """
+        try:
+            return self._schema_codecs[tp]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable annotation
+            return self.to_json_dict, self.from_json_dict
+        origin = getattr(tp, '__origin__', None)
+        origin = getattr(origin, '__extra__', origin)  # python 3.6: List[int].__origin__ is List
+        args = [arg for arg in getattr(tp, '__args__', None) or () if not isinstance(arg, TypeVar)]
+        if origin is Union:
+            values = [arg for arg in args if arg is not type(None)]
+            codec = self._schema_optional(values[0]) if len(values) == 1 else None
+        elif origin is not None and args:
+            codec = self._schema_container(origin, args)
+        elif inspect.isclass(tp) and tp.__module__ != 'typing':  # Any is a class from python 3.11
+            codec = self._schema_class(tp)
+        else:
+            codec = None
+        if codec is None:  # Any, bare List etc.
+            codec = self._schema_scalar(self.to_json_dict, self.from_json_dict)
+        self._schema_codecs[tp] = codec
+        return codec
+
+    @staticmethod
+    def _schema_scalar(encode: Callable[[Any], JSONPrimitive], decode: Callable[[JSONPrimitive], Any]) -> _SchemaCodec:
+        def encode_scalar(v: Any) -> JSONPrimitive:
+            if type(v) in _JSON_SCALARS or type(v) is float and v - v == 0.0:
+                return v
+            return encode(v)
+
+        def decode_scalar(d: JSONPrimitive) -> Any:
+            if type(d) is dict or type(d) is list:
+                return decode(d)
+            return d
+        return encode_scalar, decode_scalar
+
+    def _schema_optional(self, tp: Any) -> _SchemaCodec:
+        encode, decode = self._schema_codec(tp)
+        return (lambda v: None if v is None else encode(v)), (lambda d: None if d is None else decode(d))
+
+    def _schema_container(self, origin: Any, args: List[Any]) -> Optional[_SchemaCodec]:
+        to_json_dict = self.to_json_dict
+        from_json_dict = self.from_json_dict
+        if origin in (dict, OrderedDict, collections.abc.Mapping, collections.abc.MutableMapping):
+            if len(args) != 2:
+                return None
+            key_codec = _SCHEMA_KEYS.get(args[0])
+            if key_codec is None and inspect.isclass(args[0]) and issubclass(args[0], Enum):
+                key_codec = operator.attrgetter('name'), args[0].__getitem__
+            if key_codec is None:
+                return None
+            encode_key, decode_key = key_codec
+            encode, decode = self._schema_codec(args[1])
+            build = OrderedDict if origin is OrderedDict else dict
+
+            def encode_dict(v: Any) -> JSONPrimitive:
+                if not isinstance(v, dict):
+                    return to_json_dict(v)
+                return {encode_key(k): encode(x) for k, x in v.items()}
+
+            def decode_dict(d: JSONPrimitive) -> Any:
+                if type(d) is not dict or self.type_key in d:
+                    return from_json_dict(d)
+                return build((decode_key(k), decode(x)) for k, x in d.items())
+            return encode_dict, decode_dict
+        if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+            codecs_ = [self._schema_codec(arg) for arg in args]
+
+            def encode_tuple(v: Any) -> JSONPrimitive:
+                if not isinstance(v, tuple) or len(v) != len(codecs_):
+                    return to_json_dict(v)
+                return [encode(x) for (encode, _), x in zip(codecs_, v)]
+
+            def decode_tuple(d: JSONPrimitive) -> Any:
+                if type(d) is not list:
+                    return from_json_dict(d)
+                return tuple([decode(x) for (_, decode), x in zip(codecs_, d)])
+            return encode_tuple, decode_tuple
+        build = _SCHEMA_SEQUENCES.get(origin)
+        if build is None:
+            return None
+        encode, decode = self._schema_codec(args[0])
+        kinds = (list, tuple, set, frozenset)
+
+        def encode_sequence(v: Any) -> JSONPrimitive:
+            if not isinstance(v, kinds):
+                return to_json_dict(v)
+            return [encode(x) for x in v]
+
+        def decode_sequence(d: JSONPrimitive) -> Any:
+            if type(d) is not list:
+                return from_json_dict(d)
+            return build([decode(x) for x in d])
+        return encode_sequence, decode_sequence
+
+    def _schema_class(self, tp: Type[Any]) -> Optional[_SchemaCodec]:
+        to_json_dict = self.to_json_dict
+        from_json_dict = self.from_json_dict
+        if tp in _JSON_SCALARS or tp is float:
+            return self._schema_scalar(to_json_dict, from_json_dict)
+        if issubclass(tp, Enum):
+            return (lambda v: v.name if type(v) is tp else to_json_dict(v)), \
+                   (lambda d: tp[d] if type(d) is str else from_json_dict(d))
+        if tp is datetime or tp is date:
+            parse = _fromisoformat(tp)
+            return (lambda v: v.isoformat() if type(v) is tp else to_json_dict(v)), \
+                   (lambda d: parse(d) if type(d) is str else from_json_dict(d))
+        if tp in self._encoders or tp in self._registered_encoders or \
+                issubclass(tp, ToJsonable) and tp.to_json_dict is not ToJsonable.to_json_dict or \
+                issubclass(tp, FromJsonable):
+            return None  # builtin containers, numpy, pandas and classes with their own format
+        try:
+            plan = DecodePlan.from_class(tp)
+        except (TypeError, ValueError):  # no signature
+            return None
+        encoders = {}  # type: Dict[str, Callable[[Any], JSONPrimitive]]
+        decoders = {}  # type: Dict[str, Callable[[JSONPrimitive], Any]]
+        object_fields = self._object_fields
+        type_key = self.type_key
+
+        def encode_object(v: Any) -> JSONPrimitive:
+            if type(v) is not tp:
+                return to_json_dict(v)  # subclass: tagged
+            return {k: encoders.get(k, to_json_dict)(x) for k, x in object_fields(v)}
+
+        def decode_object(d: JSONPrimitive) -> Any:
+            if type(d) is not dict or type_key in d:
+                return from_json_dict(d)
+            missing_params = [p_name for p_name in plan.required if p_name not in d]
+            if missing_params:
+                raise MissingParameterError(f'Parameter not found : {missing_params}\n' +
+                                            f'for type {tp.__qualname__} ' +
+                                            f'We got the following parameters {list(d.keys())}')
+            return plan.constructor(**{k: decoders[k](x) for k, x in d.items() if k in decoders})
+        # register before the fields so that recursive types find it
+        self._schema_codecs[tp] = codec = encode_object, decode_object
+        hints = _type_hints(tp)
+        for name in plan.params:
+            encoders[name], decoders[name] = self._schema_codec(hints.get(name, Any))
+        return codec
+
     def from_json_dict(self, d: JSONPrimitive) -> Any:
         """Construct object from json dictionary.
         This is the place to override if you want to add custom class.
@@ -123,22 +1819,34 @@ class StrongJson:
 
         {"__type__": ClassName, "field1":x, "field2": y}
 
+        The type tag is written with type_key.
+
         Args:
             v (Any): object to dump
 
         Returns:
             Dict[str, JSONPrimitive]
         """
+        tmp = {self.type_key: self._object_tag(v)}
+        for k, v in self._object_fields(v):
+            tmp[k] = self.to_json_dict(v)
+        return tmp
+
+    def _object_tag(self, v: Any) -> str:
         cls_name = v.__class__.__qualname__
         if cls_name not in self.class_map:
             warnings.warn(
                 f"{cls_name} not found in class map. You will not be able to convert this back.",
                 ClassMapLookUpFailWarning)
-        tmp = {'__type__': cls_name}
-        for k, v in v.__dict__.items():
-            if k not in {'__objclass__', }:
-                tmp[k] = self.to_json_dict(v)
-        return tmp
+        return self._class_tag(cls_name)
+
+    def _object_fields(self, v: Any) -> Iterable[Tuple[str, Any]]:
+        cls = type(v)
+        try:
+            reader = self._field_readers[cls]
+        except KeyError:
+            reader = self._field_readers[cls] = _field_reader(cls)
+        return reader(v)
 
     def default_from_json_dict(self, d: JSONPrimitive) -> Any:
         """Default from json dict. Useful for fallback when override the class.
@@ -150,67 +1858,139 @@ class StrongJson:
             Any. Constructed Object.
 
         """
-        type_key = self.type_key
-        data_key = self.data_key
-
+        if self._iterative_decode and (type(d) is list or type(d) is dict):
+            return self._decode_tree(d)
         if isinstance(d, dict):
-            if type_key not in d:
+            if self.type_key not in d:
                 # assume string key dict
-                return {k: self.from_json_dict(v) for k, v in d.items()}
-            elif d[type_key] in self.class_map:
-                obj_class = self.class_map[d[type_key]]
-                if issubclass(obj_class, FromJsonable):
-                    return obj_class.from_json_dict(d, decoder=self)
-                elif issubclass(obj_class, Enum):
-                    data = d[data_key]
-                    return obj_class[data]  # trust me not pycharm
+                from_json_dict = self.from_json_dict
+                if self.intern_keys:
+                    intern = self._intern
+                    return {intern(k): from_json_dict(v) for k, v in d.items()}
+                return {k: from_json_dict(v) for k, v in d.items()}
+            return self._decode_tagged(d)
+        elif isinstance(d, list):
+            from_json_dict = self.from_json_dict
+            return [from_json_dict(item) for item in d]
+        return self._decode_node(d)
+
+    def _decode_tagged(self, d: Dict[str, JSONPrimitive]) -> Any:
+        tag = d[self.type_key]
+        if self._tag_table is not None:
+            return self._decode_compact_tag(tag, d)
+        obj_class = self.class_map.get(tag)
+        if obj_class is not None:
+            try:
+                decoder = self._class_decoders[obj_class]
+            except KeyError:
+                decoder = self._class_decoders[obj_class] = self._resolve_class_decoder(obj_class)
+            return decoder(d)
+        try:
+            decoder = self._tag_decoders[tag]
+        except KeyError:
+            raise ClassMapLookUpFailError('Type not found for key %r %r' % (tag, d))
+        return decoder(d)
+
+    def _tag_class(self, tag: Union[str, int]) -> Optional[Type[Any]]:
+        """Class in class_map the tag decodes to (same precedence as _decode_tagged), None otherwise."""
+        if self._tag_table is None:
+            return self.class_map.get(tag)
+        if type(tag) is int:
+            return self.class_map.get(self._tag_table[tag]) if 0 <= tag < len(self._tag_table) else None
+        return None if tag in self._tag_decoders else self.class_map.get(tag)
+
+    def _decode_tree(self, root: JSONPrimitive) -> Any:
+        """default_from_json_dict without recursion. Lists, dicts, tuples and classes decoded through
+        their constructor are expanded on an explicit stack; the rest goes to its decoder.
+        Children are decoded before the object holding them is constructed.
+        """
+        type_key = self.type_key
+        data_key = self.data_key
+        class_decoders = self._class_decoders
+        class_plans = self._class_plans
+        tag_decoders = self._tag_decoders
+        scalars = _PARSED_SCALARS - {str} if self.intern_values else _PARSED_SCALARS
+        build_dict = _build_interned_dict(self._intern) if self.intern_keys else _build_dict
+        out = [None]
+        stack = [(root, out, 0)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            d, target, key = pop()
+            if target is _FINISH:  # children are done: d is (build, children, target, key)
+                build, children, target, key = d
+                target[key] = build(children)
+                continue
+            t = type(d)
+            if t in scalars:
+                target[key] = d
+                continue
+            if t is list:
+                node = target[key] = [None] * len(d)
+                children = enumerate(d)
+            elif t is not dict:
+                target[key] = self._decode_node(d)
+                continue
+            elif type_key not in d:
+                if self.intern_keys:
+                    keys = [self._intern(k) for k in d]
+                    node = target[key] = dict.fromkeys(keys)
+                    children = zip(keys, d.values())
                 else:
-                    params = inspect.signature(obj_class).parameters
-                    # missing non optional argument
-                    missing_params = [p_name for p_name, param in params.items()
-                                      if p_name not in d and param.default == inspect.Parameter.empty]
-
-                    if missing_params:
-                        raise MissingParameterError(f'Parameter not found : {missing_params}\n' +
-                                                    f'for type {d[type_key]}' +
-                                                    'You may want to implement FromJsonable for this class' +
-                                                    f'We got the following parameters {list(d.keys())}')
-                    tmp = {k: self.from_json_dict(v) for k, v in d.items() if k != type_key and k in params}
-                    return obj_class(**tmp)
-            elif d[type_key] == 'dict':  # dict with non str key
-                data = d[data_key]
-                return {self.from_json_dict(item['key']): self.from_json_dict(item['value']) for
-                        item in data}
-            elif d[type_key] == 'tuple':
-                data = d[data_key]
-                return tuple([self.from_json_dict(item) for item in data])
-            elif d[type_key] == 'date':
-                return date(**{k: v for k, v in d.items() if k != self.type_key})
-            elif d[type_key] == 'datetime':
-                return datetime(**{k: v for k, v in d.items() if k != self.type_key})
-            elif d[type_key] == 'set':
-                data = d[data_key]
-                return set(data)
-            elif d[type_key] == 'float':
-                data = d[data_key]
-                return float(data)
-            elif d[type_key] == 'pandas.DataFrame':
-                if pd is None:
-                    raise MissingOptionalDependencyError(
-                        'Found Pandas DataFrame but pandas is not installed')  # pragma: no cover
+                    node = target[key] = dict.fromkeys(d)
+                    children = d.items()
+            else:
+                obj_class = self._tag_class(d[type_key])
+                if obj_class is not None:
+                    if obj_class not in class_decoders:
+                        class_decoders[obj_class] = self._resolve_class_decoder(obj_class)
+                    plan = class_plans.get(obj_class)  # None for compiled, FromJsonable and Enum
+                    if plan is None:
+                        target[key] = class_decoders[obj_class](d)
+                        continue
+                    if any(p_name not in d for p_name in plan.required):
+                        self._plan_arguments(plan, d)  # raises MissingParameterError
+                    params = plan.params
+                    node = {k: None for k in d if k in params and k != type_key}
+                    children = ((k, d[k]) for k in node)
+                    build = plan.construct
                 else:
-                    data = self.from_json_dict(d[data_key])
-                    return pd.DataFrame(data)
-            elif d[type_key] == 'numpy.ndarray':
-                if np is None:
-                    raise MissingOptionalDependencyError(
-                        'Found numpy.ndarray but numpy is not installed')  # pragma: no cover
+                    kind = _TREE_DECODERS.get(getattr(tag_decoders.get(d[type_key]), '__func__', None))
+                    if kind is None:
+                        target[key] = self._decode_tagged(d)
+                        continue
+                    data = d[data_key]
+                    if kind is _TUPLE:
+                        node = [None] * len(data)
+                        children = enumerate(data)
+                        build = tuple
+                    elif kind is _DICT:
+                        flat = []
+                        for item in data:
+                            flat.append(item['key'])
+                            flat.append(item['value'])
+                        node = [None] * len(flat)
+                        children = enumerate(flat)
+                        build = build_dict
+                    else:  # _COMPACT_DICT
+                        node = [None] * len(data)
+                        children = enumerate(data)
+                        build = build_dict
+                push(((build, node, target, key), _FINISH, None))
+            todo = []
+            for k, x in children:
+                if type(x) in scalars:
+                    node[k] = x
                 else:
-                    return np.array(self.from_json_dict(d[data_key]))
-            else:
-                raise ClassMapLookUpFailError('Type not found for key %r %r' % (d[type_key], d))
-        elif isinstance(d, list):
-            return [self.from_json_dict(item) for item in d]
+                    todo.append((x, node, k))
+            todo.reverse()
+            stack.extend(todo)
+        return out[0]
+
+    def _decode_node(self, d: JSONPrimitive) -> Any:
+        """Decode anything but list and dict."""
+        if type(d) is str:
+            return self._intern(d) if self.intern_values and len(d) <= self.intern_values else d
         elif isinstance(d, (int, str, float)):
             return d
         elif d is None:
@@ -218,6 +1998,301 @@ class StrongJson:
         else:
             raise NotImplementedError('Unknown type parse %s, %r' % (type(d), d))  # pragma: no cover
 
+    def _intern(self, s: str) -> str:
+        table = self._intern_table
+        interned = table.get(s)
+        if interned is not None:
+            return interned
+        if len(table) < _INTERN_TABLE_SIZE:
+            table[s] = s
+        return s
+
+    def _decode_key(self, k: JSONPrimitive) -> Any:
+        """Decode key of dict written as key/value pairs with intern_keys."""
+        k = self.from_json_dict(k)
+        return self._intern(k) if type(k) is str else k
+
+    def _decode_compact_document(self, d: Dict[str, JSONPrimitive]) -> Any:
+        version = d[_COMPACT_VERSION_KEY]
+        if version != 2:
+            raise StrongJsonError(f'Unsupported wire format {version!r}')
+        session = self._compact_session(list(d.get(_COMPACT_TABLE_KEY, ())))
+        return session.from_json_dict(d[_COMPACT_PAYLOAD_KEY])
+
+    def _decode_compact_tag(self, tag: Union[str, int], d: Dict[str, JSONPrimitive]) -> Any:
+        """Type tag lookup in a compact session. Class names are indices into the tag table.
+        Other tags are builtin or registered and never shadowed by class_map.
+        """
+        if type(tag) is int:
+            try:
+                tag = self._tag_table[tag]
+            except IndexError:
+                raise ClassMapLookUpFailError('Tag table has no entry %r %r' % (tag, d))
+        else:
+            decoder = self._tag_decoders.get(tag)
+            if decoder is not None:
+                return decoder(d)
+        obj_class = self.class_map.get(tag)
+        if obj_class is not None:
+            try:
+                decoder = self._class_decoders[obj_class]
+            except KeyError:
+                decoder = self._class_decoders[obj_class] = self._resolve_class_decoder(obj_class)
+            return decoder(d)
+        try:
+            decoder = self._tag_decoders[tag]
+        except KeyError:
+            raise ClassMapLookUpFailError('Type not found for key %r %r' % (tag, d))
+        return decoder(d)
+
+    def _decode_refs(self, d: Dict[str, JSONPrimitive]) -> Any:
+        """Decode document written with share_references."""
+        session = self._session(_refs={})
+        session.default_from_json_dict = session._decode_shared
+        session._iterative_decode = False
+        return session.from_json_dict(d[self.data_key])
+
+    def _decode_ref_wrapper(self, d: Dict[str, JSONPrimitive]) -> Any:
+        # list or str key dict with __id__; outside of _decode_refs there is no one to share it with
+        return self.from_json_dict(d[self.data_key])
+
+    def _decode_shared(self, d: JSONPrimitive) -> Any:
+        """default_from_json_dict of _decode_refs session.
+        Mutable objects are registered before their children are decoded so that cycles resolve.
+        """
+        if type(d) is not dict:
+            return StrongJson.default_from_json_dict(self, d)
+        refs = self._refs
+        if self.type_key not in d:
+            if len(d) == 1 and self._ref_key in d:
+                n = d[self._ref_key]
+                try:
+                    return refs[n]
+                except KeyError:
+                    raise StrongJsonError(
+                        f'Reference {n!r} is used before its object is constructed. '
+                        'Cycles through tuple, set or classes with custom decoder can not be restored.')
+            return StrongJson.default_from_json_dict(self, d)
+        n = d.get(self._id_key)
+        if n is None:
+            return StrongJson.default_from_json_dict(self, d)
+        tag = d[self.type_key]
+        tags = self._tag_names
+        if tag == tags['ref']:
+            data = d[self.data_key]
+            from_json_dict = self.from_json_dict
+            if type(data) is list:
+                obj = refs[n] = []
+                obj.extend([from_json_dict(x) for x in data])
+            else:
+                obj = refs[n] = {}
+                for k, x in data.items():
+                    obj[k] = from_json_dict(x)
+            return obj
+        if tag == tags['dict']:
+            obj = refs[n] = {}
+            obj.update(self._tag_decoders[tag](d))
+            return obj
+        obj_class = self._plain_class(tag)
+        if obj_class is not None:
+            plan = self._class_plans.get(obj_class)
+            if plan is None:
+                plan = self._class_plans[obj_class] = DecodePlan.from_class(obj_class)
+            obj = refs[n] = obj_class.__new__(obj_class)
+            obj.__init__(**self._plan_arguments(plan, d))
+            return obj
+        obj = refs[n] = StrongJson.default_from_json_dict(self, d)
+        return obj
+
+    def _plain_class(self, tag: Union[str, int]) -> Optional[Type[Any]]:
+        """Class for tag if it is decoded by calling its constructor with the fields, None otherwise."""
+        if self._tag_table is not None:
+            if type(tag) is not int:
+                return None
+            tag = self._tag_table[tag]
+        obj_class = self.class_map.get(tag)
+        if not isinstance(obj_class, type) or issubclass(obj_class, (FromJsonable, Enum, tuple)) or \
+                obj_class.__new__ is not object.__new__:  # NamedTuple etc. need their fields in __new__
+            return None
+        return obj_class
+
+    def register_decoder(self, tag: str, fn: Callable[[Dict[str, JSONPrimitive], 'StrongJson'], Any]) -> None:
+        """Register decoder for json dict with type tag. Counterpart of register_encoder.
+
+        Classes in class_map take precedence over registered decoders.
+
+        Args:
+            tag (str): value of type_key
+            fn (Callable[[Dict[str, JSONPrimitive], StrongJson], Any]): called as fn(d, decoder)
+
+        Returns:
+            None
+        """
+        self._registered_decoders[tag] = fn
+        self._build_decoders()
+
+    def _build_decoders(self) -> None:
+        """Build type tag -> decoder table and reset the per class decode plans."""
+        tags = self._tag_names
+        compact = self._tag_table is not None
+        decoders = {
+            tags['refs']: self._decode_refs,
+            tags['ref']: self._decode_ref_wrapper,
+            tags['dict']: self._decode_compact_dict if compact else self._decode_dict,
+            tags['tuple']: self._decode_tuple,
+            tags['date']: self._decode_compact_date if compact else self._decode_date,
+            tags['datetime']: self._decode_compact_datetime if compact else self._decode_datetime,
+            tags['set']: self._decode_set,
+            tags['float']: self._decode_float,
+            tags['pandas.DataFrame']: self._decode_dataframe,
+            tags['numpy.ndarray']: self._decode_ndarray,
+        }
+        for tag, fn in self._registered_decoders.items():
+            decoders[tag] = self._bind_decoder(fn)
+        self._tag_decoders = decoders
+        self._class_decoders = {typ: MethodType(fn, self) for typ, fn in self._compiled_decoders.items()}
+        self._class_plans = {}  # type: Dict[Type[Any], DecodePlan]
+        self._shallow = None  # type: Optional[StrongJson]
+        self._schema_codecs = {}  # type: Dict[Any, _SchemaCodec]
+        self._has_from_jsonable = any(isinstance(cls, type) and issubclass(cls, FromJsonable)
+                                      for cls in self.class_map.values())
+        hook = self.__dict__.get('from_json_dict')
+        if hook is None or getattr(hook, '__func__', None) is StrongJson._decode_with_stats:
+            if self.stats is None:
+                self.__dict__.pop('from_json_dict', None)
+            else:
+                self._inner_from_json_dict = MethodType(type(self).from_json_dict, self)
+                self.from_json_dict = self._decode_with_stats
+        # walk the tree with an explicit stack unless an override needs to see every node
+        self._iterative_decode = type(self).from_json_dict is StrongJson.from_json_dict and \
+            type(self).default_from_json_dict is StrongJson.default_from_json_dict and \
+            'from_json_dict' not in self.__dict__ and 'default_from_json_dict' not in self.__dict__
+
+    def _bind_decoder(self, fn: Callable[[Dict[str, JSONPrimitive], 'StrongJson'], Any]) \
+            -> Callable[[Dict[str, JSONPrimitive]], Any]:
+        return lambda d: fn(d, self)
+
+    def _resolve_class_decoder(self, obj_class: Type[Any]) -> Callable[[Dict[str, JSONPrimitive]], Any]:
+        """Build decoder for a class found in class_map. Result is cached by the caller."""
+        if issubclass(obj_class, FromJsonable):
+            return lambda d: obj_class.from_json_dict(d, decoder=self)
+        elif issubclass(obj_class, Enum):
+            return lambda d: obj_class[d[self.data_key]]  # trust me not pycharm
+        else:
+            plan = self._class_plans.get(obj_class)
+            if plan is None:
+                plan = self._class_plans[obj_class] = DecodePlan.from_class(obj_class)
+            return lambda d: self._decode_with_plan(plan, d)
+
+    def _decode_with_plan(self, plan: 'DecodePlan', d: Dict[str, JSONPrimitive]) -> Any:
+        return plan.constructor(**self._plan_arguments(plan, d))
+
+    def _plan_arguments(self, plan: 'DecodePlan', d: Dict[str, JSONPrimitive]) -> Dict[str, Any]:
+        type_key = self.type_key
+        params = plan.params
+        # missing non optional argument
+        for p_name in plan.required:
+            if p_name not in d:
+                missing_params = [p_name for p_name in plan.required if p_name not in d]
+                raise MissingParameterError(f'Parameter not found : {missing_params}\n' +
+                                            f'for type {d[type_key]}' +
+                                            'You may want to implement FromJsonable for this class' +
+                                            f'We got the following parameters {list(d.keys())}')
+        from_json_dict = self.from_json_dict
+        return {k: from_json_dict(v) for k, v in d.items() if k in params and k != type_key}
+
+    def _decode_dict(self, d: Dict[str, JSONPrimitive]) -> Any:  # dict with non str key
+        from_json_dict = self.from_json_dict
+        decode_key = self._decode_key if self.intern_keys else from_json_dict
+        return {decode_key(item['key']): from_json_dict(item['value']) for item in d[self.data_key]}
+
+    def _decode_compact_dict(self, d: Dict[str, JSONPrimitive]) -> Any:  # flat [key, value, ...]
+        from_json_dict = self.from_json_dict
+        decode_key = self._decode_key if self.intern_keys else from_json_dict
+        it = iter(d[self.data_key])
+        return {decode_key(k): from_json_dict(v) for k, v in zip(it, it)}
+
+    def _decode_tuple(self, d: Dict[str, JSONPrimitive]) -> Any:
+        from_json_dict = self.from_json_dict
+        return tuple([from_json_dict(item) for item in d[self.data_key]])
+
+    def _decode_date(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return date(**{k: v for k, v in d.items() if k != self.type_key})
+
+    def _decode_datetime(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return datetime(**{k: v for k, v in d.items() if k != self.type_key})
+
+    def _decode_compact_date(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return date(*d[self.data_key])
+
+    def _decode_compact_datetime(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return datetime(*d[self.data_key])
+
+    def _decode_set(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return set(d[self.data_key])
+
+    def _decode_float(self, d: Dict[str, JSONPrimitive]) -> Any:
+        return float(d[self.data_key])
+
+    def _decode_dataframe(self, d: Dict[str, JSONPrimitive]) -> Any:
+        if pd is None:
+            raise MissingOptionalDependencyError(
+                'Found Pandas DataFrame but pandas is not installed')  # pragma: no cover
+        if 'columns' in d:
+            return self._decode_columnar_dataframe(d)
+        data = self.from_json_dict(d[self.data_key])
+        return pd.DataFrame(data)
+
+    def _decode_columnar_dataframe(self, d: Dict[str, JSONPrimitive]) -> Any:
+        index = self._decode_index(d['index'])
+        data = {i: pd.Series(self._decode_vector(column, dtype), index=index, dtype=self._decode_dtype(dtype))
+                for i, (column, dtype) in enumerate(zip(d['data'], d['dtypes']))}
+        df = pd.DataFrame(data, index=index)
+        df.columns = self._decode_index(d['columns'])
+        return df
+
+    def _decode_index(self, d: Dict[str, JSONPrimitive]) -> Any:
+        from_json_dict = self.from_json_dict
+        if 'start' in d:
+            return pd.RangeIndex(d['start'], d['stop'], d['step'], name=from_json_dict(d['name']))
+        if 'tuples' in d:
+            return pd.MultiIndex.from_tuples(from_json_dict(d['tuples']), names=from_json_dict(d['names']))
+        index = pd.Index(self._decode_vector(d['data'], d['dtype']), dtype=self._decode_dtype(d['dtype']),
+                         name=from_json_dict(d['name']), tupleize_cols=False)
+        if 'freq' in d:
+            index = type(index)(index, freq=d['freq'])
+        return index
+
+    def _decode_vector(self, data: JSONPrimitive, dtype: JSONPrimitive) -> Any:
+        values = self.from_json_dict(data)
+        if type(dtype) is str and _TIME_DTYPE.match(dtype):  # written as int64 in dtype unit
+            values = np.asarray(values, dtype='i8').view(dtype)
+        elif type(dtype) is dict and 'tz' in dtype:  # written as int64 in UTC
+            values = np.asarray(values, dtype='i8').view(f"datetime64[{dtype['unit']}]")
+            values = pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(dtype['tz'])
+        return values
+
+    def _decode_dtype(self, dtype: JSONPrimitive) -> Any:
+        if type(dtype) is dict and 'tz' in dtype:
+            return pd.DatetimeTZDtype(dtype['unit'], dtype['tz'])
+        if type(dtype) is dict:
+            return pd.CategoricalDtype(self.from_json_dict(dtype['categories']), ordered=dtype['ordered'])
+        return dtype
+
+    def _decode_ndarray(self, d: Dict[str, JSONPrimitive]) -> Any:
+        if np is None:
+            raise MissingOptionalDependencyError(
+                'Found numpy.ndarray but numpy is not installed')  # pragma: no cover
+        if 'npy' in d:
+            if self._sidecar is None:
+                raise StrongJsonError(f"numpy.ndarray is stored in {d['npy']!r}. Use load_snapshot to load it.")
+            return self._sidecar.load(d['npy'])
+        if 'bin' in d:
+            return _ndarray_from_buffer(d['dtype'], d['shape'], d['order'], d['bin'])
+        if 'b64' in d:
+            return _ndarray_from_buffer(d['dtype'], d['shape'], d['order'], base64.b64decode(d['b64']))
+        return np.array(self.from_json_dict(d[self.data_key]))
+
     def default_to_json_dict(self, v: Any) -> JSONPrimitive:
         """Default Conversion from object v to json friendly JSONPrimitive
         Args:
@@ -225,84 +2300,1469 @@ class StrongJson:
         Returns:
             JSONPrimitive (Dict unless it's primitive like List, int, float, boolean, str.)
         """
+        cls = type(v)
+        try:
+            encoder = self._encoder_cache[cls]
+        except KeyError:
+            encoder = self._encoder_cache[cls] = self._resolve_encoder(cls)
+        if encoder is None:  # json primitive
+            return v
+        if self._iterative_encode and getattr(encoder, '__func__', None) in _TREE_ENCODERS:
+            return self._encode_tree(v)
+        return encoder(v)
+
+    def _encode_tree(self, root: Any) -> JSONPrimitive:
+        """default_to_json_dict without recursion. Containers and objects dumped by simple_object_dump
+        are expanded on an explicit stack; the rest goes to its encoder.
+        Nodes are visited in the same order as the recursive encoders do.
+        Nodes being expanded are kept by id, like json's check_circular, so that a cycle raises.
+        """
         type_key = self.type_key
         data_key = self.data_key
-        if isinstance(v, ToJsonable):
-            return v.to_json_dict(encoder=self)
-        elif isinstance(v, (dict, OrderedDict)):
-            if len(v) == 0:
-                return {}
-            elif self.treat_dict_as_ordered_dict or \
-                    isinstance(v, OrderedDict) or \
-                    not isinstance(next(iter(v.keys())), str):  # non str key normal dict
-                return {
-                    type_key: 'dict',
-                    data_key: [{'key': self.to_json_dict(kv), 'value': self.to_json_dict(vv)} for kv, vv in v.items()]
-                }
-            else:  # assume str key
-                return {kv: self.to_json_dict(vv) for kv, vv in v.items()}
-        elif isinstance(v, Enum):
-            return {
-                type_key: v.__class__.__name__,
-                data_key: v.name
-            }
-        elif isinstance(v, tuple):
+        tags = self._tag_names
+        kinds = self._tree_kinds
+        out = [None]
+        stack = [(root, out, 0)]
+        pop = stack.pop
+        expanding = {}  # type: Dict[int, Any]
+        while stack:
+            v, target, key = pop()
+            if v is _FINISH:  # children of node key are done
+                del expanding[key]
+                continue
+            cls = type(v)
+            try:
+                kind = kinds[cls]
+            except KeyError:
+                kind = kinds[cls] = self._tree_kind(cls)
+            if kind is _LEAF:
+                target[key] = self._encoder_cache[cls](v)
+                continue
+            if kind is _SCALAR:
+                target[key] = v
+                continue
+            if kind is _TUPLE and self._tuple_cache is not None and _tuple_cache_key(v) is not None:
+                target[key] = self._tuple_cache(v)  # small tuple of scalars; nothing to expand
+                continue
+            if id(v) in expanding:
+                raise ValueError('Circular reference detected')
+            todo = []
+            # finite floats are json friendly too: x - x is nan for nan and inf
+            if kind is _OBJECT:
+                node = target[key] = {type_key: self._object_tag(v)}
+                for k, x in self._object_fields(v):
+                    if type(x) in _JSON_SCALARS or type(x) is float and x - x == 0.0:
+                        node[k] = x
+                    else:
+                        node[k] = None  # keep the order of the fields
+                        todo.append((x, node, k))
+            elif kind is _LIST or kind is _TUPLE or kind is _SET:
+                node = [None] * len(v)
+                if kind is _LIST:
+                    target[key] = node
+                else:
+                    target[key] = {type_key: tags['tuple' if kind is _TUPLE else 'set'], data_key: node}
+                for k, x in enumerate(v):
+                    if type(x) in _JSON_SCALARS or type(x) is float and x - x == 0.0:
+                        node[k] = x
+                    else:
+                        todo.append((x, node, k))
+            elif len(v) == 0:  # dict
+                target[key] = {}
+                continue
+            elif kind is _DICT and (self.treat_dict_as_ordered_dict or isinstance(v, OrderedDict) or
+                                    not isinstance(next(iter(v.keys())), str) or self._has_reserved_keys(v)):
+                entries = []
+                for kx, x in v.items():
+                    entry = {'key': kx, 'value': x}  # replaced below unless json friendly
+                    entries.append(entry)
+                    if not (type(kx) in _JSON_SCALARS or type(kx) is float and kx - kx == 0.0):
+                        todo.append((kx, entry, 'key'))
+                    if not (type(x) in _JSON_SCALARS or type(x) is float and x - x == 0.0):
+                        todo.append((x, entry, 'value'))
+                target[key] = {type_key: tags['dict'], data_key: entries}
+            elif kind is _DICT or self._is_plain_dict(v):
+                node = target[key] = {}
+                for k, x in v.items():
+                    if type(x) in _JSON_SCALARS or type(x) is float and x - x == 0.0:
+                        node[k] = x
+                    else:
+                        node[k] = None
+                        todo.append((x, node, k))
+            else:  # compact dict
+                node = []
+                for kx in v.items():
+                    for x in kx:
+                        if type(x) in _JSON_SCALARS or type(x) is float and x - x == 0.0:
+                            node.append(x)
+                        else:
+                            todo.append((x, node, len(node)))
+                            node.append(None)
+                target[key] = {type_key: tags['dict'], data_key: node}
+            if todo:
+                expanding[id(v)] = v
+                stack.append((_FINISH, None, id(v)))
+                todo.reverse()
+                stack.extend(todo)
+        return out[0]
+
+    def _tree_kind(self, cls: Type[Any]) -> int:
+        """How _encode_tree handles instances of cls."""
+        try:
+            encoder = self._encoder_cache[cls]
+        except KeyError:
+            encoder = self._encoder_cache[cls] = self._resolve_encoder(cls)
+        if encoder is None:
+            return _SCALAR
+        kind = _TREE_ENCODERS.get(getattr(encoder, '__func__', None), _LEAF)
+        if kind is _TO_JSONABLE:
+            return _OBJECT if cls.to_json_dict is ToJsonable.to_json_dict and \
+                type(self).simple_object_dump is StrongJson.simple_object_dump else _LEAF
+        return kind
+
+    def register_encoder(self, typ: Type[Any], fn: Callable[[Any, 'StrongJson'], JSONPrimitive]) -> None:
+        """Register encoder for type typ (and its subclasses).
+
+        Registered encoders take precedence over the builtin ones.
+
+        Args:
+            typ (Type[Any]): type to encode
+            fn (Callable[[Any, StrongJson], JSONPrimitive]): called as fn(value, encoder)
+
+        Returns:
+            None
+        """
+        self._registered_encoders[typ] = fn
+        if self._encode_cache is not None:
+            self._encode_cache.clear()
+        self._build_encoders()
+
+    def _build_encoders(self) -> None:
+        """Build exact type -> encoder table. None means the value is dumped as is."""
+        encoders = {
+            int: None,
+            str: None,
+            bool: None,
+            type(None): None,
+            float: self._encode_float,
+            list: self._encode_list,
+            dict: self._encode_dict,
+            OrderedDict: self._encode_dict,
+            tuple: self._encode_tuple,
+            set: self._encode_set,
+            datetime: self._encode_datetime,
+            date: self._encode_date,
+            _LazyProxy: self._encode_lazy,
+        }
+        if self._tag_table is not None:
+            encoders[dict] = encoders[OrderedDict] = self._encode_compact_dict
+            encoders[datetime] = self._encode_compact_datetime
+            encoders[date] = self._encode_compact_date
+        if np is not None:
+            encoders[np.ndarray] = self._encode_ndarray
+            encoders[np.bool_] = bool
+        if pd is not None:
+            encoders[pd.DataFrame] = self._encode_dataframe
+        for typ, fn in self._compiled_encoders.items():
+            if not any(base in self._registered_encoders for base in typ.__mro__):
+                encoders[typ] = MethodType(fn, self)
+        for typ, fn in self._registered_encoders.items():
+            encoders[typ] = self._bind_encoder(fn)
+        self._enum_encoder = self._encode_enum
+        self._tuple_cache = None  # type: Optional[Callable[[tuple], JSONPrimitive]]
+        cache = self._encode_cache
+        if cache is not None:
+            compact = self._tag_table is not None
+            for typ, key in ((date, None), (datetime, _datetime_cache_key)):
+                if typ not in self._registered_encoders:
+                    encoders[typ] = cache.wrap(encoders[typ], compact, key)
+            # _encode_tuple stays in the table so that _encode_tree still expands nested tuples
+            if tuple not in self._registered_encoders:
+                self._tuple_cache = cache.wrap(self._dump_tuple, compact, _tuple_cache_key)
+            if not compact:  # tags of Enum classes depend on the document in compact format
+                self._enum_encoder = cache.wrap(self._encode_enum, compact, _enum_cache_key)
+        self._encoders = encoders
+        self._encoder_cache = dict(encoders)
+        self._field_readers = {}  # type: Dict[Type[Any], Callable[[Any], Iterable[Tuple[str, Any]]]]
+        self._tree_kinds = {}  # type: Dict[Type[Any], int]
+        self._binary_session = None  # type: Optional[StrongJson]
+        hook = self.__dict__.get('to_json_dict')
+        if hook is None or getattr(hook, '__func__', None) is StrongJson._encode_with_stats:
+            if self.stats is None:
+                self.__dict__.pop('to_json_dict', None)
+            else:  # record every value; the rest of the dispatch is unchanged
+                self._inner_to_json_dict = MethodType(type(self).to_json_dict, self)
+                self.to_json_dict = self._encode_with_stats
+        # build the tree with an explicit stack unless an override needs to see every node
+        self._iterative_encode = type(self).to_json_dict is StrongJson.to_json_dict and \
+            type(self).default_to_json_dict is StrongJson.default_to_json_dict and \
+            type(self).simple_object_dump is StrongJson.simple_object_dump and \
+            'to_json_dict' not in self.__dict__ and 'default_to_json_dict' not in self.__dict__ and \
+            'simple_object_dump' not in self.__dict__
+
+    def _bind_encoder(self, fn: Callable[[Any, 'StrongJson'], JSONPrimitive]) -> Callable[[Any], JSONPrimitive]:
+        return lambda v: fn(v, self)
+
+    def _resolve_encoder(self, cls: Type[Any]) -> Optional[Callable[[Any], JSONPrimitive]]:
+        """Find encoder for a class not in the exact type table. Result is cached by the caller."""
+        for base in cls.__mro__:
+            if base in self._registered_encoders:
+                return self._encoders[base]
+        if issubclass(cls, ToJsonable):
+            return self._encode_to_jsonable
+        if issubclass(cls, Enum):  # before the mro walk since IntEnum is also int
+            return self._enum_encoder
+        if issubclass(cls, tuple) and hasattr(cls, '_fields') and cls.__qualname__ in self.class_map:
+            return self.simple_object_dump  # NamedTuple in the class map is written as its class, else as tuple
+        for base in cls.__mro__:
+            # compiled encoders write their own class as the tag
+            if base in self._encoders and base not in self._compiled_encoders:
+                return self._encoders[base]
+        return self.simple_object_dump
+
+    def encode_cache_info(self) -> Dict[str, Union[int, str]]:
+        """Statistics of the encode cache (see encode_cache).
+
+        Returns:
+            Dict[str, Union[int, str]]. hits, misses, evictions, size, maxsize and policy.
+            Empty if the cache is off.
+        """
+        cache = self._encode_cache
+        if cache is None:
+            return {}
+        return {'hits': cache.hits, 'misses': cache.misses, 'evictions': cache.evictions,
+                'size': sum(map(len, cache.tables.values())), 'maxsize': cache.maxsize, 'policy': cache.policy}
+
+    def _encode_lazy(self, v: '_LazyProxy') -> JSONPrimitive:
+        return self.to_json_dict(materialize(v))
+
+    def _encode_to_jsonable(self, v: 'ToJsonable') -> JSONPrimitive:
+        d = v.to_json_dict(encoder=self)
+        if self._tag_table is not None and type(d) is dict and self._plain_type_key in d and self.type_key not in d:
+            return self._compact_object(d)
+        return d
+
+    def _compact_object(self, d: Dict[str, JSONPrimitive]) -> JSONPrimitive:
+        """Object dict written with the wire format 1 type key (ex: a hard coded '__type__': 'User'
+        in to_json_dict) as a compact session writes it. Builtin tags are left alone; their data differs.
+        """
+        plain_type_key = self._plain_type_key
+        tag = d[plain_type_key]
+        if type(tag) is not str or tag in _TAGS:
+            return d
+        tmp = {self.type_key: self._class_tag(tag)}
+        for k, x in d.items():
+            if k != plain_type_key:
+                tmp[k] = x
+        return tmp
+
+    def _encode_dict(self, v: Dict[Any, Any]) -> JSONPrimitive:
+        if len(v) == 0:
+            return {}
+        elif self.treat_dict_as_ordered_dict or \
+                isinstance(v, OrderedDict) or \
+                not isinstance(next(iter(v.keys())), str) or \
+                self._has_reserved_keys(v):  # non str key normal dict
+            to_json_dict = self.to_json_dict
             return {
-                type_key: 'tuple',
-                data_key: [self.to_json_dict(vv) for vv in v]
+                self.type_key: 'dict',
+                self.data_key: [{'key': to_json_dict(kv), 'value': to_json_dict(vv)} for kv, vv in v.items()]
             }
-        elif isinstance(v, datetime):  # datetime before the date (since datetime is also date)
+        else:  # assume str key
+            to_json_dict = self.to_json_dict
+            return {kv: to_json_dict(vv) for kv, vv in v.items()}
+
+    def _has_reserved_keys(self, v: Dict[str, Any]) -> bool:
+        """Whether str key dict would be read back as something else if written as json object."""
+        return _COMPACT_VERSION_KEY in v and _COMPACT_PAYLOAD_KEY in v or self._has_reference_keys(v)
+
+    def _has_reference_keys(self, v: Dict[str, Any]) -> bool:
+        """Whether str key dict would be read back as a reference in a share_references document."""
+        return self.share_references and (self._ref_key in v or self._id_key in v)
+
+    def _is_plain_dict(self, v: Dict[Any, Any]) -> bool:
+        """Whether compact session can write dict as json object."""
+        return not self.treat_dict_as_ordered_dict and not isinstance(v, OrderedDict) and \
+            all(type(k) is str for k in v) and self.type_key not in v and not self._has_reference_keys(v)
+
+    def _encode_compact_dict(self, v: Dict[Any, Any]) -> JSONPrimitive:
+        if len(v) == 0:
+            return {}
+        to_json_dict = self.to_json_dict
+        if self._is_plain_dict(v):
+            return {kv: to_json_dict(vv) for kv, vv in v.items()}
+        pairs = []
+        for kv, vv in v.items():
+            pairs.append(to_json_dict(kv))
+            pairs.append(to_json_dict(vv))
+        return {
+            self.type_key: self._tag_names['dict'],
+            self.data_key: pairs
+        }
+
+    def _encode_compact_datetime(self, v: datetime) -> JSONPrimitive:
+        return {
+            self.type_key: self._tag_names['datetime'],
+            self.data_key: [v.year, v.month, v.day, v.hour, v.minute, v.second, v.microsecond]
+        }
+
+    def _encode_compact_date(self, v: date) -> JSONPrimitive:
+        return {
+            self.type_key: self._tag_names['date'],
+            self.data_key: [v.year, v.month, v.day]
+        }
+
+    def _encode_enum(self, v: Enum) -> JSONPrimitive:
+        return {
+            self.type_key: self._class_tag(v.__class__.__name__),
+            self.data_key: v.name
+        }
+
+    def _encode_tuple(self, v: tuple) -> JSONPrimitive:
+        if self._tuple_cache is not None:
+            return self._tuple_cache(v)
+        return self._dump_tuple(v)
+
+    def _dump_tuple(self, v: tuple) -> JSONPrimitive:
+        to_json_dict = self.to_json_dict
+        return {
+            self.type_key: self._tag_names['tuple'],
+            self.data_key: [to_json_dict(vv) for vv in v]
+        }
+
+    def _encode_datetime(self, v: datetime) -> JSONPrimitive:
+        return {
+            self.type_key: 'datetime',
+            'year': v.year,
+            'month': v.month,
+            'day': v.day,
+            'hour': v.hour,
+            'minute': v.minute,
+            'second': v.second,
+            'microsecond': v.microsecond
+        }
+
+    def _encode_date(self, v: date) -> JSONPrimitive:
+        return {
+            self.type_key: 'date',
+            'year': v.year,
+            'month': v.month,
+            'day': v.day
+        }
+
+    def _encode_set(self, v: set) -> JSONPrimitive:
+        to_json_dict = self.to_json_dict
+        return {
+            self.type_key: self._tag_names['set'],
+            self.data_key: [to_json_dict(x) for x in v]
+        }
+
+    def _encode_list(self, v: list) -> JSONPrimitive:
+        to_json_dict = self.to_json_dict
+        return [to_json_dict(vv) for vv in v]
+
+    def _encode_float(self, v: float) -> JSONPrimitive:
+        if math.isnan(v):
             return {
-                type_key: 'datetime',
-                'year': v.year,
-                'month': v.month,
-                'day': v.day,
-                'hour': v.hour,
-                'minute': v.minute,
-                'second': v.second,
-                'microsecond': v.microsecond
+                self.type_key: self._tag_names['float'],
+                self.data_key: "nan"
             }
-        elif isinstance(v, date):
+        elif math.isinf(v):
             return {
-                type_key: 'date',
-                'year': v.year,
-                'month': v.month,
-                'day': v.day
+                self.type_key: self._tag_names['float'],
+                self.data_key: "inf" if v > 0 else "-inf"
             }
+        else:
+            return v
 
-        elif isinstance(v, set):
+    def _encode_ndarray(self, v: 'np.ndarray') -> JSONPrimitive:
+        if self._sidecar is not None and v.nbytes >= self._sidecar.threshold and not v.dtype.hasobject:
             return {
-                type_key: 'set',
-                data_key: [self.to_json_dict(x) for x in v]
+                self.type_key: self._tag_names['numpy.ndarray'],
+                'npy': self._sidecar.save(v)
             }
-        elif isinstance(v, list):
-            return [self.to_json_dict(vv) for vv in v]
-        elif isinstance(v, float) and math.isnan(v):
+        if self._binary and not v.dtype.hasobject:
+            descr, shape, order, data = _ndarray_buffer(v)
             return {
-                type_key: "float",
-                data_key: "nan"
+                self.type_key: self._tag_names['numpy.ndarray'],
+                'dtype': descr,
+                'shape': shape,
+                'order': order,
+                'bin': data
             }
-        elif isinstance(v, float) and math.isinf(v):
+        if self.binary_ndarray and not v.dtype.hasobject:
+            descr, shape, order, data = _ndarray_buffer(v)
             return {
-                type_key: "float",
-                data_key: "inf" if v > 0 else "-inf"
+                self.type_key: self._tag_names['numpy.ndarray'],
+                'dtype': descr,
+                'shape': shape,
+                'order': order,
+                'b64': base64.b64encode(data).decode('ascii')
             }
-        elif isinstance(v, (int, float, str, bool)) or v is None:
-            return v
-        elif np is not None and isinstance(v, np.ndarray):
-            return {
-                type_key: 'numpy.ndarray',
-                data_key: self.to_json_dict(v.tolist())
-            }
-        elif np is not None and isinstance(v, np.bool_):
-            return bool(v)
-        elif pd is not None and isinstance(v, pd.DataFrame):
+        return {
+            self.type_key: self._tag_names['numpy.ndarray'],
+            self.data_key: self.to_json_dict(v.tolist())
+        }
+
+    def _encode_dataframe(self, v: 'pd.DataFrame') -> JSONPrimitive:
+        if self.columnar_dataframe:
             return {
-                type_key: 'pandas.DataFrame',
-                data_key: self.to_json_dict(v.to_dict())
+                self.type_key: self._tag_names['pandas.DataFrame'],
+                'columns': self._encode_index(v.columns),
+                'dtypes': [self._encode_dtype(dtype) for dtype in v.dtypes],
+                'index': self._encode_index(v.index),
+                'data': [self._encode_vector(v.iloc[:, i]) for i in range(v.shape[1])]
             }
+        return {
+            self.type_key: self._tag_names['pandas.DataFrame'],
+            self.data_key: self.to_json_dict(v.to_dict())
+        }
+
+    def _encode_index(self, index: 'pd.Index') -> JSONPrimitive:
+        if isinstance(index, pd.RangeIndex):
+            return {'start': index.start, 'stop': index.stop, 'step': index.step,
+                    'name': self.to_json_dict(index.name)}
+        if isinstance(index, pd.MultiIndex):
+            return {'tuples': self._encode_vector(index), 'names': self.to_json_dict(list(index.names))}
+        d = {'dtype': self._encode_dtype(index.dtype), 'data': self._encode_vector(index),
+             'name': self.to_json_dict(index.name)}
+        if isinstance(index, (pd.DatetimeIndex, pd.TimedeltaIndex)) and index.freq is not None:
+            d['freq'] = index.freqstr
+        return d
+
+    def _encode_dtype(self, dtype: Any) -> JSONPrimitive:
+        """Name of pandas/numpy dtype. Categorical also keeps its categories and order.
+        Time zone aware datetime keeps its unit and time zone name.
+        """
+        if isinstance(dtype, pd.CategoricalDtype):
+            return {'categories': self._encode_vector(dtype.categories), 'ordered': bool(dtype.ordered)}
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            return {'unit': dtype.unit, 'tz': str(dtype.tz)}
+        return str(dtype)
+
+    def _encode_vector(self, values: Union['pd.Series', 'pd.Index']) -> JSONPrimitive:
+        """Dump pandas column/index as numpy.ndarray if it is numeric, list otherwise.
+        datetime64 and timedelta64 are dumped as int64 in the unit of their dtype.
+        Time zone aware datetime is dumped the same way in UTC.
+        """
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            return self.to_json_dict(values.array.tz_convert('UTC').tz_localize(None).to_numpy().view('i8'))
+        arr = values.to_numpy()
+        if arr.dtype.kind in 'mM':
+            return self.to_json_dict(arr.view('i8'))
+        if arr.dtype.kind in _NUMERIC_KINDS:
+            return self.to_json_dict(arr)
+        to_json_dict = self.to_json_dict
+        na = getattr(pd, 'NA', None)  # older pandas keep missing values of nullable columns as pd.NA
+        return [None if x is na else to_json_dict(x) for x in arr.tolist()]
+
+
+def _identity(v: Any) -> Any:
+    return v
+
+
+def _build_dict(pairs: List[Any]) -> Dict[Any, Any]:
+    it = iter(pairs)
+    return dict(zip(it, it))
+
+
+def _build_interned_dict(intern: Callable[[str], str]) -> Callable[[List[Any]], Dict[Any, Any]]:
+    def build(pairs: List[Any]) -> Dict[Any, Any]:
+        it = iter(pairs)
+        return {intern(k) if type(k) is str else k: v for k, v in zip(it, it)}
+    return build
+
+
+def _join_chunks(chunks: Iterator[str], size: int) -> str:
+    """Next chunks of an iterator joined until they are at least size long. '' at the end."""
+    buf = []
+    n = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        n += len(chunk)
+        if n >= size:
+            break
+    return ''.join(buf)
+
+
+def _replace_nodes(root: JSONPrimitive, replacements: Dict[int, JSONPrimitive]) -> JSONPrimitive:
+    """Replace nodes of json friendly tree by id. Each node must appear only once in the tree."""
+    root = replacements.pop(id(root), root)
+    stack = [root]
+    while stack and replacements:
+        node = stack.pop()
+        items = node.items() if type(node) is dict else enumerate(node)
+        for k, x in list(items):
+            if type(x) is dict or type(x) is list:
+                new = replacements.pop(id(x), None)
+                if new is not None:
+                    node[k] = new
+                stack.append(x)
+    return root
+
+
+def _is_compact_document(d: JSONPrimitive) -> bool:
+    return type(d) is dict and _COMPACT_VERSION_KEY in d and _COMPACT_PAYLOAD_KEY in d
+
+
+def _ndarray_buffer(v: 'np.ndarray') -> Tuple[JSONPrimitive, List[int], str, bytes]:
+    """Split array into json friendly dtype description, shape, memory order and raw bytes."""
+    order = 'F' if v.flags.f_contiguous and not v.flags.c_contiguous else 'C'
+    return np.lib.format.dtype_to_descr(v.dtype), list(v.shape), order, v.tobytes(order=order)
+
+
+def _ndarray_from_buffer(descr: JSONPrimitive, shape: List[int], order: str, data: bytes) -> 'np.ndarray':
+    """Inverse of _ndarray_buffer. The array is a writable view of (a copy of) data."""
+    if isinstance(descr, list):  # structured dtype; json turned the tuples into lists
+        descr = [tuple(field) for field in descr]
+    dtype = np.lib.format.descr_to_dtype(descr)
+    return np.frombuffer(bytearray(data), dtype=dtype).reshape(shape, order=order)
+
+
+_BINARY_MAGIC = b'SJB\x01'
+# value type codes; 0x80 | n is the int n for 0 <= n < 128. Codes from _B_INT on are followed by a varint.
+_B_NONE, _B_FALSE, _B_TRUE, _B_FLOAT, _B_INT, _B_NEG_INT, _B_STR, _B_STR_REF, _B_BYTES, _B_LIST, _B_DICT = range(11)
+_B_SMALL_INT = 0x80
+_BINARY_REF_LENGTH = 64  # longer strings are never written as back references
+_DOUBLE = struct.Struct('<d')
+_BINARY_BASES = ((str, str), (int, int), (float, float), (list, list), (tuple, list), (dict, dict))
+
+
+def _varint(n: int) -> bytes:
+    """n >= 0 in 7 bit groups, least significant first, high bit set on all but the last."""
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _binary_dumps(root: JSONPrimitive) -> bytes:
+    """Binary document of a json friendly tree (plus bytes nodes). See StrongJson.to_bytes.
+
+    Every value starts with a type code: None, False, True, float (8 bytes little endian),
+    int (varint of n or, for _B_NEG_INT, of -1 - n), str (varint byte length, utf-8), str back
+    reference (varint index of an earlier str of at most _BINARY_REF_LENGTH characters, counted
+    in the order they were written, up to _INTERN_TABLE_SIZE of them), bytes (varint length, raw),
+    list (varint length, items) and dict (varint length, key value pairs).
+    """
+    out = bytearray(_BINARY_MAGIC)
+    append = out.append
+    strings = {}  # type: Dict[str, int]
+    stack = [iter((root,))]
+    # ids of the containers being written, like json's check_circular; path has one per stack entry
+    path = [None]  # type: List[Optional[int]]
+    on_path = set()  # type: Set[int]
+    while stack:
+        for v in stack[-1]:
+            cls = type(v)
+            if cls is str:
+                i = strings.get(v)
+                if i is None:
+                    data = v.encode('utf-8', 'surrogatepass')
+                    n = len(data)
+                    append(_B_STR)
+                    if n < 0x80:
+                        append(n)
+                    else:
+                        out += _varint(n)
+                    out += data
+                    if len(v) <= _BINARY_REF_LENGTH and len(strings) < _INTERN_TABLE_SIZE:
+                        strings[v] = len(strings)
+                else:
+                    append(_B_STR_REF)
+                    if i < 0x80:
+                        append(i)
+                    else:
+                        out += _varint(i)
+            elif cls is int:
+                if 0 <= v < 0x80:
+                    append(_B_SMALL_INT | v)
+                elif v >= 0:
+                    append(_B_INT)
+                    out += _varint(v)
+                else:
+                    append(_B_NEG_INT)
+                    out += _varint(-1 - v)
+            elif cls is dict or cls is OrderedDict:
+                n = len(v)
+                append(_B_DICT)
+                if n < 0x80:
+                    append(n)
+                else:
+                    out += _varint(n)
+                if id(v) in on_path:
+                    raise ValueError('Circular reference detected')
+                stack.append(itertools.chain.from_iterable(v.items()))
+                path.append(id(v))
+                on_path.add(id(v))
+                break
+            elif cls is list:
+                n = len(v)
+                append(_B_LIST)
+                if n < 0x80:
+                    append(n)
+                else:
+                    out += _varint(n)
+                if id(v) in on_path:
+                    raise ValueError('Circular reference detected')
+                stack.append(iter(v))
+                path.append(id(v))
+                on_path.add(id(v))
+                break
+            elif cls is float:
+                append(_B_FLOAT)
+                out += _DOUBLE.pack(v)
+            elif v is None:
+                append(_B_NONE)
+            elif v is True:
+                append(_B_TRUE)
+            elif v is False:
+                append(_B_FALSE)
+            elif cls is bytes:
+                append(_B_BYTES)
+                out += _varint(len(v))
+                out += v
+            else:  # subclasses and tuple, like json.dumps
+                base = next((base for typ, base in _BINARY_BASES if isinstance(v, typ)), None)
+                if base is None:
+                    raise StrongJsonError(f'{cls.__name__} is not a json friendly value')
+                if id(v) in on_path:
+                    raise ValueError('Circular reference detected')
+                stack.append(iter((base(v),)))
+                path.append(id(v))
+                on_path.add(id(v))
+                break
+        else:
+            stack.pop()
+            on_path.discard(path.pop())
+    return bytes(out)
+
+
+def _binary_loads(b: bytes) -> JSONPrimitive:
+    """Inverse of _binary_dumps. bytes nodes are read only memoryviews into b."""
+    data = b if type(b) is bytes else bytes(b)
+    if data[:len(_BINARY_MAGIC)] != _BINARY_MAGIC:
+        raise StrongJsonError('Not a strong_json binary document')
+    view = memoryview(data)
+    strings = []  # type: List[str]
+    add_string = strings.append
+    pos = len(_BINARY_MAGIC)
+    end = len(data)
+    # list being filled and how many items are left, or dict, values left (keys included) and key
+    root = []  # type: List[JSONPrimitive]
+    container, left, key = root, 1, _NO_KEY
+    stack = []  # type: List[Tuple[Any, int, Any]]
+    try:
+        while True:
+            if left == 0:
+                if not stack:
+                    break
+                container, left, key = stack.pop()
+                continue
+            left -= 1
+            code = data[pos]
+            pos += 1
+            if code >= _B_SMALL_INT:
+                v = code & 0x7f
+            elif code >= _B_INT:
+                n = data[pos]
+                pos += 1
+                if n >= 0x80:
+                    n &= 0x7f
+                    shift = 7
+                    while True:
+                        byte = data[pos]
+                        pos += 1
+                        n |= (byte & 0x7f) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+                if code == _B_STR_REF:
+                    v = strings[n]
+                elif code == _B_STR:
+                    if pos + n > end:
+                        raise IndexError
+                    v = data[pos:pos + n].decode('utf-8', 'surrogatepass')
+                    pos += n
+                    if len(v) <= _BINARY_REF_LENGTH and len(strings) < _INTERN_TABLE_SIZE:
+                        add_string(v)
+                elif code == _B_DICT or code == _B_LIST:
+                    v = {} if code == _B_DICT else []
+                    if type(container) is list:
+                        container.append(v)
+                    elif key is _NO_KEY:
+                        raise StrongJsonError(f'Container as dict key at byte {pos}')
+                    else:
+                        container[key] = v
+                        key = _NO_KEY
+                    stack.append((container, left, key))
+                    container, left, key = v, 2 * n if code == _B_DICT else n, _NO_KEY
+                    continue
+                elif code == _B_INT:
+                    v = n
+                elif code == _B_NEG_INT:
+                    v = -1 - n
+                elif code == _B_BYTES:
+                    if pos + n > end:
+                        raise IndexError
+                    v = view[pos:pos + n]
+                    pos += n
+                else:
+                    raise StrongJsonError(f'Unknown value type {code} at byte {pos - 1}')
+            elif code == _B_FLOAT:
+                v = _DOUBLE.unpack_from(data, pos)[0]
+                pos += 8
+            elif code == _B_NONE:
+                v = None
+            elif code == _B_TRUE:
+                v = True
+            elif code == _B_FALSE:
+                v = False
+            else:
+                raise StrongJsonError(f'Unknown value type {code} at byte {pos - 1}')
+            if type(container) is list:
+                container.append(v)
+            elif key is _NO_KEY:
+                key = v
+            else:
+                container[key] = v
+                key = _NO_KEY
+    except (IndexError, struct.error, UnicodeDecodeError):
+        raise StrongJsonError(f'Truncated or corrupt strong_json binary document at byte {pos}') from None
+    if pos != end:
+        raise StrongJsonError(f'Unexpected data after the document at byte {pos}')
+    return root[0]
+
+
+_NO_KEY = object()
+
+
+class _Sidecar:
+    """.npy files next to a json document written by dump_snapshot."""
+
+    def __init__(self, path: str, threshold: int = _SIDECAR_THRESHOLD):
+        self.directory, self.prefix = os.path.split(os.path.abspath(path))
+        self.threshold = threshold
+        self.count = 0
+        self._token = uuid.uuid4().hex
+        self._written = []  # type: List[Tuple[str, str]]  # temporary path, final path
+
+    def temporary(self, path: str) -> str:
+        """Where to write the file going to path. It is moved there by commit."""
+        directory, name = os.path.split(os.path.abspath(path))
+        tmp = os.path.join(directory, f'.{name}.{self._token}.tmp')
+        self._written.append((tmp, path))
+        return tmp
+
+    def commit(self) -> None:
+        """Move the files written so far into place, the first one (the json document) last.
+        A file an earlier snapshot left there is replaced, not rewritten, so memory maps of it stay valid.
+        """
+        for tmp, path in reversed(self._written):
+            os.replace(tmp, path)
+        self._written = []
+
+    def discard(self) -> None:
+        for tmp, _ in self._written:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._written = []
+
+    def save(self, arr: 'np.ndarray') -> str:
+        name = f'{self.prefix}.{self.count}.npy'
+        self.count += 1
+        with open(self.temporary(os.path.join(self.directory, name)), 'wb') as fp:
+            np.save(fp, arr, allow_pickle=False)
+        return name
+
+    def remove_unused(self) -> None:
+        """Remove .npy files of this prefix beyond the ones saved, left by an earlier snapshot."""
+        pattern = re.compile(re.escape(self.prefix) + r'\.(\d+)\.npy')
+        for name in os.listdir(self.directory):
+            m = pattern.fullmatch(name)
+            if m is not None and int(m.group(1)) >= self.count:
+                os.remove(os.path.join(self.directory, name))
+
+    def load(self, name: str) -> 'np.ndarray':
+        if not isinstance(name, str) or os.path.basename(name) != name:
+            raise StrongJsonError(f'Invalid .npy file name {name!r}')
+        return np.load(os.path.join(self.directory, name), mmap_mode='r', allow_pickle=False)
+
+
+# bool, int, uint, float, complex
+_NUMERIC_KINDS = frozenset('biufc')
+# numpy datetime64/timedelta64 dtype without time zone (see _encode_vector)
+_TIME_DTYPE = re.compile(r'(datetime|timedelta)64\[\w+\]$')
+
+# computed from the configuration; not pickled
+_DERIVED_ATTRIBUTES = frozenset([
+    '_encoders', '_encoder_cache', '_field_readers', '_tree_kinds', '_compiled_encoders',
+    '_tag_decoders', '_class_decoders', '_class_plans', '_compiled_decoders', '_shallow', '_intern_table',
+    '_schema_codecs', '_has_from_jsonable', '_encode_cache', '_enum_encoder', '_tuple_cache', '_binary_session',
+    '_iterative_encode', '_iterative_decode',
+    'to_json_dict', 'from_json_dict', '_inner_to_json_dict', '_inner_from_json_dict',
+])
+
+_CHUNKS_PER_WORKER = 4
+_PARALLEL_THRESHOLD = 1 << 12
+_worker_strong_json = None  # type: Optional[StrongJson]
+
+
+def _init_worker(worker: StrongJson) -> None:
+    global _worker_strong_json
+    _worker_strong_json = worker
+
+
+def _worker_pool(workers: int, worker: StrongJson) -> ProcessPoolExecutor:
+    """Process pool whose processes encode/decode with worker."""
+    if sys.version_info >= (3, 7):
+        return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(worker,))
+    _init_worker(worker)  # python 3.6 has no initializer: forked processes inherit the global
+    return ProcessPoolExecutor(workers)
+
+
+def _decode_lines(lines: List[Union[str, bytes]]) -> List[Any]:
+    from_json = _worker_strong_json.from_json
+    return [from_json(line) for line in lines if line.strip()]
+
+
+def _encode_items(items: list, separator: str, kwd: Dict[str, Any]) -> str:
+    """Elements of a list as they appear in its json text, without the brackets."""
+    to_json_dict = _worker_strong_json.to_json_dict
+    dumps = _worker_strong_json.backend.dumps
+    return separator.join([dumps(to_json_dict(v), **kwd) for v in items])
+
+
+def _decode_line_range(path: str, start: int, end: int) -> List[Any]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines()
+    return _decode_lines([line.decode('utf-8') for line in lines])
+
+
+def _split_lines(path: str, start: int, end: int, n: int) -> List[int]:
+    """Split [start, end) of file at path into about n ranges ending at line boundaries."""
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for i in range(1, n):
+            pos = start + (end - start) * i // n
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            f.readline()  # move to the start of the next line
+            pos = f.tell()
+            if bounds[-1] < pos < end:
+                bounds.append(pos)
+    bounds.append(end)
+    return bounds
+
+
+class _ArrayStreamParser:
+    """Incremental parser for json document whose top level is an array.
+    Feed it text as it comes; it gives back the elements parsed so far.
+    """
+    _START, _FIRST, _VALUE, _SEPARATOR, _DONE = range(5)
+
+    def __init__(self, raw_decode: Callable[[str, int], Tuple[Any, int]]):
+        self._raw_decode = raw_decode
+        self._buf = ''
+        self._state = self._START
+        self._retry_at = 0
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        """Add text to the buffer and parse as many elements as possible.
+
+        Args:
+            text (str): next piece of the document
+            final (bool): True if there is nothing after text
+
+        Returns:
+            List[Any]. Elements completed by text (as given back by the decoder).
+        """
+        buf = self._buf + text if self._buf else text
+        n = len(buf)
+        if n < self._retry_at and not final:
+            # last element was incomplete; don't reparse it for every small chunk
+            self._buf = buf
+            return []
+        self._retry_at = 0
+        incomplete = False
+        whitespace = json.decoder.WHITESPACE.match
+        items = []
+        pos = 0
+        state = self._state
+        while True:
+            pos = whitespace(buf, pos).end()
+            if pos == n:
+                break
+            if state == self._START:
+                if buf[pos] != '[':
+                    raise json.JSONDecodeError('Expecting top level array', buf, pos)
+                pos += 1
+                state = self._FIRST
+            elif state == self._FIRST and buf[pos] == ']':
+                pos += 1
+                state = self._DONE
+            elif state in (self._FIRST, self._VALUE):
+                try:
+                    item, end = self._raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if final:
+                        raise json.JSONDecodeError(e.msg, buf, e.pos)
+                    incomplete = True
+                    break
+                if not final:
+                    # a number cut by the chunk boundary decodes fine ('1' of '1.5' or '1e5'),
+                    # so only take the element once the delimiter after it is in
+                    after = whitespace(buf, end).end()
+                    if after == n or buf[after] not in ',]':
+                        break
+                items.append(item)
+                pos = end
+                state = self._SEPARATOR
+            elif state == self._SEPARATOR:
+                if buf[pos] == ',':
+                    state = self._VALUE
+                elif buf[pos] == ']':
+                    state = self._DONE
+                else:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+                pos += 1
+            else:
+                raise json.JSONDecodeError('Extra data', buf, pos)
+        if final and state != self._DONE:
+            raise json.JSONDecodeError('Unterminated top level array', buf, pos)
+        self._state = state
+        self._buf = buf[pos:]
+        if incomplete:  # twice the element, not the whole buffer before it was trimmed
+            self._retry_at = 2 * len(self._buf)
+        return items
+
+
+_CACHE_POLICIES = ('lru', 'fifo')
+_CACHED_TUPLE_SIZE = 8
+_CACHED_TUPLE_TYPES = frozenset([str, int, float, bool, type(None)])
+
+
+class _EncodeCache:
+    """Bounded value -> json tables for immutable values, one per wire format.
+    See StrongJson(encode_cache=...).
+    """
+
+    def __init__(self, maxsize: int, policy: str):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.tables = {False: OrderedDict(), True: OrderedDict()}  # type: Dict[bool, OrderedDict]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self) -> None:
+        for table in self.tables.values():
+            table.clear()
+
+    def wrap(self, encode: Callable[[Any], JSONPrimitive], compact: bool,
+             key: Optional[Callable[[Any], Any]] = None) -> Callable[[Any], JSONPrimitive]:
+        """encode with the cache in front. Values are looked up by key(v) (v if key is None);
+        key(v) None means v isn't cached.
+        """
+        table = self.tables[compact]
+        move_to_end = table.move_to_end if self.policy == 'lru' else None
+        maxsize = self.maxsize
+
+        def encode_cached(v: Any) -> JSONPrimitive:
+            k = v if key is None else key(v)
+            node = table.get(k)
+            if node is not None:
+                self.hits += 1
+                if move_to_end is not None:
+                    move_to_end(k)
+                return node
+            if k is None:
+                return encode(v)
+            self.misses += 1
+            node = table[k] = encode(v)
+            if len(table) > maxsize:
+                table.popitem(last=False)
+                self.evictions += 1
+            return node
+        return encode_cached
+
+
+def _tuple_cache_key(v: tuple) -> Any:
+    if len(v) > _CACHED_TUPLE_SIZE:
+        return None
+    types = tuple(map(type, v))
+    if not _CACHED_TUPLE_TYPES.issuperset(types):
+        return None
+    # nan never finds itself again; -0.0 == 0.0 but is written differently
+    if float in types and not all(x - x == 0.0 and (x or math.copysign(1.0, x) > 0.0)
+                                  for x in v if type(x) is float):
+        return None
+    return v, types  # (1,) == (True,) == (1.0,)
+
+
+def _datetime_cache_key(v: datetime) -> Any:
+    return v if v.tzinfo is None else (v, v.tzinfo)  # aware datetimes are equal across time zones
+
+
+def _enum_cache_key(v: Enum) -> Any:
+    return type(v), v  # IntEnum members of different classes can be equal
+
+
+def materialize(v: Any) -> Any:
+    """Object behind a proxy returned by StrongJson.from_json_lazy (decoded now if it isn't yet).
+    Anything else is returned as is.
+
+    Args:
+        v (Any): proxy or object
+
+    Returns:
+        Any
+    """
+    if type(v) is _LazyProxy:
+        return v._LazyProxy__get()
+    return v
+
+
+_NOT_DECODED = object()
+
+
+class _LazyProxy:
+    """Stand-in for a tagged value which is decoded on first use. See StrongJson.from_json_lazy."""
+    __slots__ = ('__raw', '__decode', '__value')
+
+    def __init__(self, raw: Dict[str, JSONPrimitive], decode: Callable[[JSONPrimitive], Any]):
+        object.__setattr__(self, '_LazyProxy__raw', raw)
+        object.__setattr__(self, '_LazyProxy__decode', decode)
+        object.__setattr__(self, '_LazyProxy__value', _NOT_DECODED)
+
+    def __get(self) -> Any:
+        value = self.__value
+        if value is _NOT_DECODED:
+            value = self.__decode(self.__raw)
+            object.__setattr__(self, '_LazyProxy__value', value)
+            object.__setattr__(self, '_LazyProxy__raw', None)
+        return value
+
+    @property
+    def __class__(self) -> Type[Any]:
+        return type(self.__get())
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.__get(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self.__get(), name)
+
+    def __dir__(self) -> List[str]:
+        return dir(self.__get())
+
+    def __repr__(self) -> str:
+        return repr(self.__get())
+
+    def __str__(self) -> str:
+        return str(self.__get())
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.__get(), format_spec)
+
+    def __hash__(self) -> int:
+        return hash(self.__get())
+
+    def __bool__(self) -> bool:
+        return bool(self.__get())
+
+    def __len__(self) -> int:
+        return len(self.__get())
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.__get())
+
+    def __reversed__(self) -> Iterator[Any]:
+        return reversed(self.__get())
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self.__get()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.__get()[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.__get()[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        del self.__get()[key]
+
+    def __call__(self, *args, **kwd) -> Any:
+        return self.__get()(*args, **kwd)
+
+    def __array__(self, *args, **kwd) -> Any:
+        return np.asarray(self.__get(), *args, **kwd)
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        return _identity, (self.__get(),)
+
+
+def _forward_operator(op: Callable[..., Any], reflected: bool = False) -> Callable[..., Any]:
+    if reflected:
+        return lambda self, other: op(other, materialize(self))
+    return lambda self, *args: op(materialize(self), *args)
+
+
+for _name, _op in [('eq', operator.eq), ('ne', operator.ne), ('lt', operator.lt), ('le', operator.le),
+                   ('gt', operator.gt), ('ge', operator.ge), ('add', operator.add), ('sub', operator.sub),
+                   ('mul', operator.mul), ('matmul', operator.matmul), ('truediv', operator.truediv),
+                   ('floordiv', operator.floordiv), ('mod', operator.mod), ('pow', operator.pow),
+                   ('and', operator.and_), ('or', operator.or_), ('xor', operator.xor), ('neg', operator.neg),
+                   ('pos', operator.pos), ('abs', operator.abs), ('invert', operator.invert),
+                   ('int', int), ('float', float), ('complex', complex), ('index', operator.index)]:
+    setattr(_LazyProxy, f'__{_name}__', _forward_operator(_op))
+for _name, _op in [('add', operator.add), ('sub', operator.sub), ('mul', operator.mul), ('matmul', operator.matmul),
+                   ('truediv', operator.truediv), ('floordiv', operator.floordiv), ('mod', operator.mod),
+                   ('pow', operator.pow), ('and', operator.and_), ('or', operator.or_), ('xor', operator.xor)]:
+    setattr(_LazyProxy, f'__r{_name}__', _forward_operator(_op, reflected=True))
+del _name, _op
+
+
+class _LazyList(list):
+    """List look alike for json.JSONEncoder.iterencode which converts items as they are iterated.
+    origin is the object the items come from (items itself by default), for the cycle check of _iter_json.
+    """
+
+    def __init__(self, items: Iterable[Any], length: int, convert: Callable[[Any], JSONPrimitive],
+                 origin: Any = None):
+        super().__init__()
+        self._items = items
+        self._length = length
+        self._convert = convert
+        self._origin = items if origin is None else origin
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[JSONPrimitive]:
+        return map(self._convert, self._items)
+
+
+class _LazyDict(dict):
+    """Dict look alike for json.JSONEncoder.iterencode which converts values as they are iterated.
+    origin is the object source comes from (source itself by default), for the cycle check of _iter_json.
+    """
+
+    def __init__(self, source: Dict[str, Any], convert: Callable[[Any], JSONPrimitive], origin: Any = None):
+        super().__init__()
+        self._source = source
+        self._convert = convert
+        self._origin = source if origin is None else origin
+
+    def __len__(self) -> int:
+        return len(self._source)
+
+    def items(self) -> Iterator[Tuple[str, JSONPrimitive]]:
+        convert = self._convert
+        return ((k, convert(v)) for k, v in self._source.items())
+
+
+class _CompactEnvelope(dict):
+    """Dict look alike for json.JSONEncoder.iterencode holding a streamed compact document.
+    The payload fills the tag table as it is written out, so the table comes after it, if it isn't empty.
+    """
+
+    def __init__(self, payload: JSONPrimitive, tag_table: List[str]):
+        super().__init__()
+        self._payload = payload
+        self._tag_table = tag_table
+
+    def __len__(self) -> int:
+        return 2
+
+    def items(self) -> Iterator[Tuple[str, JSONPrimitive]]:
+        yield _COMPACT_VERSION_KEY, 2
+        yield _COMPACT_PAYLOAD_KEY, self._payload
+        if self._tag_table:
+            yield _COMPACT_TABLE_KEY, self._tag_table
+
+
+_FINISH = object()
+_LIST, _TUPLE, _SET, _DICT, _COMPACT_DICT, _OBJECT, _TO_JSONABLE, _SCALAR, _LEAF = range(9)
+# encoders and decoders _encode_tree and _decode_tree expand themselves
+_TREE_ENCODERS = {
+    StrongJson._encode_list: _LIST,
+    StrongJson._encode_tuple: _TUPLE,
+    StrongJson._encode_set: _SET,
+    StrongJson._encode_dict: _DICT,
+    StrongJson._encode_compact_dict: _COMPACT_DICT,
+    StrongJson.simple_object_dump: _OBJECT,
+    StrongJson._encode_to_jsonable: _TO_JSONABLE,
+}
+_TREE_DECODERS = {
+    StrongJson._decode_tuple: _TUPLE,
+    StrongJson._decode_dict: _DICT,
+    StrongJson._decode_compact_dict: _COMPACT_DICT,
+}
+
+_STREAM_ENCODERS = {
+    StrongJson._encode_list: StrongJson._stream_list,
+    StrongJson._encode_dict: StrongJson._stream_dict,
+    StrongJson._encode_tuple: StrongJson._stream_tuple,
+    StrongJson._encode_set: StrongJson._stream_set,
+    StrongJson._encode_compact_dict: StrongJson._stream_compact_dict,
+    StrongJson.simple_object_dump: StrongJson._stream_object,
+    StrongJson._encode_to_jsonable: StrongJson._stream_to_jsonable,
+}
+
+# type of values which are already json friendly (float is not because of nan and inf)
+_JSON_SCALARS = frozenset([str, int, bool, type(None)])
+# type of values json.loads gives back that decode to themselves
+_PARSED_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+# element type of typing annotation -> constructor of the decoded container
+_SCHEMA_SEQUENCES = {
+    list: list,
+    collections.abc.Sequence: list,
+    collections.abc.MutableSequence: list,
+    collections.abc.Iterable: list,
+    tuple: tuple,
+    set: set,
+    collections.abc.Set: set,
+    collections.abc.MutableSet: set,
+    frozenset: frozenset,
+}
+
+_ISO_FORMAT = re.compile(r'(\d{4})-(\d\d)-(\d\d)(?:[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{6}))?'
+                         r'(?:([+-])(\d\d):(\d\d)(?::(\d\d)(?:\.(\d{6}))?)?)?)?')
+
+
+def _fromisoformat(tp: Type[Any]) -> Callable[[str], Any]:
+    """tp.fromisoformat for date or datetime. Python 3.6 doesn't have it; parse the isoformat() output ourselves."""
+    return getattr(tp, 'fromisoformat', None) or functools.partial(_parse_isoformat, tp)
+
+
+def _parse_isoformat(tp: Type[Any], s: str) -> Any:
+    m = _ISO_FORMAT.fullmatch(s)
+    if m is None or (tp is date) != (m.group(4) is None):
+        raise ValueError(f'Invalid isoformat string: {s!r}')
+    year, month, day, hour, minute, second, microsecond, sign, *offset = m.groups()
+    if tp is date:
+        return date(int(year), int(month), int(day))
+    tzinfo = None
+    if sign is not None:
+        hours, minutes, seconds, microseconds = (int(x or 0) for x in offset)
+        delta = timedelta(hours=hours, minutes=minutes, seconds=seconds, microseconds=microseconds)
+        tzinfo = timezone(-delta if sign == '-' else delta)
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), int(microsecond or 0),
+                    tzinfo)
+
+
+# dict key type -> (encode, decode) to and from json object key
+_SCHEMA_KEYS = {
+    str: (_identity, _identity),
+    int: (str, int),
+    date: (date.isoformat, _fromisoformat(date)),
+    datetime: (datetime.isoformat, _fromisoformat(datetime)),
+}
+
+
+def _type_hints(cls: Type[Any]) -> Dict[str, Any]:
+    """Annotations of the fields (dataclass, NamedTuple) and constructor of cls. Unresolvable ones are left out."""
+    hints = {}  # type: Dict[str, Any]
+    for annotated in (cls, cls.__init__):
+        try:
+            hints.update(get_type_hints(annotated))
+        except Exception:  # forward reference to unknown name etc.
+            pass
+    return hints
+
+
+def _stats_key(cls: Type[Any]) -> str:
+    if np is not None and cls is np.ndarray:
+        return 'numpy.ndarray'
+    if pd is not None and cls is pd.DataFrame:
+        return 'pandas.DataFrame'
+    return cls.__qualname__
+
+
+def _static_fields(cls: Type[Any]) -> Optional[Tuple[str, ...]]:
+    """Field names of NamedTuple, dataclass or class whose instances only have __slots__.
+    None for classes whose fields live in __dict__.
+    """
+    if issubclass(cls, tuple) and hasattr(cls, '_fields'):
+        return tuple(cls._fields)
+    if dataclasses is not None and dataclasses.is_dataclass(cls):
+        return tuple(f.name for f in dataclasses.fields(cls) if f.init)
+    if any('__dict__' in vars(klass) for klass in cls.__mro__) or \
+            not any('__slots__' in vars(klass) for klass in cls.__mro__):
+        return None
+    return _slot_names(cls)
+
+
+def _slot_names(cls: Type[Any]) -> Tuple[str, ...]:
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = vars(klass).get('__slots__', ())
+        for name in [slots] if isinstance(slots, str) else slots:
+            if name in ('__dict__', '__weakref__'):
+                continue
+            if name.startswith('__') and not name.endswith('__'):
+                name = '_' + klass.__name__.lstrip('_') + name  # private name mangling
+            if name not in names:
+                names.append(name)
+    return tuple(names)
+
+
+def _field_reader(cls: Type[Any]) -> Callable[[Any], Iterable[Tuple[str, Any]]]:
+    """(name, value) pairs of an object to dump. Computed once per class."""
+    if issubclass(cls, tuple) and hasattr(cls, '_fields'):
+        names = tuple(cls._fields)
+        return lambda v: zip(names, v)
+    static_names = _static_fields(cls)
+    if static_names is None:
+        slot_names = _slot_names(cls)
+        if not slot_names:
+            return lambda v: ((k, x) for k, x in v.__dict__.items() if k not in {'__objclass__', })
+        # slots and __dict__ (subclass of a class without __slots__ or the other way around)
+        return lambda v: itertools.chain(_read_slots(v, slot_names),
+                                         ((k, x) for k, x in v.__dict__.items() if k not in {'__objclass__', }))
+    if len(static_names) == 0:
+        return lambda v: ()
+    getter = operator.attrgetter(*static_names)
+    if len(static_names) == 1:
+        def read_one(v: Any) -> Iterable[Tuple[str, Any]]:
+            try:
+                return ((static_names[0], getter(v)),)
+            except AttributeError:  # unset slot
+                return _read_slots(v, static_names)
+        return read_one
+
+    def read(v: Any) -> Iterable[Tuple[str, Any]]:
+        try:
+            return zip(static_names, getter(v))
+        except AttributeError:  # unset slot
+            return _read_slots(v, static_names)
+    return read
+
+
+def _read_slots(v: Any, names: Tuple[str, ...]) -> List[Tuple[str, Any]]:
+    """(name, value) pairs of the slots that are set."""
+    missing = object()
+    pairs = ((name, getattr(v, name, missing)) for name in names)
+    return [(name, x) for name, x in pairs if x is not missing]
+
+
+def _compilable_params(obj_class: Type[Any], type_key: str) -> Optional[List[inspect.Parameter]]:
+    """Constructor parameters if they can all be passed by name, None otherwise."""
+    try:
+        params = list(inspect.signature(obj_class).parameters.values())
+    except (TypeError, ValueError):
+        return None
+    for param in params:
+        if param.kind not in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY) or \
+                not param.name.isidentifier() or param.name == type_key:
+            return None
+    return params
+
+
+def _create_fn(name: str, args: str, body: List[str], namespace: Dict[str, Any]) -> Callable[..., Any]:
+    """Same idea as dataclasses._create_fn."""
+    src = f'def {name}({args}):\n' + '\n'.join(f'    {line}' for line in body)
+    exec(src, namespace)
+    return namespace[name]
+
+
+def _compile_encoder(obj_class: Type[Any],
+                     params: List[inspect.Parameter],
+                     passthrough: FrozenSet[type]) -> Callable[[StrongJson, Any], JSONPrimitive]:
+    """Generate encoder(self, v) which produces the same dict as simple_object_dump
+    for objects whose __dict__ holds exactly the constructor parameters (in order),
+    or whose static fields (see _static_fields) are the constructor parameters.
+    """
+    names = tuple(param.name for param in params)
+    variables = [f'_{i}' for i in range(len(names))]
+    if _static_fields(obj_class) is None:
+        body = ['d = v.__dict__',
+                'if tuple(d) != __names:',
+                '    return self.simple_object_dump(v)']
+        body.extend(f'{var} = d[{name!r}]' for var, name in zip(variables, names))
+    elif issubclass(obj_class, tuple):  # NamedTuple
+        body = [f"{', '.join(variables)}, = v"] if names else []
+    elif names:
+        body = ['try:']
+        body.extend(f'    {var} = v.{name}' for var, name in zip(variables, names))
+        body.extend(['except AttributeError:  # unset slot',
+                     '    return self.simple_object_dump(v)'])
+    else:
+        body = []
+    # tag before the fields so that the compact tag table comes out in the same order
+    body.append('t = __tag if self._tag_index is None else self._class_tag(__tag)')
+    body.append('__to_json_dict = self.to_json_dict')
+    for i, name in enumerate(names):
+        if passthrough:
+            # finite floats are json friendly too: x - x is nan for nan and inf
+            body.append(f'if type(_{i}) is float:')
+            body.append(f'    if _{i} - _{i} != 0.0:')
+            body.append(f'        _{i} = __to_json_dict(_{i})')
+            body.append(f'elif type(_{i}) not in __passthrough:')
+            body.append(f'    _{i} = __to_json_dict(_{i})')
         else:
-            return self.simple_object_dump(v)
+            body.append(f'_{i} = __to_json_dict(_{i})')
+    items = ''.join(f', {name!r}: _{i}' for i, name in enumerate(names))
+    body.append(f"return {{self.type_key: t{items}}}")
+    namespace = {
+        '__names': names,
+        '__tag': obj_class.__qualname__,
+        '__passthrough': passthrough,
+    }
+    return _create_fn(f'encode_{obj_class.__name__}', 'self, v', body, namespace)
+
+
+def _compile_decoder(obj_class: Type[Any],
+                     params: List[inspect.Parameter],
+                     plan: 'DecodePlan',
+                     passthrough: FrozenSet[type]) -> Callable[[StrongJson, Dict[str, JSONPrimitive]], Any]:
+    """Generate decoder(self, d) which calls the constructor with the decoded parameters.
+    Missing required parameters are reported by the generic path.
+    """
+    required = [param.name for param in params if param.default is inspect.Parameter.empty]
+    optional = [param.name for param in params if param.default is not inspect.Parameter.empty]
+
+    def convert(i: int, indent: str) -> List[str]:
+        if passthrough:
+            return [f'{indent}if type(_{i}) not in __passthrough:',
+                    f'{indent}    _{i} = __from_json_dict(_{i})']
+        return [f'{indent}_{i} = __from_json_dict(_{i})']
+
+    body = ['__from_json_dict = self.from_json_dict']
+    if required:
+        body.append('try:')
+        body.extend(f'    _{i} = d[{name!r}]' for i, name in enumerate(required))
+        body.append('except KeyError:')
+        body.append('    return self._decode_with_plan(__plan, d)')
+    for i in range(len(required)):
+        body.extend(convert(i, ''))
+    kwargs = ', '.join(f'{name}=_{i}' for i, name in enumerate(required))
+    if optional:
+        body.append(f'kw = dict({kwargs})')
+        for j, name in enumerate(optional, start=len(required)):
+            body.append(f'if {name!r} in d:')
+            body.append(f'    _{j} = d[{name!r}]')
+            body.extend(convert(j, '    '))
+            body.append(f'    kw[{name!r}] = _{j}')
+        body.append('return __cls(**kw)')
+    else:
+        body.append(f'return __cls({kwargs})')
+    namespace = {
+        '__cls': obj_class,
+        '__plan': plan,
+        '__passthrough': passthrough,
+    }
+    return _create_fn(f'decode_{obj_class.__name__}', 'self, d', body, namespace)
 
 
 """
@@ -336,13 +3796,15 @@ class FromJsonable:
         Args:
             s (str): json str
             decoder (StrongJson):
-            **kwd (): the rest of keyword arguments are passed down to json.loads
+            **kwd (): the rest of keyword arguments are passed down to json.loads (see JsonBackend.loads)
 
         Returns:
             Object of this class.
 
         """
-        d = json.loads(s, **kwd)
+        d = decoder.backend.loads(s, **kwd)
+        if _is_compact_document(d):
+            return decoder._decode_compact_document(d)
         return cls.from_json_dict(d, decoder)
 
 
@@ -375,12 +3837,100 @@ class ToJsonable:
 
         Args:
             encoder (StrongJson): encoder
-            **kwd : keyword argument will be passed down to json.dumps
+            **kwd : keyword argument will be passed down to json.dumps (see JsonBackend.dumps)
 
         Returns:
             str. Json string
         """
-        return json.dumps(self.to_json_dict(encoder), **kwd)
+        if encoder.wire_format != 1:
+            return encoder.to_json(self, **kwd)  # payload is written by a compact session
+        return encoder.backend.dumps(self.to_json_dict(encoder), **kwd)
+
+
+class DecodePlan:
+    """Everything the default decoder needs to know about a class.
+    Computed once per class instead of inspecting the signature for every object.
+    """
+
+    def __init__(self, constructor: Callable[..., Any], params: FrozenSet[str], required: Tuple[str, ...]):
+        """
+
+        Args:
+            constructor (Callable[..., Any]): called with the decoded parameters as keyword arguments
+            params (FrozenSet[str]): names accepted by the constructor
+            required (Tuple[str, ...]): names without default value
+        """
+        self.constructor = constructor
+        self.params = params
+        self.required = required
+
+    def construct(self, kwargs: Dict[str, Any]) -> Any:
+        """Call constructor with decoded parameters."""
+        return self.constructor(**kwargs)
+
+    @classmethod
+    def from_class(cls, obj_class: Type[Any]) -> 'DecodePlan':
+        """Build decode plan from the signature of obj_class
+
+        Args:
+            obj_class (Type[Any]): class
+
+        Returns:
+            DecodePlan
+        """
+        params = inspect.signature(obj_class).parameters
+        required = tuple(p_name for p_name, param in params.items() if param.default == inspect.Parameter.empty)
+        return cls(obj_class, frozenset(params), required)
+
+
+class Selector:
+    """Paths of the values to decode with StrongJson.from_json(s, select=selector).
+
+    A path is a chain of field names (object attribute or dict key) and indices:
+    'customer.id', 'orders[*].total', 'orders[0].items[*].name', '[*].id' (top level array).
+    [n] picks the n-th element of list or tuple (or the key n of dict), [*] every element
+    (every value for dict) and gives a list. Missing fields and out of range indices give None.
+    Parse the paths once and reuse the Selector for many documents.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        """
+
+        Args:
+            paths (Iterable[str]): paths to select
+        """
+        self.paths = list(paths)
+        self.steps = [_parse_path(path) for path in self.paths]
+
+
+_SELECT_ALL = object()
+_PATH_STEP = re.compile(r'\.?([^.\[\]]+)|\[(\*|-?\d+)\]')
+
+
+def _parse_path(path: str) -> List[Union[str, int, object]]:
+    """'a.b[0][*]' -> ['a', 'b', 0, _SELECT_ALL]"""
+    steps = []  # type: List[Union[str, int, object]]
+    pos = 0
+    while pos < len(path):
+        m = _PATH_STEP.match(path, pos)
+        # names are separated by dots
+        if m is None or m.group(1) is not None and (path[pos] == '.') != (pos > 0):
+            raise StrongJsonError(f'Invalid path {path!r} at {pos}')
+        name, index = m.groups()
+        steps.append(name if name is not None else _SELECT_ALL if index == '*' else int(index))
+        pos = m.end()
+    return steps
+
+
+def _select_child(node: Any, step: Union[str, int], raw: bool) -> Any:
+    """node.step or node[step]; None if there is no such child."""
+    if isinstance(node, collections.abc.Mapping):
+        return node.get(step)
+    if type(step) is int:
+        if isinstance(node, collections.abc.Sequence) and not isinstance(node, str) and -len(node) <= step < len(node):
+            return node[step]
+        return None
+    return None if raw else getattr(node, step, None)
 
 
 class ClassMapBuilder:
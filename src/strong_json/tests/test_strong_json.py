@@ -1,13 +1,21 @@
+import json
 import math
-from datetime import date, datetime
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta, timezone
 from enum import Enum, IntEnum
-from typing import Dict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import pytest
 from strong_json import strong_json, ToJsonable, ClassMapBuilder, StrongJson, MissingParameterError, JSONPrimitive, \
-    FromJsonable, ClassMapLookUpFailError
+    FromJsonable, ClassMapLookUpFailError, StrongJsonError, get_backend, JsonBackend, StatsCollector
+
+try:
+    import dataclasses
+except ImportError:  # pragma: no cover (python 3.6 without the backport, see the test extra in setup.py)
+    dataclasses = None
+needs_dataclasses = pytest.mark.skipif(dataclasses is None, reason='dataclasses is not installed')
 
 
 class User(ToJsonable):
@@ -383,3 +391,1368 @@ def test_from_jsonable_from_json():
     got = BadUser.from_json(s, jsoner)
     expected = BadUser('f', 'l')
     assert got == expected
+
+
+class Money:
+    def __init__(self, cents: int):
+        self.cents = cents
+
+
+class Euro(Money):
+    pass
+
+
+class MyList(list):
+    pass
+
+
+class MyDict(ToJsonable, dict):
+    def __init__(self, x):
+        super().__init__()
+        self.x = x
+
+
+def test_register_encoder():
+    jsoner = StrongJson(class_map={})
+    jsoner.register_encoder(Money, lambda v, encoder: {encoder.type_key: 'Money', encoder.data_key: v.cents})
+    assert jsoner.to_json_dict([Money(5), Euro(7)]) == [
+        {'__type__': 'Money', '__data__': 5},
+        {'__type__': 'Money', '__data__': 7},
+    ]
+    # the default encoder is not affected
+    assert strong_json.to_json_dict(Money(5)) == {'__type__': 'Money', 'cents': 5}
+
+
+def test_encoder_subclass_dispatch():
+    assert strong_json.to_json_dict(MyList([1, (2,)])) == [1, {'__type__': 'tuple', '__data__': [2]}]
+    assert strong_json.to_json_dict(MyDict(1)) == {'__type__': 'MyDict', 'x': 1}
+    assert strong_json.to_json_dict(True) is True
+    assert strong_json.to_json_dict(np.bool_(True)) is True
+
+
+def test_decode_plan_is_cached(monkeypatch):
+    import inspect
+    calls = []
+    signature = inspect.signature
+    monkeypatch.setattr(inspect, 'signature', lambda obj: calls.append(obj) or signature(obj))
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User]))
+    raw = [{'__type__': 'User', 'first_name': 'f', 'last_name': str(i)} for i in range(10)]
+    got = jsoner.from_json_dict(raw)
+    assert got == [User('f', str(i)) for i in range(10)]
+    assert calls == [User]
+
+
+@pytest.mark.parametrize('kwd', [{'wire_format': 2}, {'share_references': True},
+                                 {'wire_format': 2, 'share_references': True}])
+def test_decode_plan_is_cached_across_documents(monkeypatch, kwd):
+    import inspect
+    calls = []
+    signature = inspect.signature
+    monkeypatch.setattr(inspect, 'signature', lambda obj: calls.append(obj) or signature(obj))
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User]), **kwd)
+    user = User('f', 'l')
+    s = jsoner.to_json([user, user])
+    for _ in range(3):
+        assert jsoner.from_json(s) == [user, user]
+    assert calls == [User]
+
+
+def test_register_decoder():
+    jsoner = StrongJson(class_map={})
+    jsoner.register_decoder('Money', lambda d, decoder: Money(decoder.from_json_dict(d['__data__'])))
+    got = jsoner.from_json_dict([{'__type__': 'Money', '__data__': 5}])
+    assert got[0].cents == 5
+    with pytest.raises(ClassMapLookUpFailError):
+        strong_json.from_json_dict({'__type__': 'Money', '__data__': 5})
+
+
+class Event(FromJsonable):
+    def __init__(self, year: int):
+        self.year = year
+
+    @classmethod
+    def from_json_dict(cls, d, decoder):
+        return cls(d['when']['year'])  # reads the json of a date
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_custom_decoders_get_json(single_pass_decode):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Event]), single_pass_decode=single_pass_decode)
+    s = json.dumps({'__type__': 'Event', 'when': strong_json.to_json_dict(date(2020, 1, 2))})
+    assert jsoner.from_json(s).year == 2020
+    jsoner = StrongJson({}, single_pass_decode=single_pass_decode)
+    jsoner.register_decoder('Event', lambda d, decoder: d['when']['year'])
+    assert jsoner.from_json(s) == 2020
+
+
+class Account:
+    def __init__(self, owner: User, balance: float, tags: tuple = ()):
+        self.owner = owner
+        self.balance = balance
+        self.tags = tags
+
+    def __eq__(self, other: 'Account'):
+        return self.owner == other.owner and self.balance == other.balance and self.tags == other.tags
+
+
+@pytest.mark.parametrize('simple_object_dump_override', [False, True])
+def test_compile_same_output(simple_object_dump_override):
+    class_map = ClassMapBuilder.build_class_map([User, Account, Color])
+    jsoner_class = ExtraFieldStrongJson if simple_object_dump_override else StrongJson
+    compiled = jsoner_class(class_map).compile()
+    interpreted = jsoner_class(class_map)
+    objs = [
+        Account(User('f', 'l'), 1.5),
+        Account(User('f', 'l'), float('nan'), (Color.RED, 'x')),
+    ]
+    encoded = compiled.to_json_dict(objs)
+    assert encoded == interpreted.to_json_dict(objs)
+    assert compiled.to_json(objs) == interpreted.to_json(objs)
+    assert ('extra' in encoded[0]) == simple_object_dump_override
+    got = compiled.from_json_dict(encoded)
+    assert got[0] == objs[0]
+    assert math.isnan(got[1].balance) and got[1].tags == (Color.RED, 'x')
+
+
+def test_compile_fallback():
+    compiled = StrongJson(ClassMapBuilder.build_class_map([User, Account])).compile()
+    account = Account(User('f', 'l'), 1.5)
+    account.extra = 'not a parameter'
+    assert compiled.to_json_dict(account)['extra'] == 'not a parameter'
+    with pytest.raises(MissingParameterError):
+        compiled.from_json_dict({'__type__': 'Account', 'balance': 1})
+
+
+stream_tests = [
+    {'a': [1, 2.5, None, True], 'b': (1, 'x'), 'c': {1, 2}},
+    [{}, [], (), {User('f', 'l'): [Color.RED, date(2019, 8, 23)]}],
+    Account(User('f', 'l'), float('nan'), (float('inf'),)),
+    np.array([[1, 2], [3, 4]]),
+    'hello',
+]
+
+
+@pytest.mark.parametrize('obj', stream_tests)
+@pytest.mark.parametrize('kwd', [{}, {'indent': 2}, {'sort_keys': True, 'separators': (',', ':')}])
+def test_iter_encode_same_as_to_json(obj, kwd):
+    for jsoner in [StrongJson({}), StrongJson({}, treat_dict_as_ordered_dict=False),
+                   StrongJson(ClassMapBuilder.build_class_map([User, Account])).compile()]:
+        assert ''.join(jsoner.iter_encode(obj, **kwd)) == jsoner.to_json(obj, **kwd)
+
+
+@pytest.mark.parametrize('kwd', [{}, {'indent': 2}, {'sort_keys': True}])
+def test_iter_encode_compact(kwd):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User]), wire_format=2)
+    plain = [1, {'a': (2, 'b')}, {3: None}]
+    assert ''.join(jsoner.iter_encode(plain, **kwd)) == jsoner.to_json(plain, **kwd)  # no tag table
+    obj = [User('f', 'l'), {'a': User('g', 'm')}]
+    s = ''.join(jsoner.iter_encode(obj, **kwd))
+    assert jsoner.from_json(s) == obj
+    if kwd.get('sort_keys'):
+        assert s == jsoner.to_json(obj, **kwd)
+    else:  # the tag table is filled as the payload is written
+        assert list(json.loads(s, object_pairs_hook=OrderedDict)) == ['@v', '_', '~']
+
+
+def test_dump():
+    import io
+    obj = {'users': [User('f', str(i)) for i in range(10000)]}
+    fp = io.StringIO()
+    strong_json.dump(obj, fp, indent=1)
+    assert fp.getvalue() == strong_json.to_json(obj, indent=1)
+
+
+class ExtraFieldStrongJson(StrongJson):
+    def simple_object_dump(self, v):
+        return dict(super().simple_object_dump(v), extra=1)
+
+
+def test_iter_encode_simple_object_dump_override():
+    jsoner = ExtraFieldStrongJson({})
+    obj = [User('f', 'l'), SimpleClass('x')]
+    assert ''.join(jsoner.iter_encode(obj)) == jsoner.to_json(obj)
+    assert [x['extra'] for x in json.loads(jsoner.to_json(obj))] == [1, 1]
+
+
+@pytest.mark.parametrize('test_input, expected', all_decoder_tests + [
+    (
+        {'__type__': 'Account', 'owner': {'__type__': 'User', 'first_name': 'f', 'last_name': 'l'},
+         'balance': {'__type__': 'float', '__data__': 'inf'},
+         'tags': {'__type__': 'tuple', '__data__': [{'__type__': 'Color', '__data__': 'RED'}, [{'a': 1}]]}},
+        Account(User('f', 'l'), float('inf'), (Color.RED, [{'a': 1}]))
+    ),
+])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_single_pass_decode(test_input, expected, compiled):
+    class_map = ClassMapBuilder.build_class_map([Color, Food, User, Account])
+    jsoner = StrongJson(class_map=class_map, single_pass_decode=True)
+    if compiled:
+        jsoner.compile()
+    import json
+    got = jsoner.from_json(json.dumps(test_input))
+    assert got == expected
+
+
+def test_single_pass_decode_numpy_pandas():
+    from numpy.testing import assert_array_equal
+    jsoner = StrongJson(class_map={}, single_pass_decode=True)
+    obj = {'a': np.array([[1, 2], [3, 4]]), 'b': pd.DataFrame({'a': [1, 2], 'b': [3, 4]})}
+    got = jsoner.from_json(jsoner.to_json(obj))
+    assert_array_equal(got['a'], obj['a'])
+    assert got['b'].equals(obj['b'])
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_from_json_iter(single_pass_decode, chunk_size):
+    import io
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account, Color]),
+                        single_pass_decode=single_pass_decode)
+    objs = [Account(User('f', str(i)), i * 1.5, (Color.RED, 'ü')) for i in range(50)] + \
+           [123, 'x', None, [], {'a': 1}, 45.5]
+    s = jsoner.to_json(objs, indent=1)
+    assert list(jsoner.from_json_iter(io.StringIO(s), chunk_size=chunk_size)) == objs
+    assert list(jsoner.from_json_iter(io.BytesIO(s.encode()), chunk_size=chunk_size)) == objs
+    assert list(jsoner.from_json_iter(io.StringIO(' [ ] '), chunk_size=chunk_size)) == []
+    shared = [1]
+    s = '[{"__ref__": 1}, %s]' % StrongJson({}, share_references=True).to_json([shared, shared])
+    got = list(jsoner.from_json_iter(io.StringIO(s), chunk_size=chunk_size))
+    assert got == jsoner.from_json(s) == [{'__ref__': 1}, [[1], [1]]]
+    assert got[1][0] is got[1][1]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3])
+def test_from_json_iter_float(chunk_size):
+    import io
+    objs = [i + 0.125 for i in range(20)] + [1e5, -2.5e-3, 7]
+    s = json.dumps(objs)
+    assert list(strong_json.from_json_iter(io.StringIO(s), chunk_size=chunk_size)) == objs
+    assert list(strong_json.from_json_iter(io.StringIO(s.replace(', ', ' ,')), chunk_size=chunk_size)) == objs
+
+
+def test_from_json_iter_retry():
+    from strong_json import _ArrayStreamParser
+    parser = _ArrayStreamParser(json.JSONDecoder().raw_decode)
+    assert parser.feed('[' + '1, ' * 1000 + '"abcd') == [1] * 1000
+    assert parser.feed('ef') == []  # waits for twice the partial element, not twice the whole input
+    assert parser.feed('gh", [2], 3') == ['abcdefgh', [2]]
+
+
+@pytest.mark.parametrize('s', ['', '{}', '[1, 2', '[1 2]', '[1, 2] 3', '[1, tru]'])
+def test_from_json_iter_error(s):
+    import io
+    import json
+    with pytest.raises(json.JSONDecodeError):
+        list(strong_json.from_json_iter(io.StringIO(s), chunk_size=2))
+
+
+def test_pickle():
+    import pickle
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account]), single_pass_decode=True).compile()
+    got = pickle.loads(pickle.dumps(jsoner))
+    assert got.class_map == jsoner.class_map and got.single_pass_decode
+    obj = Account(User('f', 'l'), 1.0)
+    assert got.to_json(obj) == jsoner.to_json(obj)
+    assert User in got._compiled_decoders
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_json_lines(tmp_path, workers, on_disk):
+    import io
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account, Color]))
+    objs = [Account(User('f', str(i)), i * 1.5, (Color.RED, 'ü')) for i in range(100)] + [1, 'x', None]
+    if on_disk:
+        path = tmp_path / 'data.jsonl'
+        with open(path, 'w', encoding='utf-8') as fp:
+            jsoner.dump_lines(objs, fp)
+        fp = open(path, 'rb')
+    else:
+        fp = io.StringIO()
+        jsoner.dump_lines(objs, fp)
+        fp.seek(0)
+    with fp:
+        assert jsoner.load_lines(fp, workers=workers) == objs
+        fp.seek(0)
+        assert list(jsoner.load_lines(fp, workers=workers, iterator=True)) == objs
+        assert fp.read() in ('', b'')
+        fp.seek(0)
+        assert fp.readline()
+        assert jsoner.load_lines(fp, workers=workers) == objs[1:]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_json_lines_after_next(tmp_path, workers):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User]))
+    path = tmp_path / 'data.jsonl'
+    with open(path, 'w', encoding='utf-8') as fp:
+        jsoner.dump_lines([User('f', str(i)) for i in range(10)], fp)
+    with open(path, encoding='utf-8') as fp:
+        next(fp)  # tell() is disabled on this text file until the next seek
+        assert jsoner.load_lines(fp, workers=workers) == [User('f', str(i)) for i in range(1, 10)]
+        assert fp.read() == ''
+
+
+@pytest.mark.parametrize('arr', [
+    np.arange(12, dtype='>i4').reshape(3, 4),
+    np.asfortranarray(np.arange(6, dtype=np.float32).reshape(2, 3)),
+    np.arange(12)[::2],
+    np.zeros((0, 3), dtype=np.complex128),
+    np.array(3.5),
+    np.array([True, False]),
+    np.array(['2019-08-23', 'NaT'], dtype='datetime64[ns]'),
+    np.array([(1, [1.5, 2.5])], dtype=[('a', '<i4'), ('b', '>f8', (2,))]),
+])
+def test_binary_ndarray(arr):
+    jsoner = StrongJson({}, binary_ndarray=True)
+    encoded = jsoner.to_json_dict(arr)
+    assert set(encoded) == {'__type__', 'dtype', 'shape', 'order', 'b64'}
+    got = jsoner.from_json(jsoner.to_json(arr))
+    assert got.dtype == arr.dtype and got.shape == arr.shape
+    assert got.tobytes() == arr.tobytes()
+    assert got.flags.writeable
+    # default decoder understands it too
+    assert strong_json.from_json_dict(encoded).tobytes() == arr.tobytes()
+
+
+def test_binary_ndarray_object_dtype():
+    jsoner = StrongJson({}, binary_ndarray=True)
+    arr = np.array([1, 'a'], dtype=object)
+    assert jsoner.to_json_dict(arr) == {'__type__': 'numpy.ndarray', '__data__': [1, 'a']}
+
+
+columnar_dataframes = [
+    pd.DataFrame({'a': [1, 2], 'b': [3.5, float('nan')], 'c': ['x', None]}),
+    pd.DataFrame({'t': pd.to_datetime(['2019-08-23', '2019-08-24']), 'n': pd.array([1, None], dtype='Int64'),
+                  'k': pd.Categorical(['u', 'v'])}, index=pd.Index(['p', 'q'], name='key')),
+    pd.DataFrame([[1, 2], [3, 4]], columns=[('a', 1), ('a', 2)], index=[10, 20]),
+    pd.DataFrame({'a': [True, False], 1: [date(2019, 8, 23), User('f', 'l')]}, index=pd.RangeIndex(5, 9, 2)),
+    pd.DataFrame({'a': [1, 2]}, index=pd.MultiIndex.from_tuples([('x', 1), ('y', 2)], names=['s', 'n'])),
+    pd.DataFrame({'c': pd.Categorical(['b', 'a'], categories=['b', 'a', 'z'], ordered=True),
+                  'n': pd.Categorical([3, 1], categories=[3, 2, 1])},
+                 index=pd.CategoricalIndex(['y', 'x'], categories=['y', 'x'])),
+    pd.DataFrame({'d': pd.to_timedelta([1, None], unit='s'), 'ms': pd.to_timedelta([1.5, 2], unit='ms'),
+                  's': np.array(['2019-08-23T01:02:03', 'NaT'], dtype='datetime64[s]')},
+                 index=pd.date_range('2019-08-23', periods=2, freq='D', name='day')),
+    pd.DataFrame({'a': [1, 2]}, index=pd.timedelta_range('1s', periods=2, freq='2s')),
+    # nanoseconds and the second 01:30 of the DST change (-05:00) survive
+    pd.DataFrame({'t': pd.to_datetime(['2020-11-01 01:30:00.000000000', '2020-11-01 01:30:00.000000000',
+                                       '2020-01-01 00:00:00.000000001', None])
+                  .tz_localize('US/Eastern', ambiguous=[True, False, False, False]),
+                  'u': pd.to_datetime(['2020-01-01', None, '2020-01-02', '2020-01-03'], utc=True)},
+                 index=pd.date_range('2020-11-01', periods=4, freq='h', tz='US/Eastern', name='hour')),
+    pd.DataFrame(),
+]
+
+
+@pytest.mark.parametrize('df', columnar_dataframes)
+@pytest.mark.parametrize('binary_ndarray', [False, True])
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_columnar_dataframe(df, binary_ndarray, single_pass_decode):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User]), binary_ndarray=binary_ndarray,
+                        columnar_dataframe=True, single_pass_decode=single_pass_decode)
+    got = jsoner.from_json(jsoner.to_json(df))
+    pd.testing.assert_frame_equal(got, df)
+    assert getattr(got.index, 'freq', None) == getattr(df.index, 'freq', None)
+
+
+class Snapshot:
+    def __init__(self, name: str, weights: np.ndarray, bias: np.ndarray):
+        self.name = name
+        self.weights = weights
+        self.bias = bias
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_snapshot(tmp_path, single_pass_decode):
+    from numpy.testing import assert_array_equal
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Snapshot]), single_pass_decode=single_pass_decode)
+    snapshot = Snapshot('model', np.asfortranarray(np.random.rand(300, 200)), np.arange(3))
+    path = str(tmp_path / 'model.json')
+    jsoner.dump_snapshot(snapshot, path, threshold=1000)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['model.json', 'model.json.0.npy']
+    got = jsoner.load_snapshot(path)
+    assert isinstance(got.weights, np.memmap) and not got.weights.flags.writeable
+    assert_array_equal(got.weights, snapshot.weights)
+    assert_array_equal(got.bias, snapshot.bias)
+    with pytest.raises(StrongJsonError):
+        with open(path) as fp:
+            jsoner.from_json(fp.read())
+
+
+def test_snapshot_removes_unused_files(tmp_path):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Snapshot]))
+    path = str(tmp_path / 'model.json')
+    (tmp_path / 'model.json.backup.npy').write_bytes(b'')  # not ours
+    (tmp_path / 'other.json.5.npy').write_bytes(b'')
+    jsoner.dump_snapshot([np.zeros(1000), np.ones(1000), np.zeros(2000)], path, threshold=1000)
+    jsoner.dump_snapshot([np.ones(1000)], path, threshold=1000)
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ['model.json', 'model.json.0.npy', 'model.json.backup.npy', 'other.json.5.npy']
+    assert jsoner.load_snapshot(path)[0].tolist() == [1.0] * 1000
+
+
+def test_snapshot_overwrite_loaded(tmp_path):
+    from numpy.testing import assert_array_equal
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Snapshot]))
+    path = str(tmp_path / 'model.json')
+    weights = np.random.rand(300, 200)
+    jsoner.dump_snapshot(Snapshot('model', weights, np.arange(300)), path, threshold=1000)
+    old = jsoner.load_snapshot(path)
+    jsoner.dump_snapshot(Snapshot('model', old.weights[:10] + 1, old.bias), path, threshold=1000)
+    assert_array_equal(old.weights, weights)  # still mapped to the replaced file
+    got = jsoner.load_snapshot(path)
+    assert_array_equal(got.weights, weights[:10] + 1)
+    assert_array_equal(got.bias, np.arange(300))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['model.json', 'model.json.0.npy', 'model.json.1.npy']
+
+    class Broken:
+        pass
+
+    jsoner.register_encoder(Broken, lambda v, encoder: 1 / 0)
+    with pytest.raises(ZeroDivisionError):  # after the weights are saved
+        jsoner.dump_snapshot(Snapshot('model', np.zeros((300, 200)), Broken()), path, threshold=1000)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['model.json', 'model.json.0.npy', 'model.json.1.npy']
+    assert_array_equal(jsoner.load_snapshot(path).weights, weights[:10] + 1)
+
+
+backends = [name for name in ['json', 'orjson'] if get_backend(name).available()]
+roundtrip_tests = [test_input for test_input, _ in all_encoder_tests
+                   if not isinstance(test_input, (float, np.ndarray, SimpleClass))] + [
+    {'ü': [1, 2 ** 70 + 1, -0.5, 1e16], 'b': (None, True)},
+    Account(User('f', 'l'), 1.5, (Color.RED,)),
+] + [[n] for n in [-2 ** 63 - 1, -2 ** 63, 2 ** 63 - 1, 2 ** 64 - 1, 2 ** 64]]  # just in and outside int64/uint64
+
+
+@pytest.mark.parametrize('obj', roundtrip_tests)
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('kwd', [{}, {'indent': 2}, {'sort_keys': True}, {'indent': 4}])
+def test_backend_roundtrip_parity(obj, backend, kwd):
+    class_map = ClassMapBuilder.build_class_map([Color, Food, User, Account])
+    reference = StrongJson(class_map)
+    jsoner = StrongJson(class_map, backend=backend)
+    s = jsoner.to_json(obj, **kwd)
+    assert jsoner.from_json(s) == reference.from_json(s) == obj
+    assert jsoner.from_json(User('f', 'l').to_json(jsoner, **kwd)) == User('f', 'l')
+
+
+@pytest.mark.parametrize('backend', backends)
+def test_backend_same_document(backend):
+    obj = [{'ü': [1, 2 ** 70, -0.5, 'x' * 3]}, (None, True, 0.1 + 0.2), {User('f', 'l'): date(2019, 8, 23)},
+           [1e-07, 1.5e-05, 1e-4, 1e15, 1e16, -1.2345e300, 5e-324, math.nan, math.inf]]
+    # raw nan and inf don't come out of to_json_dict
+    tree = [None, 1e-07, 1.5e-05, 1e16, math.nan, -math.inf, {'a': [math.inf]}, 'null 1e5 0.00001']
+    jsoner = StrongJson({}, backend=backend)
+    for kwd in [{}, {'separators': (',', ':'), 'ensure_ascii': False},
+                {'indent': 2, 'ensure_ascii': False, 'sort_keys': True}, {'ensure_ascii': True},
+                {'ensure_ascii': False}, {'indent': 2}, {'indent': 4}, {'separators': (',', ':')}]:
+        assert jsoner.to_json(obj, **kwd) == strong_json.to_json(obj, **kwd)
+        assert jsoner.to_json(obj[1:], **kwd) == strong_json.to_json(obj[1:], **kwd)  # without int over 64 bits
+        assert get_backend(backend).dumps(tree, **kwd) == json.dumps(tree, **kwd)
+        assert get_backend(backend).dumps(tree[-1:], **kwd) == json.dumps(tree[-1:], **kwd)
+    assert jsoner.to_json(obj, separators=(', ', ': ')) == strong_json.to_json(obj)
+
+
+@pytest.mark.parametrize('backend', backends)
+def test_backend_same_tree(backend):
+    for s in ['[1e19, -9.3e18, 9.2e18, 1e300, 12345678901234567890.5]', '{"a": [[2e19], {"b": 2}]}', '1e19',
+              '[18446744073709551616, 9223372036854775808, -9223372036854775809, 1.5]', '[{"a": ["b", 2 ]}]',
+              '{"a": [1, [-100000000000000000000]]}', '18446744073709551616', '"1e19"', '[NaN, -Infinity]']:
+        tree = get_backend(backend).loads(s)
+        assert tree == json.loads(s)
+        assert json.dumps(tree) == json.dumps(json.loads(s))  # same int and float types
+
+
+def test_unknown_backend():
+    with pytest.raises(StrongJsonError):
+        StrongJson({}, backend='nope')
+
+
+def test_custom_backend():
+    class CountingBackend(JsonBackend):
+        calls = []
+
+        def dumps(self, obj, **kwd):
+            self.calls.append('dumps')
+            return super().dumps(obj, **kwd)
+
+        def loads(self, s, **kwd):
+            self.calls.append('loads')
+            return super().loads(s, **kwd)
+
+    jsoner = StrongJson({}, backend=CountingBackend())
+    assert jsoner.from_json(jsoner.to_json((1, 2))) == (1, 2)
+    assert CountingBackend.calls == ['dumps', 'loads']
+
+
+@pytest.mark.parametrize('obj', roundtrip_tests + [{'a': {1: [date(2019, 8, 23), {'b': None}]}},
+                                                   {'x': {'__type__': 'tuple', '__data__': [1, 2]}}])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_compact_roundtrip(obj, treat_dict_as_ordered_dict, single_pass_decode):
+    class_map = ClassMapBuilder.build_class_map([Color, Food, User, Account])
+    reader = StrongJson(class_map, single_pass_decode=single_pass_decode)
+    for writer in [StrongJson(class_map, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict, wire_format=2),
+                   StrongJson(class_map, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict,
+                              wire_format=2).compile(),
+                   StrongJson(class_map, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict,
+                              wire_format=2, single_pass_decode=single_pass_decode)]:
+        s = writer.to_json(obj)
+        assert reader.from_json(s) == writer.from_json(s) == obj
+        assert reader.from_json(''.join(writer.iter_encode(obj, sort_keys=True))) == obj
+
+
+def test_compact_document():
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Color, User]), wire_format=2)
+    obj = [{1: date(2019, 8, 23)}, (User('f', 'l'), User('a', 'b')), Color.RED, datetime(2019, 8, 23, 1, 2, 3)]
+    assert json.loads(jsoner.to_json(obj)) == {
+        '@v': 2,
+        '_': [{'@': 'd', '_': [1, {'@': 'D', '_': [2019, 8, 23]}]},
+              {'@': 't', '_': [{'@': 0, 'first_name': 'f', 'last_name': 'l'},
+                               {'@': 0, 'first_name': 'a', 'last_name': 'b'}]},
+              {'@': 1, '_': 'RED'},
+              {'@': 'T', '_': [2019, 8, 23, 1, 2, 3, 0]}],
+        '~': ['User', 'Color'],
+    }
+    assert len(jsoner.to_json(obj)) < len(strong_json.to_json(obj)) * 2 / 3
+    assert jsoner.to_json({'a': 1}) == '{"@v": 2, "_": {"@": "d", "_": ["a", 1]}}'
+    assert User('f', 'l').to_json(jsoner) == jsoner.to_json(User('f', 'l'))
+
+
+class ReadmeUser(ToJsonable):
+    """The custom encoder example of the README, with its hard coded type key."""
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+
+    def __eq__(self, other):
+        return type(other) is ReadmeUser and vars(self) == vars(other)
+
+    def to_json_dict(self, encoder: StrongJson) -> Dict[str, JSONPrimitive]:
+        return {
+            '__type__': 'ReadmeUser',
+            'first': encoder.to_json_dict(self.first),
+            'last': encoder.to_json_dict(self.last),
+            'full_name': encoder.to_json_dict(f"{self.first} {self.last}")
+        }
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_compact_hard_coded_type_key(single_pass_decode):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([ReadmeUser]), wire_format=2,
+                        single_pass_decode=single_pass_decode)
+    obj = [ReadmeUser('a', 'b'), (ReadmeUser('c', 'd'),), {'__type__': 'ReadmeUser'}]
+    s = jsoner.to_json(obj)
+    assert json.loads(s)['_'][0] == {'@': 0, 'first': 'a', 'last': 'b', 'full_name': 'a b'}
+    assert jsoner.from_json(s) == obj
+    assert jsoner.from_json(''.join(jsoner.iter_encode(obj))) == obj
+
+
+@pytest.mark.parametrize('d', [
+    {'@v': 1, '_': []},
+    {'@v': 2, '_': {'@': 5, '_': 'RED'}, '~': ['Color']},
+])
+def test_compact_document_error(d):
+    with pytest.raises(StrongJsonError):
+        strong_json.from_json(json.dumps(d))
+
+
+def test_compact_plain_dict():
+    jsoner = StrongJson({}, treat_dict_as_ordered_dict=False, wire_format=2)
+    obj = [{'a': 1}, {'@': 1}, {'@v': 2, '_': 3}, OrderedDict(b=1)]
+    assert json.loads(jsoner.to_json(obj))['_'][:3] == [
+        {'a': 1}, {'@': 'd', '_': ['@', 1]}, {'@v': 2, '_': 3}]
+    assert jsoner.from_json(jsoner.to_json(obj)) == obj
+    assert StrongJson({}, treat_dict_as_ordered_dict=False).from_json('{"@v": 2}') == {'@v': 2}
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_single_pass_compact_document(monkeypatch, stream):
+    class_map = ClassMapBuilder.build_class_map([User, Color])
+    jsoner = StrongJson(class_map, treat_dict_as_ordered_dict=False, wire_format=2, single_pass_decode=True)
+    obj = [{'__type__': 'x'}, {'a': {'__type__': 'tuple', '__data__': [1]}}, User('f', 'l'), Color.RED, (1, 2)]
+    s = ''.join(jsoner.iter_encode(obj)) if stream else jsoner.to_json(obj)
+    assert jsoner.from_json(s) == jsoner.from_json(s.encode()) == obj
+    assert jsoner.from_json(jsoner.to_json({'__type__': 'x'})) == {'__type__': 'x'}
+    if not stream:  # the tag table comes first; the document is parsed once, decoding as it goes
+        monkeypatch.setattr(jsoner.backend, 'loads', None)
+        assert jsoner.from_json(s) == obj
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+@pytest.mark.parametrize('stream', [False, True])
+def test_plain_dict_like_compact_document(single_pass_decode, stream):
+    jsoner = StrongJson({}, treat_dict_as_ordered_dict=False, single_pass_decode=single_pass_decode)
+    for obj in [{'@v': 2, '_': 3}, {'@v': 1, '_': 'x'}, [{'@v': 2, '_': 3}], {'a': {'@v': 1, '_': 'x'}}]:
+        s = ''.join(jsoner.iter_encode(obj)) if stream else jsoner.to_json(obj)
+        assert jsoner.from_json(s) == obj
+        assert jsoner.from_json_lazy(s) == obj
+        assert jsoner.from_bytes(jsoner.to_bytes(obj)) == obj
+    # nested dicts are never read as a document
+    assert jsoner.from_json('[{"@v": 2, "_": 3}]') == [{'@v': 2, '_': 3}]
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+def test_shared_references_plain_dict_like_reference(wire_format, treat_dict_as_ordered_dict):
+    jsoner = StrongJson({}, wire_format=wire_format, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict,
+                        share_references=True)
+    shared = [1]
+    obj = [shared, shared, {'__ref__': 0}, {'@r': 0}, {'__id__': 1, 'a': 2}, {'@i': 1}]
+    got = jsoner.from_json(jsoner.to_json(obj))
+    assert got == obj and got[0] is got[1]
+
+
+def test_custom_type_key_object():
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account]), type_key='kind')
+    obj = Account(User('f', 'l'), 1.0)
+    assert jsoner.to_json_dict(obj)['kind'] == 'Account'
+    assert jsoner.from_json(jsoner.to_json(obj)) == obj
+    assert jsoner.compile().from_json(jsoner.to_json(obj)) == obj
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_share_references(wire_format, single_pass_decode, compiled):
+    class_map = ClassMapBuilder.build_class_map([Color, User, Account])
+    jsoner = StrongJson(class_map, wire_format=wire_format, share_references=True,
+                        single_pass_decode=single_pass_decode)
+    if compiled:
+        jsoner.compile()
+    owner = User('f', 'l')
+    tags = [Color.RED, date(2019, 8, 23)] * 5
+    records = [Account(owner, float(i), (tags, {'tags': tags})) for i in range(100)]
+    s = jsoner.to_json(records)
+    assert len(s) < len(StrongJson(class_map, wire_format=wire_format).to_json(records)) / 2
+    assert ''.join(jsoner.iter_encode(records)) == s
+    got = jsoner.from_json(s)
+    assert got == records
+    assert all(r.owner is got[0].owner and r.tags[0] is r.tags[1]['tags'] is got[0].tags[0] for r in got)
+    # nothing shared: same document as without share_references
+    assert jsoner.to_json([owner, tags]) == StrongJson(class_map, wire_format=wire_format).to_json([owner, tags])
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+def test_share_references_cycle(wire_format):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account]),
+                        treat_dict_as_ordered_dict=False, wire_format=wire_format, share_references=True)
+    loop = []
+    loop.append(loop)
+    d = {'a': 1}
+    d['d'] = d
+    account = Account(None, 1.0)
+    account.owner = account
+    got = jsoner.from_json(jsoner.to_json([loop, d, account]))
+    assert got[0][0] is got[0]
+    assert got[1]['d'] is got[1] and got[1]['a'] == 1
+    assert got[2].owner is got[2] and got[2].balance == 1.0
+    got = jsoner.from_json(jsoner.to_json(loop))
+    assert got[0] is got
+
+
+def test_share_references_immutable_cycle():
+    jsoner = StrongJson({}, share_references=True)
+    t = ([],)
+    t[0].append(t)
+    with pytest.raises(StrongJsonError):
+        jsoner.from_json(jsoner.to_json(t))
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_intern(wire_format, treat_dict_as_ordered_dict, compiled):
+    class_map = ClassMapBuilder.build_class_map([User])
+    writer = StrongJson(class_map, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict, wire_format=wire_format)
+    jsoner = StrongJson(class_map, intern_keys=True, intern_values=5, single_pass_decode=True)
+    if compiled:
+        jsoner.compile()
+    docs = [writer.to_json({''.join(['st', 'atus']): [User('ok', 'x' * 6), ''.join(['o', 'k'])]}) for _ in range(2)]
+    a, b = [jsoner.from_json(s) for s in docs]
+    assert a == b == {'status': [User('ok', 'x' * 6), 'ok']}
+    assert next(iter(a)) is next(iter(b))
+    assert a['status'][0].first_name is b['status'][0].first_name is a['status'][1] is b['status'][1]
+    assert a['status'][0].last_name is not b['status'][0].last_name
+    plain = StrongJson(class_map).from_json(docs[0])
+    assert plain['status'][1] is not a['status'][1]
+
+
+def test_intern_table_is_bounded(monkeypatch):
+    import strong_json
+    monkeypatch.setattr(strong_json, '_INTERN_TABLE_SIZE', 3)
+    jsoner = StrongJson({}, intern_values=10)
+    assert jsoner.from_json(json.dumps([f's{i}' for i in range(10)])) == [f's{i}' for i in range(10)]
+    assert jsoner.from_json('["s0"]')[0] is jsoner.from_json('["s0"]')[0]
+    assert jsoner.from_json('["s5"]')[0] is not jsoner.from_json('["s5"]')[0]
+
+
+class Point(NamedTuple):
+    x: int
+    y: float = 0.0
+
+
+class Slotted:
+    __slots__ = ('name', '__secret')
+
+    def __init__(self, name: str, _Slotted__secret: tuple = ()):
+        self.name = name
+        self.__secret = _Slotted__secret
+
+    def __eq__(self, other: 'Slotted'):
+        return self.name == other.name and self.__secret == other.__secret
+
+
+class SlottedChild(Slotted):
+    __slots__ = 'extra'
+
+    def __init__(self, name: str, extra: Point, _Slotted__secret: tuple = ()):
+        super().__init__(name, _Slotted__secret)
+        self.extra = extra
+
+    def __eq__(self, other: 'SlottedChild'):
+        return super().__eq__(other) and self.extra == other.extra
+
+
+if dataclasses is not None:
+    @dataclasses.dataclass
+    class Record:
+        point: Point
+        tags: list = dataclasses.field(default_factory=list)
+        count: int = dataclasses.field(default=0, init=False)
+    record_classes = [Record]
+else:  # pragma: no cover
+    Record = None  # cases using it are skipped
+    record_classes = []
+
+
+record_tests = [
+    (Point(1, 2.5), {'__type__': 'Point', 'x': 1, 'y': 2.5}),
+    (Slotted('a', (1,)), {'__type__': 'Slotted', 'name': 'a',
+                          '_Slotted__secret': {'__type__': 'tuple', '__data__': [1]}}),
+    (SlottedChild('a', Point(1)), {'__type__': 'SlottedChild', 'name': 'a',
+                                   '_Slotted__secret': {'__type__': 'tuple', '__data__': []},
+                                   'extra': {'__type__': 'Point', 'x': 1, 'y': 0.0}}),
+    pytest.param(Record and Record(Point(1), [Point(2)]),
+                 {'__type__': 'Record', 'point': {'__type__': 'Point', 'x': 1, 'y': 0.0},
+                  'tags': [{'__type__': 'Point', 'x': 2, 'y': 0.0}]}, marks=needs_dataclasses),
+]
+
+
+@pytest.mark.parametrize('obj, expected', record_tests)
+@pytest.mark.parametrize('compiled', [False, True])
+def test_record_types(obj, expected, compiled):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Point, Slotted, SlottedChild] + record_classes))
+    if compiled:
+        jsoner.compile()
+    assert jsoner.to_json_dict(obj) == expected
+    assert ''.join(jsoner.iter_encode(obj)) == jsoner.to_json(obj)
+    assert jsoner.from_json(jsoner.to_json(obj)) == obj
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('kwd', [{}, {'wire_format': 2}, {'share_references': True}])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_named_tuple_not_in_class_map(kwd, compiled):
+    Pt = namedtuple('Pt', 'x y')
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Point]), **kwd)
+    if compiled:
+        jsoner.compile()
+    obj = [Pt(1, 2), {'p': Pt('a', [Pt(3, 4)])}, Point(1)]
+    s = jsoner.to_json(obj)
+    expected = [(1, 2), {'p': ('a', [(3, 4)])}, Point(1)]
+    assert jsoner.from_json(s) == jsoner.from_json(''.join(jsoner.iter_encode(obj))) == expected
+    assert type(jsoner.from_json(s)[2]) is Point
+    assert StrongJson({}).to_json_dict(Pt(1, 2)) == {'__type__': 'tuple', '__data__': [1, 2]}
+
+
+def test_unset_slot():
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Slotted])).compile()
+    obj = Slotted.__new__(Slotted)
+    obj.name = 'a'
+    assert jsoner.to_json_dict(obj) == {'__type__': 'Slotted', 'name': 'a'}
+    assert jsoner.from_json(jsoner.to_json(obj)) == Slotted('a')
+
+
+class Interned:
+    instances = {}
+
+    def __new__(cls, name: str):
+        return cls.instances.setdefault(name, super().__new__(cls))
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+@needs_dataclasses
+@pytest.mark.parametrize('wire_format', [1, 2])
+def test_shared_record_types(wire_format):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Point, Slotted, Record, Interned]),
+                        wire_format=wire_format, share_references=True)
+    p, slotted, record, interned = Point(1), Slotted('a', (1,)), Record(Point(2), []), Interned('i')
+    got = jsoner.from_json(jsoner.to_json([p, p, slotted, slotted, record, record, interned, interned]))
+    assert got == [p, p, slotted, slotted, record, record, interned, interned]
+    assert got[0] is got[1] and got[2] is got[3] and got[4] is got[5] and got[6] is interned
+
+
+class Node:
+    def __init__(self, value: int, next: 'Node' = None):
+        self.value = value
+        self.next = next
+
+
+def make_deep(kind, depth):
+    obj = 0
+    for i in range(depth):
+        obj = {'list': [obj], 'dict': {'k': obj}, 'ordered': OrderedDict([(i, obj)]), 'tuple': (obj,),
+               'node': Node(i, obj)}[kind]
+    return obj
+
+
+def walk_deep(kind, decoded, depth):
+    for _ in range(depth):
+        if kind == 'node':
+            decoded = decoded.next
+        else:
+            decoded = next(iter(decoded.values() if isinstance(decoded, dict) else decoded))
+    return decoded
+
+
+@pytest.mark.parametrize('kind', ['list', 'dict', 'ordered', 'tuple', 'node'])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+def test_deep_structure(kind, treat_dict_as_ordered_dict):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Node]), treat_dict_as_ordered_dict=treat_dict_as_ordered_dict)
+    obj = make_deep(kind, 5000)
+    assert walk_deep(kind, jsoner.from_json_dict(jsoner.to_json_dict(obj)), 5000) == 0
+
+
+@pytest.mark.parametrize('kind', ['list', 'dict', 'ordered', 'tuple', 'node'])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+@pytest.mark.parametrize('wire_format', [1, 2])
+def test_deep_structure_bytes(kind, treat_dict_as_ordered_dict, wire_format):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Node]), wire_format=wire_format,
+                        treat_dict_as_ordered_dict=treat_dict_as_ordered_dict)
+    obj = make_deep(kind, 5000)
+    assert walk_deep(kind, jsoner.from_bytes(jsoner.to_bytes(obj)), 5000) == 0
+
+
+@pytest.mark.parametrize('kind', ['list', 'dict', 'ordered', 'tuple', 'node'])
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_deep_structure_text(kind, wire_format, single_pass_decode):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Node]), wire_format=wire_format,
+                        single_pass_decode=single_pass_decode, backend='auto')
+    obj = make_deep(kind, 5000)
+    kwd = {'separators': (',', ':'), 'ensure_ascii': False}  # orjson if installed; it falls back to json
+    s = jsoner.to_json(obj, **kwd)
+    assert s == StrongJson(ClassMapBuilder.build_class_map([Node]), wire_format=wire_format).to_json(obj, **kwd)
+    for text in [s, s.encode(), ''.join(jsoner.iter_encode(obj, **kwd))]:
+        assert walk_deep(kind, jsoner.from_json(text), 5000) == 0
+
+
+def make_cycle(kind):
+    if kind == 'list':
+        obj = [1]
+        obj.append([obj])
+    elif kind == 'dict':
+        obj = {'a': 1}
+        obj['b'] = {'c': obj}
+    elif kind == 'tuple':
+        inner = [1]
+        obj = (inner,)
+        inner.append(obj)
+    else:
+        obj = Node(1)
+        obj.next = Node(2, obj)
+    return obj
+
+
+@pytest.mark.parametrize('kind', ['list', 'dict', 'tuple', 'node'])
+@pytest.mark.parametrize('wire_format', [1, 2])
+def test_cycle_raises(kind, wire_format):
+    import io
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Node]), wire_format=wire_format)
+    obj = make_cycle(kind)
+    for encode in [jsoner.to_json_dict, jsoner.to_json, jsoner.to_bytes, lambda v: jsoner.dump(v, io.StringIO())]:
+        with pytest.raises(ValueError, match='Circular reference'):
+            encode(obj)
+    shared = [1]  # the same object twice is not a cycle
+    assert jsoner.from_json(''.join(jsoner.iter_encode([shared, {'a': shared}, shared]))) == \
+        [shared, {'a': shared}, shared]
+
+
+def test_cycle_raises_in_writers():
+    from strong_json import _binary_dumps, _iter_json
+    for kind in ['list', 'dict']:
+        for write in [_binary_dumps, lambda v: ''.join(_iter_json(v))]:
+            with pytest.raises(ValueError, match='Circular reference'):
+                write(make_cycle(kind))
+
+
+def test_backend_deep_document():
+    tree = make_deep('dict', 2000)  # str key dicts are json friendly as they are
+    backend = get_backend('json')
+    for kwd in [{'indent': 1, 'sort_keys': True}, {'ensure_ascii': False}]:
+        s = backend.dumps(tree, **kwd)
+        assert walk_deep('dict', backend.loads(s), 2000) == 0
+        assert walk_deep('dict', backend.loads(s, object_pairs_hook=OrderedDict), 2000) == 0
+
+
+class RecursiveStrongJson(StrongJson):
+    """Overriding the hooks takes the per-node recursive path."""
+
+    def default_to_json_dict(self, v: Any) -> JSONPrimitive:
+        return super().default_to_json_dict(v)
+
+    def default_from_json_dict(self, d: JSONPrimitive) -> Any:
+        return super().default_from_json_dict(d)
+
+
+@needs_dataclasses
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+def test_iterative_matches_recursive(wire_format, treat_dict_as_ordered_dict):
+    kwd = dict(wire_format=wire_format, treat_dict_as_ordered_dict=treat_dict_as_ordered_dict, intern_keys=True)
+    class_map = ClassMapBuilder.build_class_map([User, SimpleClass, Node, Point, Record, Color])
+    obj = {'a': [User('a', 'b'), (1, 2.5, Color.RED), {3, 4}], 'b': OrderedDict([('x', Node(1, Node(2)))]),
+           'c': {1: Record(Point(1), [SimpleClass('m'), date(2020, 1, 2)])}, 'd': {}, 'e': [[], ()]}
+    iterative = StrongJson(class_map, **kwd)
+    recursive = RecursiveStrongJson(class_map, **kwd)
+    assert iterative.to_json(obj) == recursive.to_json(obj)
+    s = iterative.to_json(obj)
+    assert iterative.to_json(iterative.from_json(s)) == recursive.to_json(recursive.from_json(s))
+
+
+def test_iterative_simple_object_dump_override():
+    got = ExtraFieldStrongJson({}).to_json_dict([[User('f', 'l')], (SimpleClass('x'),)])
+    assert got[0][0]['extra'] == got[1]['__data__'][0]['extra'] == 1
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_stats(wire_format, compiled):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Color]), wire_format=wire_format)
+    if compiled:
+        jsoner.compile()
+    obj = [User('a', 'b'), User('c', 'd'), {'x': (Color.RED, date(2020, 1, 2))}, math.nan, 1.5, 'x']
+    expected = jsoner.to_json(obj)
+    with jsoner.collect_stats(StatsCollector(sizes=True)) as stats:
+        assert jsoner.to_json(obj) == expected
+        assert ''.join(jsoner.iter_encode(obj)) == expected
+        decoded = jsoner.from_json(expected)
+    assert jsoner.to_json(decoded) == expected
+    summary = stats.summary()
+    counts = {direction: {k: v['count'] for k, v in d.items()} for direction, d in summary.items()}
+    assert counts['encode'] == {'list': 2, 'User': 4, 'dict': 2, 'tuple': 2, 'Color': 2, 'date': 2, 'float': 2}
+    assert counts['decode'] == {'list': 1, 'User': 2, 'dict': 1, 'tuple': 1, 'Color': 1, 'date': 1, 'float': 1}
+    for d in summary.values():
+        for v in d.values():
+            assert 0 <= v['self_seconds'] <= v['seconds'] and v['size'] > 0
+    # stats off again
+    assert 'to_json_dict' not in jsoner.__dict__ and 'from_json_dict' not in jsoner.__dict__
+    jsoner.to_json(obj)
+    assert stats.summary() == summary
+
+
+def test_stats_constructor():
+    import pickle
+    stats = StatsCollector()
+    jsoner = StrongJson({}, stats=stats, single_pass_decode=True)
+    assert jsoner.from_json(jsoner.to_json({1: [2]})) == {1: [2]}
+    assert set(stats.summary()['decode']) == {'dict', 'list'}
+    assert 'size' not in stats.summary()['encode']['dict']
+    clone = pickle.loads(pickle.dumps(jsoner))
+    clone.to_json([1])
+    assert clone.stats.summary()['encode']['list']['count'] == 2
+    stats.reset()
+    assert stats.summary() == {'encode': {}, 'decode': {}}
+
+
+def _run_async(coro):
+    """asyncio.run for python 3.6."""
+    import asyncio
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def test_async():
+    from concurrent.futures import ThreadPoolExecutor
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account, Color]))
+    objs = [Account(User('f', str(i)), i * 1.5, (Color.RED, 'ü')) for i in range(50)]
+
+    async def run():
+        with ThreadPoolExecutor(1) as executor:
+            s = await jsoner.to_json_async(objs, executor=executor, indent=1)
+            assert s == jsoner.to_json(objs, indent=1)
+            assert await jsoner.from_json_async(s, executor=executor) == objs
+        assert await jsoner.from_json_async(s.encode()) == objs
+
+    _run_async(run())
+
+
+@pytest.mark.parametrize('single_pass_decode', [False, True])
+def test_async_stream(monkeypatch, single_pass_decode):
+    import asyncio
+    import strong_json
+    monkeypatch.setattr(strong_json, '_DUMP_BUFFER_SIZE', 100)
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account, Color]),
+                        single_pass_decode=single_pass_decode)
+    objs = [Account(User('f', str(i)), i * 1.5, (Color.RED, 'ü')) for i in range(50)]
+    received = []
+
+    async def handle(reader, writer):
+        async for obj in jsoner.from_json_aiter(reader, chunk_size=7):
+            received.append(obj)
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        drains = 0
+        drain = writer.drain
+
+        async def counted_drain():
+            nonlocal drains
+            drains += 1
+            await drain()
+        writer.drain = counted_drain
+        await jsoner.dump_async(objs, writer)
+        writer.write_eof()
+        await reader.read()  # server closed its side: everything is parsed
+        writer.close()
+        server.close()
+        assert drains > 10
+
+        reader = asyncio.StreamReader()
+        reader.feed_data(jsoner.to_json(objs).encode())
+        reader.feed_eof()
+        assert await jsoner.load_async(reader) == objs
+
+    _run_async(run())
+    assert received == objs
+
+
+@pytest.mark.parametrize('kwd', [{}, {'separators': (',', ':'), 'sort_keys': True}, {'indent': 1},
+                                 {'backend': 'orjson'}, {'wire_format': 2}, {'treat_dict_as_ordered_dict': False}])
+def test_to_json_parallel(monkeypatch, kwd):
+    import strong_json
+    monkeypatch.setattr(strong_json, '_PARALLEL_THRESHOLD', 8)
+    kwd = dict(kwd)
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Account, Color]),
+                        **{k: kwd.pop(k) for k in ['backend', 'wire_format', 'treat_dict_as_ordered_dict'] if k in kwd})
+    obj = {'a': [Account(User('f', str(i)), i * 1.5, (Color.RED, 'ü')) for i in range(50)],
+           'b': [[i, [Color.Blue] * 10] for i in range(20)], 'c': [1, 2], 'd': {1: list(range(30))}}
+    assert jsoner.to_json(obj, workers=2, **kwd) == jsoner.to_json(obj, **kwd)
+    assert jsoner.to_json(obj['a'], workers=2, **kwd) == jsoner.to_json(obj['a'], **kwd)
+    assert jsoner.to_json([1, 2], workers=2, **kwd) == jsoner.to_json([1, 2], **kwd)
+
+
+class Profile:
+    def __init__(self, user: User, colors: List[Color], since: Optional[date] = None,
+                 visits: Dict[Color, List[datetime]] = None, scores: Dict[int, float] = None,
+                 pair: Tuple[int, str] = (0, ''), tags: Set[str] = None, friend: Optional['Profile'] = None,
+                 extra=None):
+        self.user = user
+        self.colors = colors
+        self.since = since
+        self.visits = visits
+        self.scores = scores
+        self.pair = pair
+        self.tags = tags
+        self.friend = friend
+        self.extra = extra
+
+    def __eq__(self, other: 'Profile'):
+        return type(other) is Profile and vars(self) == vars(other)
+
+
+schema_tests = [
+    (Profile(User('a', 'b'), [Color.RED], since=date(2020, 1, 2),
+             visits={Color.Blue: [datetime(2020, 1, 2, 3, 4, 5)]}, scores={1: 1.5, 2: math.inf}, pair=(1, 'x'),
+             tags={'t'}, friend=Profile(User('c', 'd'), []), extra=(Color.RED, date(2021, 1, 1))),
+     Profile,
+     {'user': {'first_name': 'a', 'last_name': 'b'}, 'colors': ['RED'], 'since': '2020-01-02',
+      'visits': {'Blue': ['2020-01-02T03:04:05']},
+      'scores': {'1': 1.5, '2': {'__type__': 'float', '__data__': 'inf'}}, 'pair': [1, 'x'], 'tags': ['t'],
+      'friend': {'user': {'first_name': 'c', 'last_name': 'd'}, 'colors': [], 'since': None, 'visits': None,
+                 'scores': None, 'pair': [0, ''], 'tags': None, 'friend': None, 'extra': None},
+      'extra': {'__type__': 'tuple', '__data__': [{'__type__': 'Color', '__data__': 'RED'},
+                                                  {'__type__': 'date', 'year': 2021, 'month': 1, 'day': 1}]}}),
+    pytest.param([Record and Record(Point(1), [Point(2)])], List[Record],
+                 [{'point': {'x': 1, 'y': 0.0}, 'tags': [{'__type__': 'Point', 'x': 2, 'y': 0.0}]}],
+                 marks=needs_dataclasses),
+    ({'a': Slotted('n', (1,))}, Dict[str, Slotted],
+     {'a': {'name': 'n', '_Slotted__secret': {'__type__': 'tuple', '__data__': [1]}}}),
+    ([SlottedChild('n', Point(1))], List[Slotted],  # subclass keeps its tag
+     [{'__type__': 'SlottedChild', 'name': 'n', '_Slotted__secret': {'__type__': 'tuple', '__data__': []},
+       'extra': {'__type__': 'Point', 'x': 1, 'y': 0.0}}]),
+    ((1, [2.5]), Tuple[int, ...], [1, [2.5]]),
+    ({1, 2}, FrozenSet[int], [1, 2]),
+    (Color.RED, Any, {'__type__': 'Color', '__data__': 'RED'}),
+    ([Color.RED, None], List[Union[Color, User, None]], [{'__type__': 'Color', '__data__': 'RED'}, None]),
+]
+
+
+@pytest.mark.parametrize('obj, schema, expected', schema_tests)
+def test_schema(obj, schema, expected):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, Color, Profile, Point, Slotted, SlottedChild]
+                                                        + record_classes))
+    s = jsoner.to_json(obj, schema=schema)
+    assert json.loads(s) == expected
+    got = jsoner.from_json(s, target=schema)
+    assert got == (frozenset(obj) if schema == FrozenSet[int] else obj)
+    assert type(got) is type(obj) or schema == FrozenSet[int]
+
+
+class Tagged:
+    def __init__(self, name: str, meta: Any, raw=None):
+        self.name = name
+        self.meta = meta
+        self.raw = raw
+
+    def __eq__(self, other: 'Tagged'):
+        return type(other) is Tagged and vars(self) == vars(other)
+
+
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+def test_schema_any(treat_dict_as_ordered_dict):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Tagged]),
+                        treat_dict_as_ordered_dict=treat_dict_as_ordered_dict)
+    objs = [Tagged('a', {'k': 1}, {'r': [2]}), Tagged('b', Tagged('c', None))]
+    s = jsoner.to_json(objs, schema=List[Tagged])
+    assert json.loads(s)[0]['meta'] == jsoner.to_json_dict({'k': 1})  # tagged like any other value
+    assert jsoner.from_json(s, target=List[Tagged]) == objs
+
+
+def test_schema_missing_parameter():
+    with pytest.raises(MissingParameterError):
+        strong_json.from_json('{"colors": []}', target=Profile)
+
+
+class Counted:
+    created = 0
+
+    def __init__(self, value: Any, child: 'Counted' = None):
+        Counted.created += 1
+        self.value = value
+        self.child = child
+
+    def __eq__(self, other: 'Counted'):
+        return isinstance(other, Counted) and self.value == other.value and self.child == other.child
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+def test_from_json_lazy(wire_format, treat_dict_as_ordered_dict):
+    import copy
+    import pickle
+    from strong_json import materialize
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Counted, Color]), wire_format=wire_format,
+                        treat_dict_as_ordered_dict=treat_dict_as_ordered_dict)
+    obj = {'a': [Counted(i, Counted(-i)) for i in range(10)], 'b': (Counted('t'), Color.RED), 'm': {1: {2, 3}},
+           'arr': np.arange(4), 'df': pd.DataFrame({'x': [1.5]}), 'd': date(2020, 1, 2), 'f': math.inf}
+    s = jsoner.to_json(obj)
+    Counted.created = 0
+    got = jsoner.from_json_lazy(s)
+    assert Counted.created == 0
+    first = got['a'][0]
+    assert type(first) is not Counted and isinstance(first, Counted)
+    assert first.child.value == 0 and Counted.created == 2
+    assert got['a'][1] == Counted(1, Counted(-1)) and Counted.created == 6
+    assert type(materialize(got['a'][2])) is Counted and materialize(3) == 3
+    assert got['b'][1] is Color.RED and got['m'][1] == {2, 3} and got['d'] == date(2020, 1, 2) and got['f'] == math.inf
+    assert (got['arr'] + 1).tolist() == [1, 2, 3, 4] and np.asarray(got['arr']).sum() == 6
+    assert got['df'].shape == (1, 1) and len(got['b'][0].value) == 1
+    assert pickle.loads(pickle.dumps(got['a'][3])) == Counted(3, Counted(-3))
+    assert copy.copy(got['a'][4]).value == 4
+    assert jsoner.to_json(got) == s
+
+
+def test_from_json_lazy_shared_references():
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Counted]), share_references=True)
+    shared = Counted(1)
+    got = jsoner.from_json_lazy(jsoner.to_json([shared, shared]))
+    assert type(got[0]) is Counted and got[0] is got[1]
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('treat_dict_as_ordered_dict', [False, True])
+@pytest.mark.parametrize('share_references', [False, True])
+def test_select(wire_format, treat_dict_as_ordered_dict, share_references):
+    from strong_json import Selector
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([Counted, User, Color]), wire_format=wire_format,
+                        treat_dict_as_ordered_dict=treat_dict_as_ordered_dict, share_references=share_references)
+    shared = Counted('s')
+    obj = {'orders': [Counted(i, Counted((i, Color.RED))) for i in range(5)], 'user': User('f', 'l'),
+           'm': {1: [np.arange(3), shared]}, 'shared': shared}
+    s = jsoner.to_json(obj)
+    selector = Selector(['orders[*].value', 'orders[1].child.value[1]', 'orders[-1].child', 'user.last_name',
+                         'm[1][0].shape', 'm[1][*].value', 'orders[9]', 'nothing.here', 'user[0]', 'orders[0].x'])
+    Counted.created = 0
+    got = jsoner.from_json(s, select=selector)
+    assert got == {'orders[*].value': [0, 1, 2, 3, 4], 'orders[1].child.value[1]': Color.RED,
+                   'orders[-1].child': Counted((4, Color.RED)), 'user.last_name': 'l', 'm[1][0].shape': (3,),
+                   'm[1][*].value': [None, 's'], 'orders[9]': None, 'nothing.here': None, 'user[0]': None,
+                   'orders[0].x': None}
+    if not share_references:
+        assert Counted.created == 2  # orders[-1].child and the one compared against
+    assert jsoner.from_json(s, select=['orders[*].value']) == {'orders[*].value': [0, 1, 2, 3, 4]}
+
+
+@pytest.mark.parametrize('path', ['a..b', 'a[', 'a[x]', '.a', 'a]'])
+def test_select_invalid_path(path):
+    with pytest.raises(StrongJsonError):
+        strong_json.from_json('{}', select=[path])
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('policy', ['lru', 'fifo'])
+def test_encode_cache(wire_format, policy):
+    class_map = ClassMapBuilder.build_class_map([User, Color])
+    jsoner = StrongJson(class_map, wire_format=wire_format, encode_cache=4, encode_cache_policy=policy)
+    plain = StrongJson(class_map, wire_format=wire_format)
+    utc = datetime(2020, 1, 1, 12, tzinfo=timezone.utc)
+    obj = [Color.RED, Color.Blue, Color.RED, date(2020, 1, 2), date(2020, 1, 2), (1, 'a'), (True, 'a'), (1, 'a'),
+           (1, User('a', 'b')), (1.5,), utc, utc.astimezone(timezone(timedelta(hours=7))), tuple(range(9))]
+    for _ in range(3):
+        assert jsoner.to_json(obj) == plain.to_json(obj)
+        assert jsoner.to_json(obj, workers=2) == plain.to_json(obj)
+    info = jsoner.encode_cache_info()
+    assert info['hits'] > 0 and info['size'] == 4 and info['evictions'] > 0 and info['policy'] == policy
+    assert plain.encode_cache_info() == {}
+
+
+def test_encode_cache_float_tuple():
+    jsoner = StrongJson({}, encode_cache=16)
+    obj = [(1.5, 2), (1.5, 2), (1, 2), (1.0, 2), (0.0,), (-0.0,), (math.nan,), (math.inf,), (math.inf,)]
+    assert jsoner.to_json(obj) == strong_json.to_json(obj)
+    assert jsoner.encode_cache_info()['hits'] == 1  # (1.5, 2) only; 1 and 1.0 are different keys
+    assert jsoner.encode_cache_info()['misses'] == 4  # (1.5, 2), (1, 2), (1.0, 2), (0.0,)
+
+
+def test_encode_cache_policy():
+    jsoner = StrongJson({}, encode_cache=2, encode_cache_policy='lru')
+    a, b, c = date(2020, 1, 1), date(2020, 1, 2), date(2020, 1, 3)
+    jsoner.to_json([a, b, a, c, a])  # lru keeps a
+    assert jsoner.encode_cache_info()['hits'] == 2
+    jsoner = StrongJson({}, encode_cache=2, encode_cache_policy='fifo')
+    jsoner.to_json([a, b, a, c, a])  # fifo drops a for c
+    assert jsoner.encode_cache_info()['hits'] == 1
+    with pytest.raises(StrongJsonError):
+        StrongJson({}, encode_cache=2, encode_cache_policy='random')
+
+
+def test_encode_cache_is_not_modified():
+    jsoner = StrongJson({}, encode_cache=10, share_references=True)
+    shared = (1, 2)
+    assert jsoner.to_json([shared, shared]) == StrongJson({}, share_references=True).to_json([shared, shared])
+    assert jsoner.encode_cache_info()['misses'] == 0
+    jsoner = StrongJson({}, encode_cache=10)
+    jsoner.to_json([date(2020, 1, 1)])
+    jsoner.register_encoder(date, lambda v, encoder: v.isoformat())
+    assert jsoner.to_json([date(2020, 1, 1)]) == '["2020-01-01"]'
+
+
+@pytest.mark.parametrize('wire_format', [1, 2])
+def test_encode_cache_deep_tuple(wire_format):
+    jsoner = StrongJson({}, wire_format=wire_format, encode_cache=128)
+    obj = [make_deep('tuple', 5000), (1, 2), (1, 2)]
+    decoded = jsoner.from_json_dict(jsoner.to_json_dict(obj))
+    assert walk_deep('tuple', decoded[0], 5000) == 0 and decoded[1:] == [(1, 2), (1, 2)]
+    assert jsoner.encode_cache_info()['hits'] == 1
+
+
+binary_tests = [test_input for test_input, _ in all_encoder_tests] + [
+    -1, -(1 << 70), 1 << 70, 127, 128, 0.1, True, False, '', 'ü\ud800' * 100, ['a' * 65] * 3, {1: 'a', None: 'b'},
+    OrderedDict([('b', 1), ('a', 2)]), [[]] * 200, Account(User('f', 'l'), 1.5, (Color.RED, 'ü')),
+    [Color.Blue, Color.Blue, date(2019, 8, 23), datetime(2019, 8, 23, 12, 0, 3)],
+]
+
+
+@pytest.mark.parametrize('obj', binary_tests)
+@pytest.mark.parametrize('wire_format', [1, 2])
+@pytest.mark.parametrize('share_references', [False, True])
+def test_to_bytes(obj, wire_format, share_references):
+    jsoner = StrongJson(ClassMapBuilder.build_class_map([User, SimpleClass, Account, Color, Food]),
+                        wire_format=wire_format, share_references=share_references)
+    b = jsoner.to_bytes(obj)
+    assert isinstance(b, bytes)
+    got = jsoner.from_bytes(bytearray(b))
+    assert jsoner.to_json(got) == jsoner.to_json(obj)
+    assert type(got) is type(jsoner.from_json(jsoner.to_json(obj)))
+
+
+@pytest.mark.parametrize('arr', [
+    np.arange(12, dtype='>i4').reshape(3, 4),
+    np.asfortranarray(np.arange(6, dtype=np.float32).reshape(2, 3)),
+    np.zeros((0, 3), dtype=np.complex128),
+    np.array([(1, [1.5, 2.5])], dtype=[('a', '<i4'), ('b', '>f8', (2,))]),
+])
+def test_to_bytes_ndarray(arr):
+    jsoner = StrongJson({})
+    b = jsoner.to_bytes([arr, arr])
+    assert arr.tobytes(order='A') in b  # raw buffer, in its own memory order
+    for got in jsoner.from_bytes(b):
+        assert got.dtype == arr.dtype and got.shape == arr.shape
+        assert got.tobytes() == arr.tobytes()
+        assert got.flags.writeable
+    assert jsoner.from_bytes(jsoner.to_bytes(np.array([1, 'a'], dtype=object))).tolist() == ['1', 'a']
+
+
+def test_to_bytes_stats_sizes():
+    jsoner = StrongJson({})
+    obj = [np.arange(3), {'x': np.zeros(2)}]
+    with jsoner.collect_stats(StatsCollector(sizes=True)) as stats:
+        b = jsoner.to_bytes(obj)
+        decoded = jsoner.from_bytes(b)
+    assert [arr.tolist() for arr in (decoded[0], decoded[1]['x'])] == [[0, 1, 2], [0.0, 0.0]]
+    summary = stats.summary()
+    assert summary['encode']['numpy.ndarray']['count'] == summary['decode']['numpy.ndarray']['count'] == 2
+    # raw buffers count as their bytes
+    assert summary['encode']['list']['size'] > summary['encode']['numpy.ndarray']['size'] > 3 * 8 + 2 * 8
+
+
+def test_to_bytes_deep_and_shared_strings():
+    obj = [make_deep(kind, 5000) for kind in ['list', 'dict', 'tuple']] + ['value'] * 10
+    b = strong_json.to_bytes(obj)
+    assert b.count(b'value') == 1
+    got = strong_json.from_bytes(b)
+    assert got[3:] == ['value'] * 10
+    for decoded in got[:3]:
+        for _ in range(5000):
+            decoded = next(iter(decoded.values() if isinstance(decoded, dict) else decoded))
+        assert decoded == 0
+
+
+@pytest.mark.parametrize('b', [b'', b'SJB\x02\x00', b'SJB\x01', b'SJB\x01\x06\x05ab', b'SJB\x01\x00\x00',
+                               b'SJB\x01\x07\x00', b'SJB\x01\x0b', b'SJB\x01\x03\x00', b'SJB\x01\x0a\x01\x09\x00\x00',
+                               b'SJB\x01\x06\x02\xff\xfe'])
+def test_from_bytes_invalid(b):
+    with pytest.raises(StrongJsonError):
+        strong_json.from_bytes(b)
+
+
+def test_to_bytes_unknown_value():
+    jsoner = StrongJson({})
+    jsoner.register_encoder(complex, lambda v, encoder: v)
+    with pytest.raises(StrongJsonError):
+        jsoner.to_bytes(1j)
+
+
+@pytest.mark.parametrize('v', [
+    date(2020, 1, 2), datetime(2020, 1, 2, 3, 4, 5), datetime(2020, 1, 2, 3, 4, 5, 6),
+    datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc), datetime(2020, 1, 2, tzinfo=timezone(-timedelta(hours=7))),
+    datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+])
+def test_parse_isoformat(v):
+    from strong_json import _parse_isoformat
+    assert _parse_isoformat(type(v), v.isoformat()) == v
+    with pytest.raises(ValueError):
+        _parse_isoformat(date if type(v) is datetime else datetime, v.isoformat())